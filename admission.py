@@ -0,0 +1,215 @@
+# Per-tenant admission control and load shedding for POST /ticket.
+#
+# Without it every request is scored and pushed onto the ingest queue. One tenant's
+# runaway integration (50k tickets a minute) then saturates the models and buries everyone
+# else's tickets. With ADMISSION=on a ticket has to pass three checks, cheapest first. A
+# rejected ticket gets 429 with a Retry-After header and costs no inference. It is opt-in
+# (off by default) so existing clients that send no X-Tenant-ID never see a 429 until an
+# operator has sized TENANT_RATE for them.
+#
+#   backlog    The ingest backlog (ingest.backlog) is at or above INGEST_MAX_BACKLOG.
+#              Everyone is shed. The depth is read at most once per BACKLOG_CHECK_TTL
+#              seconds per process, so a flood does not also become a flood of LLEN/XINFO.
+#   tenant     Token bucket per X-Tenant-ID: TENANT_RATE tickets/s sustained, bursts up
+#              to TENANT_BURST. TENANT_LIMITS overrides this per tenant. Buckets live in
+#              Redis and are updated by one Lua script on the Redis clock, so every API
+#              replica draws from the same bucket. If Redis is unreachable, each process
+#              falls back to its own in-memory buckets.
+#   inference  The inference scheduler already has INFERENCE_MAX_QUEUED jobs waiting.
+#              Tickets that need a transformer are shed, except those in the urgent lane,
+#              which has a reserved thread. Tickets the keyword cascade settles on its
+#              own are never shed here.
+#
+# Requests without X-Tenant-ID all draw from one shared DEFAULT_TENANT bucket, so leaving
+# the header off is not a way around the limit. Admitted tickets that wait for inference are fair-queued per tenant, weighted
+# by TENANT_WEIGHTS (see scheduler.py), so a tenant inside its limit still cannot crowd
+# out the others.
+
+import math
+import os
+import re
+import threading
+import time
+
+import redis
+
+import ingest
+import metrics
+
+ADMISSION_ENABLED = os.getenv("ADMISSION", "off").lower() in ("on", "1", "true")
+# redis = buckets shared by every API replica; local = per-process buckets
+TENANT_BUCKETS = os.getenv("TENANT_BUCKETS", "redis")
+TENANT_RATE = float(os.getenv("TENANT_RATE", 20))        # tickets/s per tenant; 0 = unlimited
+TENANT_BURST = float(os.getenv("TENANT_BURST", 100))     # bucket size
+INGEST_MAX_BACKLOG = int(os.getenv("INGEST_MAX_BACKLOG", 50_000))
+INFERENCE_MAX_QUEUED = int(os.getenv("INFERENCE_MAX_QUEUED", 200))
+BACKLOG_CHECK_TTL = float(os.getenv("BACKLOG_CHECK_TTL", 1.0))
+SHED_RETRY_AFTER = int(os.getenv("SHED_RETRY_AFTER", 5))  # seconds suggested when the backlog is full
+
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")  # bucket for requests without X-Tenant-ID
+
+BUCKET_KEY_PREFIX = "tenant_bucket:"
+_TENANT_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+_REJECTED = {reason: metrics.ADMISSION_REJECTED.labels(reason) for reason in ("backlog", "tenant", "inference")}
+
+
+def parse_tenant_limits(spec: str) -> dict:
+    """'acme=100:500,trial=1' → {tenant: (rate, burst)}; a missing burst means TENANT_BURST."""
+    limits = {}
+    for part in (spec or "").split(","):
+        tenant, _, value = part.partition("=")
+        if tenant.strip() and value.strip():
+            rate, _, burst = value.partition(":")
+            limits[tenant.strip()] = (float(rate), float(burst) if burst.strip() else TENANT_BURST)
+    return limits
+
+
+def parse_tenant_weights(spec: str) -> dict:
+    """'acme=4,bigco=2' → fair-share weights; unlisted tenants weigh 1."""
+    weights = {}
+    for part in (spec or "").split(","):
+        tenant, _, value = part.partition("=")
+        if tenant.strip() and value.strip():
+            weights[tenant.strip()] = max(0.01, float(value))
+    return weights
+
+
+TENANT_LIMITS = parse_tenant_limits(os.getenv("TENANT_LIMITS", ""))
+TENANT_WEIGHTS = parse_tenant_weights(os.getenv("TENANT_WEIGHTS", ""))
+
+
+class Rejected(Exception):
+    """Raised when a ticket is shed; main.py turns it into 429 + Retry-After."""
+
+    def __init__(self, reason: str, retry_after: float, detail: str):
+        super().__init__(detail)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))  # Retry-After is whole seconds
+        self.detail = detail
+
+
+def tenant_id(header):
+    """The X-Tenant-ID header value, or DEFAULT_TENANT if absent. Raises ValueError if malformed."""
+    if not isinstance(header, str) or not header:
+        return DEFAULT_TENANT
+    if not _TENANT_ID.match(header):
+        raise ValueError("X-Tenant-ID must be 1-64 characters of A-Z a-z 0-9 . _ : -")
+    return header
+
+
+def tenant_weight(tenant) -> float:
+    return TENANT_WEIGHTS.get(tenant, 1.0)
+
+
+# KEYS[1] = bucket hash {tokens, ts}; ARGV = rate/s, burst, cost. Returns {admitted, wait_ms}.
+_BUCKET_SCRIPT = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+local admitted, wait = 0, 0
+if tokens >= cost then
+    tokens = tokens - cost
+    admitted = 1
+else
+    wait = math.ceil((cost - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return {admitted, wait}
+"""
+
+
+class _LocalBuckets:
+    """In-process token buckets: TENANT_BUCKETS=local, or while Redis is unreachable."""
+
+    def __init__(self):
+        self._buckets = {}  # tenant → (tokens, monotonic ts)
+        self._lock = threading.Lock()
+
+    def take(self, tenant: str, rate: float, burst: float) -> float:
+        """Take one token; returns 0.0 if admitted, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.get(tenant, (burst, now))
+            tokens = min(burst, tokens + (now - ts) * rate)
+            if tokens >= 1:
+                self._buckets[tenant] = (tokens - 1, now)
+                return 0.0
+            self._buckets[tenant] = (tokens, now)
+            return (1 - tokens) / rate
+
+
+class AdmissionController:
+    def __init__(self, enabled: bool = ADMISSION_ENABLED, backend: str = TENANT_BUCKETS, r=None):
+        self.enabled = enabled
+        self.backend = backend
+        self.r = r
+        self._script = None
+        self._local = _LocalBuckets()
+        self._backlog = (0, -math.inf)  # (depth, monotonic time read)
+
+    def _bucket_script(self):
+        if self._script is None:
+            if self.r is None:
+                self.r = redis.Redis(
+                    host=os.getenv("REDIS_HOST", "localhost"),
+                    port=int(os.getenv("REDIS_PORT", 6379)),
+                    db=0,
+                    decode_responses=True,
+                )
+            self._script = self.r.register_script(_BUCKET_SCRIPT)
+        return self._script
+
+    def check_backlog(self, r) -> None:
+        """Shed everyone while the ingest backlog is at INGEST_MAX_BACKLOG (cached read)."""
+        if not self.enabled:
+            return
+        depth, read_at = self._backlog
+        now = time.monotonic()
+        if now - read_at >= BACKLOG_CHECK_TTL:
+            try:
+                depth = ingest.backlog(r)
+            except redis.RedisError:
+                depth = 0  # unknown; the enqueue itself will report Redis as unavailable
+            self._backlog = (depth, now)
+        if depth >= INGEST_MAX_BACKLOG:
+            _REJECTED["backlog"].inc()
+            raise Rejected("backlog", SHED_RETRY_AFTER, f"Ingest backlog is full ({depth} tickets waiting)")
+
+    def check_tenant(self, tenant) -> None:
+        """Take a token from the tenant's bucket (see tenant_id for untagged requests)."""
+        if not self.enabled:
+            return
+        rate, burst = TENANT_LIMITS.get(tenant, (TENANT_RATE, TENANT_BURST))
+        if rate <= 0:
+            return
+        wait = None
+        if self.backend == "redis":
+            try:
+                admitted, wait_ms = self._bucket_script()(keys=[BUCKET_KEY_PREFIX + tenant], args=[rate, burst, 1])
+                wait = 0.0 if int(admitted) else int(wait_ms) / 1000
+            except redis.RedisError:
+                wait = None
+        if wait is None:
+            wait = self._local.take(tenant, rate, burst)
+        if wait > 0:
+            _REJECTED["tenant"].inc()
+            raise Rejected("tenant", wait, f"Tenant '{tenant}' is over its rate limit of {rate:g} tickets/s")
+
+    def check_inference(self, scheduler, lane: str) -> None:
+        """Shed transformer-bound tickets while the inference queue is full (urgent lane exempt)."""
+        if not self.enabled or lane == "urgent":
+            return
+        queued = scheduler.queued()
+        if queued >= INFERENCE_MAX_QUEUED:
+            _REJECTED["inference"].inc()
+            raise Rejected("inference", 1, f"Inference queue is full ({queued} tickets waiting)")
+
+
+# Shared by every request in this API process
+admission_controller = AdmissionController()
@@ -74,7 +74,7 @@ def view_queue():
     limit = min(limit, 50)
 
     tickets = peek_queue(limit)
-    return jsonify({"queue_size": get_queue_size(), "tickets": tickets}), 200
+    return jsonify({"queue_size": get_queue_size(), "tickets": [t.to_dict() for t in tickets]}), 200
 
 
 
@@ -84,7 +84,7 @@ def next_ticket():
     ticket = get_next_ticket()
     if ticket is None:
         return jsonify({"error": "Queue is empty"}), 404
-    return jsonify(ticket), 200
+    return jsonify(ticket.to_dict()), 200
 
 
 
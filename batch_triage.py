@@ -0,0 +1,320 @@
+"""
+TriageX Bulk Offline Triage
+===========================
+Streams a JSONL backlog (one {"id": ..., "text": ..., "timestamp"?: ...} object per line)
+through classification, urgency scoring and storm detection, and writes the triaged
+tickets as streaming JSONL — or pushes them straight onto the Redis ingest queue so
+worker.py files them into the priority queue. Tickets pushed to Redis carry the backfill
+flag, so the worker indexes them for similar-ticket search but does not re-run storm
+detection or alert on historical tickets.
+
+  * Transformer inference runs in batches across a process pool (one model copy per process).
+    Each process holds BART-large-MNLI, RoBERTa-base and MiniLM — about 2.5 GB resident —
+    so --workers defaults to 2; torch threads split the cores between the processes.
+  * Storm detection runs in the parent, in input order, using each ticket's own timestamp
+    so a replayed backlog is not treated as one giant 5-minute storm. It uses its own
+    in-memory detector even when STORM_BACKEND=redis, so live storm state is untouched.
+  * A checkpoint file records the input/output byte offsets after every batch, so an
+    interrupted run resumes exactly where it stopped without duplicating output lines.
+
+Run:
+    python batch_triage.py backlog.jsonl -o triaged.jsonl
+    python batch_triage.py backlog.jsonl --redis --workers 4 --batch-size 256
+    python batch_triage.py backlog.jsonl -o triaged.jsonl --resume
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+RESET = "\033[0m"
+GREEN = "\033[92m"
+RED   = "\033[91m"
+BOLD  = "\033[1m"
+CYAN  = "\033[96m"
+
+# Each pool process loads its own copy of all three models (~2.5 GB resident)
+DEFAULT_WORKERS = 2
+
+# ─── Process pool side ────────────────────────────────────────────────────────
+
+def _init_pool(threads_per_process: int, with_embeddings: bool) -> None:
+    """Load the models once per pool process and stop torch from oversubscribing cores."""
+    import torch
+    torch.set_num_threads(threads_per_process)
+
+    import classifier  # noqa: F401  (loads BART-MNLI)
+    import urgency     # noqa: F401  (loads RoBERTa)
+    if with_embeddings:
+        import deduplicator  # noqa: F401  (loads MiniLM)
+
+
+def _infer_batch(texts: list, with_embeddings: bool, model_batch_size: int):
+    """Run classification, urgency and (optionally) embedding for one batch of texts."""
+    from classifier import classify_tickets
+    from urgency import score_urgency_batch
+
+    start = time.perf_counter()
+    categories = classify_tickets(texts, batch_size=model_batch_size)
+    urgencies = score_urgency_batch(texts, batch_size=model_batch_size)
+
+    embeddings = None
+    if with_embeddings:
+        from deduplicator import embedder
+        embeddings = embedder.encode(texts, batch_size=model_batch_size)
+
+    return categories, urgencies, embeddings, time.perf_counter() - start
+
+
+# ─── Parent side ──────────────────────────────────────────────────────────────
+
+def _read_batches(path: str, offset: int, batch_size: int, stats: collections.Counter):
+    """Yield (end_offset, records) batches starting at byte `offset` of the input file."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        batch = []
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            stats["lines"] += 1
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict) or not str(record.get("text", "")).strip():
+                    raise ValueError("missing 'text'")
+            except ValueError:
+                stats["malformed"] += 1
+                continue
+            record.setdefault("id", f"BATCH-{offset}-{stats['lines']}")
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield f.tell(), batch
+                batch = []
+        if batch:
+            yield f.tell(), batch
+
+
+def _ticket_time(record: dict) -> float:
+    """Epoch seconds of the ticket's own timestamp, falling back to now."""
+    ts = record.get("timestamp")
+    if ts:
+        try:
+            parsed = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return parsed.timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+def _load_checkpoint(path: str, input_path: str) -> dict:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("input") != os.path.abspath(input_path):
+        sys.exit(f"Checkpoint {path} belongs to {checkpoint.get('input')}, not {input_path}")
+    return checkpoint
+
+
+def _save_checkpoint(path: str, checkpoint: dict) -> None:
+    """Write the checkpoint atomically so a crash mid-write never corrupts it."""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def run(args) -> dict:
+    from urgency import is_high_urgency
+
+    deduplicator = None
+    if not args.no_storm:
+        # A private in-process detector, never the shared singleton: replayed tickets run on
+        # historical timestamps and must not join or tip over the live {storm}: clusters
+        from deduplicator import Deduplicator
+        deduplicator = Deduplicator()
+
+    checkpoint = _load_checkpoint(args.checkpoint, args.input) if args.resume else {}
+    in_offset = checkpoint.get("input_offset", 0)
+    processed = checkpoint.get("processed", 0)
+
+    # --- Sink: streaming JSONL file or the Redis ingest list ---
+    out = None
+    redis_client = None
+    if args.redis:
+        import redis
+        import ingest
+        from ticket import Ticket
+        redis_client = redis.Redis(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            db=0,
+            decode_responses=True,
+        )
+    else:
+        if checkpoint and not os.path.exists(args.output):
+            sys.exit(f"Checkpoint {args.checkpoint} exists but output {args.output} is missing")
+        out = open(args.output, "r+" if checkpoint else "w")
+        # Drop anything written after the last checkpoint so resumed output has no duplicates
+        out.seek(checkpoint.get("output_offset", 0))
+        out.truncate()
+
+    stats = collections.Counter()
+    timings = collections.Counter()
+    with_embeddings = deduplicator is not None
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+
+    wall_start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_init_pool,
+        initargs=(threads, with_embeddings),
+    ) as pool:
+        inflight = collections.deque()
+        batches = _read_batches(args.input, in_offset, args.batch_size, stats)
+
+        def _submit_next() -> bool:
+            try:
+                end_offset, records = next(batches)
+            except StopIteration:
+                return False
+            future = pool.submit(_infer_batch, [r["text"] for r in records], with_embeddings, args.model_batch_size)
+            inflight.append((end_offset, records, future))
+            return True
+
+        # Keep every process busy with one extra batch queued behind it
+        for _ in range(args.workers * 2):
+            if not _submit_next():
+                break
+
+        while inflight:
+            # Results are consumed in submission order so storm detection sees input order
+            end_offset, records, future = inflight.popleft()
+            categories, urgencies, embeddings, infer_s = future.result()
+            timings["inference_s"] += infer_s
+            _submit_next()
+
+            t0 = time.perf_counter()
+            tickets = []
+            for i, record in enumerate(records):
+                storm_status = "normal"
+                if deduplicator is not None:
+                    storm_status = deduplicator.check_storm(
+                        record["text"], now=_ticket_time(record), emb=embeddings[i]
+                    )
+                ticket_data = {
+                    "id": record["id"],
+                    "text": record["text"],
+                    "category": categories[i],
+                    "urgency_score": urgencies[i],
+                    "is_high_urgency": is_high_urgency(urgencies[i]),
+                    "timestamp": record.get("timestamp") or datetime.now(timezone.utc).isoformat(),
+                    "processed": False,
+                    "model_used": "transformer (M2, batch)",
+                    "storm_status": storm_status,
+                }
+                tickets.append(ticket_data)
+                stats[f"category:{ticket_data['category']}"] += 1
+                stats[f"storm:{storm_status}"] += 1
+                stats["high_urgency"] += ticket_data["is_high_urgency"]
+            timings["storm_s"] += time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            if redis_client is not None:
+                pipe = redis_client.pipeline(transaction=False)
+                for ticket_data in tickets:
+                    # Storm detection already ran here on the ticket's own time: the worker must not alert
+                    ingest.publish(pipe, Ticket.from_dict({**ticket_data, "backfill": True}).pack())
+                pipe.execute()
+            else:
+                out.write("".join(json.dumps(t) + "\n" for t in tickets))
+                out.flush()
+            timings["write_s"] += time.perf_counter() - t0
+
+            processed += len(tickets)
+            if args.checkpoint:
+                _save_checkpoint(args.checkpoint, {
+                    "input": os.path.abspath(args.input),
+                    "input_offset": end_offset,
+                    "output_offset": out.tell() if out else 0,
+                    "processed": processed,
+                })
+            if args.progress and processed // args.progress != (processed - len(tickets)) // args.progress:
+                rate = (processed - checkpoint.get("processed", 0)) / (time.perf_counter() - wall_start)
+                print(f"  {CYAN}… {processed} tickets triaged ({rate:.0f}/s){RESET}", flush=True)
+
+    if out:
+        out.close()
+
+    wall_s = time.perf_counter() - wall_start
+    run_count = processed - checkpoint.get("processed", 0)
+    return {
+        "processed_this_run": run_count,
+        "processed_total": processed,
+        "malformed_skipped": stats["malformed"],
+        "wall_s": round(wall_s, 3),
+        "tickets_per_s": round(run_count / wall_s, 1) if wall_s else 0.0,
+        "inference_s": round(timings["inference_s"], 3),   # summed across pool processes
+        "storm_s": round(timings["storm_s"], 3),
+        "write_s": round(timings["write_s"], 3),
+        "high_urgency": stats["high_urgency"],
+        "categories": {k.split(":", 1)[1]: v for k, v in stats.items() if k.startswith("category:")},
+        "storm": {k.split(":", 1)[1]: v for k, v in stats.items() if k.startswith("storm:")},
+    }
+
+
+def _print_report(report: dict) -> None:
+    print(f"\n{BOLD}{'='*65}{RESET}")
+    print(f"{BOLD}  TriageX — Bulk Triage Report{RESET}")
+    print(f"{BOLD}{'='*65}{RESET}")
+    print(f"  {GREEN}Triaged  : {report['processed_this_run']} this run "
+          f"({report['processed_total']} total){RESET}")
+    if report["malformed_skipped"]:
+        print(f"  {RED}Skipped  : {report['malformed_skipped']} malformed lines{RESET}")
+    print(f"  Wall time: {report['wall_s']:.1f} s  →  {BOLD}{report['tickets_per_s']:.1f} tickets/s{RESET}")
+    print(f"  Stages   : inference={report['inference_s']:.1f}s (pool total)  "
+          f"storm={report['storm_s']:.1f}s  write={report['write_s']:.1f}s")
+    print(f"  Category : {report['categories']}")
+    print(f"  Storm    : {report['storm']}")
+    print(f"  High urg.: {report['high_urgency']}")
+    print(f"{BOLD}{'='*65}{RESET}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk offline triage of a JSONL ticket backlog.")
+    parser.add_argument("input", help="JSONL file with one {'id', 'text', 'timestamp'?} object per line")
+    parser.add_argument("-o", "--output", default="triaged.jsonl", help="JSONL output path (ignored with --redis)")
+    parser.add_argument("--redis", action="store_true", help="publish results onto the Redis ingest channel instead of a file")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"inference processes, ~2.5 GB RAM each (default {DEFAULT_WORKERS})")
+    parser.add_argument("--batch-size", type=int, default=128, help="tickets per pool task")
+    parser.add_argument("--model-batch-size", type=int, default=16, help="batch size inside each transformer call")
+    parser.add_argument("--no-storm", action="store_true", help="skip semantic storm detection")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint path (default: <output>.ckpt)")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint if it exists")
+    parser.add_argument("--progress", type=int, default=10000, help="print progress every N tickets (0 = off)")
+    parser.add_argument("--report", default=None, help="also write the throughput report as JSON here")
+    args = parser.parse_args()
+
+    if args.checkpoint is None:
+        args.checkpoint = (args.output if not args.redis else args.input) + ".ckpt"
+
+    report = run(args)
+    _print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
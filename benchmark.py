@@ -0,0 +1,1179 @@
+"""
+TriageX Benchmark Harness
+=========================
+Reproducible load generator for the ingest pipeline. Unlike stress_test.py (20 tickets,
+closed loop), this drives an *open-loop* arrival process — tickets are sent at their
+scheduled time whether or not earlier ones have finished — so queueing delay and
+circuit-breaker fallbacks show up in the numbers instead of being hidden.
+
+Targets:
+  api     POST /ticket against a running server (uvicorn main:app + worker.py)
+  inproc  main.submit_ticket → worker.process → queue_manager / deduplicator / routing,
+          all in this process, with a stubbed Redis and (optionally) stubbed models.
+  drain   pre-fills the Redis Stream ingest channel and measures how fast 1..N worker
+          processes in one consumer group drain it (needs a real Redis).
+  lanes   the inproc run twice over one workload — FIFO inference vs priority lanes —
+          with latency and fallback rate reported per lane.
+  tenants the inproc run with quiet tenants plus one noisy tenant, three times: no
+          admission control, fair queuing only, and rate limits + shedding + fair
+          queuing — with latency, fallback and 429 rates reported per tenant group.
+
+Latencies are measured from each ticket's *scheduled* send time and recorded in
+HDR-style log-linear histograms; results are written as JSON so runs can be compared
+across commits.
+
+Run:
+    python benchmark.py inproc --stub-models --rate 200 --duration 30
+    python benchmark.py inproc --stub-models --model-latency-ms 300 --storm 10:60:5
+    python benchmark.py api --url http://localhost:8000 --rate 50 --duration 60
+    python benchmark.py drain --stub-models --tickets 20000 --workers 1,2,4,8
+    python benchmark.py codec --tickets 100000
+    python benchmark.py cascade labeled_tickets.jsonl --thresholds 0.5,0.75,0.875
+    python benchmark.py similar --rows 1000000 --nprobe 4,8,16,32
+    python benchmark.py lanes --stub-models --rate 120 --urgent-fraction 0.05
+    python benchmark.py tenants --stub-models --rate 20 --noisy-rate 300
+    python benchmark.py compare bench_old.json bench_new.json
+"""
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import uuid
+from datetime import datetime, timezone
+
+from config import URGENCY_FLAGS
+
+RESET  = "\033[0m"
+GREEN  = "\033[92m"
+RED    = "\033[91m"
+YELLOW = "\033[93m"
+BOLD   = "\033[1m"
+CYAN   = "\033[96m"
+
+SAMPLE_TEXTS = [
+    "My API is completely broken and production is DOWN right now — ASAP fix needed!",
+    "I need a refund for the invoice I was charged twice.",
+    "Your GDPR compliance is questionable; our legal team is reviewing.",
+    "Can you help me reset my password? I forgot it.",
+    "The dashboard loads very slowly today.",
+    "Critical bug! The login page crashes on every submit — losing customers!",
+    "Subscription was cancelled but you still billed me. This is fraud!",
+    "Please send our service agreement and data processing addendum.",
+    "We believe your data retention policy does not comply with CCPA.",
+    "Server is returning 500 errors on the /orders endpoint — production is down!",
+]
+
+# Split by the same pre-signal the inference scheduler uses, for --urgent-fraction
+URGENT_TEXTS = [t for t in SAMPLE_TEXTS if any(kw in t.lower() for kw in URGENCY_FLAGS)]
+ROUTINE_TEXTS = [t for t in SAMPLE_TEXTS if t not in URGENT_TEXTS]
+
+STORM_TEXT = "Checkout page returns 502 Bad Gateway for every customer in region {region}"
+
+FILLER_WORDS = (
+    "please also note that we have tried again this morning and the same thing "
+    "happened for several of our team members using different browsers"
+).split()
+
+
+# ─── HDR-style latency histogram ──────────────────────────────────────────────
+
+class LatencyHistogram:
+    """
+    Log-linear histogram in the spirit of HdrHistogram: every power-of-two range of
+    microseconds is split into `sub_buckets` linear buckets, giving a bounded relative
+    error (~1/sub_buckets) at every magnitude with O(1) record cost.
+    """
+
+    def __init__(self, sub_buckets: int = 128):
+        self.sub_buckets = sub_buckets
+        self.counts = collections.Counter()
+        self.total = 0
+        self.sum_us = 0
+        self.max_us = 0
+        self.min_us = None
+
+    def _index(self, us: int):
+        if us < self.sub_buckets:
+            return 0, us
+        exp = us.bit_length() - self.sub_buckets.bit_length() + 1
+        return exp, us >> exp
+
+    def _value(self, exp: int, sub: int) -> int:
+        # Upper edge of the bucket, so percentiles never under-report
+        return ((sub + 1) << exp) - 1 if exp else sub
+
+    def record(self, seconds: float) -> None:
+        us = max(0, int(seconds * 1_000_000))
+        self.counts[self._index(us)] += 1
+        self.total += 1
+        self.sum_us += us
+        self.max_us = max(self.max_us, us)
+        self.min_us = us if self.min_us is None else min(self.min_us, us)
+
+    def percentile(self, p: float) -> float:
+        """Value in milliseconds at percentile p (0–100)."""
+        if not self.total:
+            return 0.0
+        target = max(1, math.ceil(self.total * p / 100.0))
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= target:
+                return min(self._value(*key), self.max_us) / 1000.0
+        return self.max_us / 1000.0
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.total,
+            "min_ms": (self.min_us or 0) / 1000.0,
+            "mean_ms": round(self.sum_us / self.total / 1000.0, 3) if self.total else 0.0,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "p999_ms": self.percentile(99.9),
+            "max_ms": self.max_us / 1000.0,
+        }
+
+
+class Recorder:
+    """Thread-safe bag of named histograms and counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = collections.defaultdict(LatencyHistogram)
+        self.counters = collections.Counter()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.histograms[name].record(seconds)
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+
+# ─── Stubs for fully local runs ───────────────────────────────────────────────
+
+class FakeRedis:
+    """In-memory stand-in for the handful of redis.Redis commands the pipeline uses."""
+
+    def __init__(self):
+        self._lists = collections.defaultdict(collections.deque)
+        self._strings = {}
+        self._cond = threading.Condition()
+
+    def lpush(self, key, *values):
+        with self._cond:
+            for v in values:
+                self._lists[key].appendleft(v)
+            self._cond.notify(len(values))
+            return len(self._lists[key])
+
+    def rpop(self, key):
+        with self._cond:
+            return self._lists[key].pop() if self._lists[key] else None
+
+    def brpop(self, key, timeout=0):
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._cond:
+            while not self._lists[key]:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return key, self._lists[key].pop()
+
+    def llen(self, key):
+        with self._cond:
+            return len(self._lists[key])
+
+    def publish(self, channel, message):
+        return 0  # no subscribers; the encode + send path is still exercised
+
+    def set(self, key, value, nx=False, ex=None):
+        # Expiry is ignored: a benchmark run is far shorter than any TTL in use
+        with self._cond:
+            if nx and key in self._strings:
+                return None
+            self._strings[key] = value
+            return True
+
+    def get(self, key):
+        with self._cond:
+            return self._strings.get(key)
+
+    def delete(self, *keys):
+        with self._cond:
+            return sum(self._strings.pop(k, None) is not None for k in keys)
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    """Buffers commands and applies them on execute(), like redis-py's Pipeline."""
+
+    def __init__(self, client):
+        self._client = client
+        self._calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+        return lambda *args, **kwargs: self._calls.append((method, args, kwargs))
+
+    def execute(self):
+        calls, self._calls = self._calls, []
+        return [method(*args, **kwargs) for method, args, kwargs in calls]
+
+
+def _stub_sleep(mean_s: float) -> None:
+    if mean_s > 0:
+        # Log-normal service time: most calls near the mean, a long tail beyond it
+        time.sleep(random.lognormvariate(math.log(mean_s), 0.5))
+
+
+def install_stub_models(latency_ms: float) -> None:
+    """
+    Register fake `transformers` and `sentence_transformers` modules so classifier.py,
+    urgency.py and deduplicator.py import without downloading models. Outputs are
+    keyword-driven (same lists as config.py) and embeddings are hashed bag-of-words,
+    so similar texts still cluster for storm detection.
+    """
+    import numpy as np
+    from config import BILLING_KEYWORDS, LEGAL_KEYWORDS, TECHNICAL_KEYWORDS, URGENCY_FLAGS
+
+    per_call_s = latency_ms / 2000.0  # classification + urgency share the budget
+
+    def _zero_shot_one(text, labels):
+        t = text.lower()
+        hits = {
+            "Billing": sum(kw in t for kw in BILLING_KEYWORDS),
+            "Technical": sum(kw in t for kw in TECHNICAL_KEYWORDS),
+            "Legal": sum(kw in t for kw in LEGAL_KEYWORDS),
+        }
+        raw = [hits.get(label, 0) + 0.5 for label in labels]
+        total = sum(raw)
+        ranked = sorted(zip(labels, [x / total for x in raw]), key=lambda x: -x[1])
+        return {"sequence": text, "labels": [l for l, _ in ranked], "scores": [s for _, s in ranked]}
+
+    def _sentiment_one(text):
+        t = text.lower()
+        flags = sum(kw in t for kw in URGENCY_FLAGS)
+        if flags:
+            return {"label": "negative", "score": min(0.99, 0.7 + 0.1 * flags)}
+        return {"label": "neutral", "score": 0.8}
+
+    def pipeline(task, model=None, **kwargs):
+        def _run(inputs, *args, **kw):
+            _stub_sleep(per_call_s)
+            many = isinstance(inputs, list)
+            items = inputs if many else [inputs]
+            if task == "zero-shot-classification":
+                out = [_zero_shot_one(x, args[0] if args else kw["candidate_labels"]) for x in items]
+                return out if many else out[0]
+            return [_sentiment_one(x) for x in items]
+        return _run
+
+    transformers = types.ModuleType("transformers")
+    transformers.pipeline = pipeline
+
+    dim = 384
+
+    def _embed_one(text):
+        vec = np.zeros(dim, dtype=np.float32)
+        for token in text.lower().split():
+            h = int(hashlib.md5(token.encode()).hexdigest()[:8], 16)
+            vec[h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    class SentenceTransformer:
+        def __init__(self, name, *args, **kwargs):
+            self.name = name
+
+        def encode(self, sentences, convert_to_tensor=False, batch_size=32, **kwargs):
+            if isinstance(sentences, str):
+                return _embed_one(sentences)
+            return np.stack([_embed_one(s) for s in sentences])
+
+    def cos_sim(a, b):
+        a = np.atleast_2d(np.asarray(a, dtype=np.float32))
+        b = np.atleast_2d(np.asarray(b, dtype=np.float32))
+        a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+        b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+        return a @ b.T
+
+    sentence_transformers = types.ModuleType("sentence_transformers")
+    sentence_transformers.SentenceTransformer = SentenceTransformer
+    sentence_transformers.util = types.SimpleNamespace(cos_sim=cos_sim)
+
+    sys.modules["transformers"] = transformers
+    sys.modules["sentence_transformers"] = sentence_transformers
+
+
+# ─── Workload ─────────────────────────────────────────────────────────────────
+
+def parse_storms(specs: list) -> list:
+    """'START:COUNT:SPAN' → (start_s, count, span_s); COUNT near-duplicates spread over SPAN."""
+    storms = []
+    for spec in specs or []:
+        start, count, span = spec.split(":")
+        storms.append((float(start), int(count), float(span)))
+    return storms
+
+
+def build_workload(rate: float, duration: float, mean_words: int, storms: list, seed: int,
+                   retry_fraction: float = 0.0, urgent_fraction: float = None,
+                   tier_fraction: float = 0.0) -> list:
+    """
+    Poisson arrivals at `rate`/s for `duration` s, text lengths drawn log-normally around
+    `mean_words`, plus storm bursts of near-identical tickets. A `retry_fraction` of
+    tickets is resubmitted with the same ID 0.5–1s later, like a client retrying after
+    a timeout. `urgent_fraction` fixes the share of tickets with urgency keywords (default:
+    whatever SAMPLE_TEXTS gives), and a `tier_fraction` are sent as an enterprise customer
+    (kind "enterprise"). Returns sorted (offset_s, ticket_id, text, kind) tuples.
+    """
+    rng = random.Random(seed)
+    arrivals = []
+    t = 0.0
+    n = 0
+    while True:
+        t += rng.expovariate(rate)
+        if t >= duration:
+            break
+        if urgent_fraction is None:
+            text = rng.choice(SAMPLE_TEXTS)
+        else:
+            text = rng.choice(URGENT_TEXTS if rng.random() < urgent_fraction else ROUTINE_TEXTS)
+        words = max(1, int(rng.lognormvariate(math.log(mean_words), 0.6)))
+        extra = words - len(text.split())
+        if extra > 0:
+            text += " " + " ".join(rng.choice(FILLER_WORDS) for _ in range(extra))
+        n += 1
+        kind = "enterprise" if tier_fraction and rng.random() < tier_fraction else "normal"
+        arrivals.append((t, f"BENCH-{n:07d}", text, kind))
+        if retry_fraction and rng.random() < retry_fraction:
+            arrivals.append((t + rng.uniform(0.5, 1.0), f"BENCH-{n:07d}", text, "retry"))
+
+    for s_idx, (start, count, span) in enumerate(storms):
+        region = rng.choice(["eu-west", "us-east", "ap-south"])
+        for i in range(count):
+            offset = start + (span * i / max(1, count - 1) if count > 1 else 0.0)
+            n += 1
+            arrivals.append((offset, f"STORM{s_idx}-{n:07d}", STORM_TEXT.format(region=region), "storm"))
+
+    arrivals.sort(key=lambda a: a[0])
+    return arrivals
+
+
+def run_open_loop(workload: list, send, recorder: Recorder, max_concurrency: int, label=None) -> float:
+    """
+    Dispatch each arrival at its scheduled offset regardless of outstanding requests.
+    Latency is measured from the scheduled time (not the actual send time) so a stalled
+    system cannot hide its backlog — the coordinated-omission correction.
+    `label(text, kind)` groups the per-ticket histograms and outcomes (default: kind).
+    """
+    start = time.perf_counter()
+
+    def _one(scheduled, ticket_id, text, kind):
+        try:
+            outcome = send(ticket_id, text, kind)
+        except Exception as exc:  # any failure counts, the run must keep going
+            outcome = f"error:{type(exc).__name__}"
+        name = label(text, kind) if label else kind
+        recorder.record("submit", time.perf_counter() - scheduled)
+        recorder.record(f"submit[{name}]", time.perf_counter() - scheduled)
+        recorder.incr(f"outcome:{outcome}")
+        if label:
+            recorder.incr(f"{name}:{outcome}")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        for offset, ticket_id, text, kind in workload:
+            scheduled = start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(_one, scheduled, ticket_id, text, kind)
+
+    return time.perf_counter() - start
+
+
+# ─── Targets ──────────────────────────────────────────────────────────────────
+
+def _api_sender(url: str):
+    import requests
+
+    session = requests.Session()
+
+    def send(ticket_id, text, kind):
+        headers = {"X-Customer-Tier": "enterprise"} if kind == "enterprise" else {}
+        if kind.startswith("tenant:"):
+            headers["X-Tenant-ID"] = kind[len("tenant:"):]
+        resp = session.post(f"{url}/ticket", json={"id": ticket_id, "text": text}, headers=headers, timeout=30)
+        if resp.status_code != 202:
+            return f"http_{resp.status_code}"
+        if resp.headers.get("Idempotent-Replay"):
+            return "idempotent_replay"
+        return resp.json().get("model_used", "accepted")
+
+    return send
+
+
+def run_inproc(args, workload: list, recorder: Recorder, label=None, setup=None) -> float:
+    """
+    Drive main → worker → queue_manager/deduplicator/routing inside this process.
+    `setup(main)` runs after the pipeline is imported and patched, before any load.
+    """
+    if args.stub_models:
+        install_stub_models(args.model_latency_ms)
+
+    # Keep the benchmark from touching the real queue_store.bin and similarity index
+    bench_dir = tempfile.mkdtemp(prefix="triagex-bench-")
+    os.environ["SIMILARITY_INDEX_DIR"] = os.path.join(bench_dir, "similarity_index")
+    import queue_manager
+    queue_manager.use_store(os.path.join(bench_dir, "queue_store.bin"))
+
+    import ingest
+    ingest.INGEST_MODE = "list"  # FakeRedis only implements the list commands
+
+    import events
+    import logging
+    import main
+    import routing
+    import worker
+    from ticket import Ticket
+    logging.getLogger("worker").setLevel(logging.CRITICAL)
+
+    fake = FakeRedis()
+    main.r = fake
+    worker.r = fake
+    events._client = fake
+
+    if setup:
+        setup(main)
+
+    def send(ticket_id, text, kind):
+        tier = "enterprise" if kind == "enterprise" else None
+        tenant = kind[len("tenant:"):] if kind.startswith("tenant:") else None
+        try:
+            resp = asyncio.run(main.submit_ticket(main.TicketRequest(id=ticket_id, text=text),
+                                                  x_customer_tier=tier, x_tenant_id=tenant))
+        except main.HTTPException as e:
+            return f"http_{e.status_code}"
+        if resp.headers.get("Idempotent-Replay"):
+            return "idempotent_replay"
+        return json.loads(resp.body).get("model_used", "accepted")
+
+    stop = threading.Event()
+
+    def drain():
+        while not stop.is_set() or fake.llen(worker.REDIS_QUEUE_KEY):
+            result = fake.brpop(worker.REDIS_QUEUE_KEY, timeout=0.1)
+            if result is None:
+                continue
+            t0 = time.perf_counter()
+            worker.process(Ticket.decode(result[1]))
+            recorder.record("worker_process", time.perf_counter() - t0)
+            recorder.incr("drained")
+
+    def route():
+        while not stop.wait(args.route_interval):
+            tickets = queue_manager.peek_queue(args.route_batch)
+            if not tickets:
+                continue
+            t0 = time.perf_counter()
+            routing.map_tickets_to_agents(tickets)
+            recorder.record("route_solve", time.perf_counter() - t0)
+            for agent in routing.AGENT_REGISTRY:
+                agent.assigned_tickets.clear()
+
+    threads = [threading.Thread(target=drain, daemon=True), threading.Thread(target=route, daemon=True)]
+    for t in threads:
+        t.start()
+
+    # main.submit_ticket prints on every breaker trip; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        elapsed = run_open_loop(workload, send, recorder, args.concurrency, label)
+        drain_start = time.perf_counter()
+        stop.set()
+        for t in threads:
+            t.join()
+    recorder.record("drain_tail", time.perf_counter() - drain_start)
+    recorder.counters["final_queue_size"] = queue_manager.get_queue_size()
+    return elapsed
+
+
+def _drain_process(name: str, stub_models: bool, latency_ms: float, stop, drained) -> None:
+    """One worker process in the consumer group, counting processed entries into `drained`."""
+    if stub_models:
+        install_stub_models(latency_ms)
+
+    bench_dir = tempfile.mkdtemp(prefix="triagex-drain-")
+    os.environ["SIMILARITY_INDEX_DIR"] = os.path.join(bench_dir, "similarity_index")
+    import queue_manager
+    queue_manager.use_store(os.path.join(bench_dir, "queue_store.bin"))
+
+    import ingest
+    import logging
+    import worker
+    logging.getLogger("worker").setLevel(logging.CRITICAL)
+
+    consumer = ingest.StreamConsumer(worker.r, name)
+    while not stop.is_set():
+        entries = consumer.read(block_ms=200)
+        if entries:
+            n = worker.process_stream_batch(consumer, entries)
+            with drained.get_lock():
+                drained.value += n
+
+
+def run_drain(args) -> None:
+    """Measure stream drain throughput as workers are added to the consumer group."""
+    import redis
+    import ingest
+    from ticket import Category, Ticket
+
+    r = redis.Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        db=0,
+        decode_responses=True,
+    )
+    ctx = multiprocessing.get_context("spawn")
+    ingest.INGEST_MODE = "stream"
+    workload = build_workload(args.tickets * 1.2, 1.0, args.mean_words, [], args.seed)[:args.tickets]
+    rows = []
+
+    for n_workers in [int(x) for x in args.workers.split(",")]:
+        r.delete(ingest.REDIS_STREAM_KEY)
+        pipe = r.pipeline(transaction=False)
+        for _, ticket_id, text, _ in workload:
+            ingest.publish(pipe, Ticket(ticket_id, text, Category.TECHNICAL, 0.5, time.time(),
+                                        model_used="benchmark").pack())
+        pipe.execute()
+
+        stop = ctx.Event()
+        drained = ctx.Value("i", 0)
+        procs = [
+            ctx.Process(target=_drain_process, args=(f"bench-{i}", args.stub_models, args.model_latency_ms, stop, drained))
+            for i in range(n_workers)
+        ]
+        for p in procs:
+            p.start()
+        # Start the clock once the first entry is processed so model loading is excluded
+        while drained.value == 0:
+            time.sleep(0.01)
+        start, start_count = time.perf_counter(), drained.value
+        while drained.value < len(workload):
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for p in procs:
+            p.join()
+
+        rate = (len(workload) - start_count) / elapsed if elapsed else 0.0
+        rows.append({"workers": n_workers, "tickets": len(workload), "elapsed_s": round(elapsed, 3),
+                     "tickets_per_s": round(rate, 1)})
+        print(f"  {CYAN}{n_workers:>3} worker(s){RESET}: {len(workload)} tickets in {elapsed:.2f}s → "
+              f"{BOLD}{rate:.1f} tickets/s{RESET}")
+
+    out = args.out or f"bench_drain_{_git_commit()}_{uuid.uuid4().hex[:6]}.json"
+    with open(out, "w") as f:
+        json.dump({"meta": {"commit": _git_commit(), "timestamp": datetime.now(timezone.utc).isoformat(),
+                            "args": {k: v for k, v in vars(args).items() if k != "func"}},
+                   "drain": rows}, f, indent=2)
+    print(f"\n  Results written to {out}\n")
+
+
+def _rss_bytes() -> int:
+    """Current resident set size (Linux /proc; 0 where unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def run_codec(args) -> None:
+    """
+    Per-N-tickets cost of the legacy dict/JSON representation versus Ticket/msgpack:
+    resident memory, encode/decode time, wire bytes, and persisting the queue.
+    """
+    import gc
+    import tracemalloc
+    from ticket import Category, Ticket
+
+    n = args.tickets
+    workload = build_workload(n * 1.2, 1.0, args.mean_words, [], args.seed)[:n]
+    now = time.time()
+    rng = random.Random(args.seed)
+    rows = [(tid, text, rng.choice(list(Category)), rng.random()) for _, tid, text, _ in workload]
+    results = {}
+
+    def _measure(name, build, encode, decode, persist):
+        gc.collect()
+        rss0 = _rss_bytes()
+        tracemalloc.start()
+        objs = build()
+        heap_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        rss = _rss_bytes() - rss0
+
+        t0 = time.perf_counter()
+        payloads = [encode(o) for o in objs]
+        enc_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for p in payloads:
+            decode(p)
+        dec_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        persist(objs)
+        persist_s = time.perf_counter() - t0
+
+        results[name] = {
+            "objects_heap_mb": round(heap_bytes / 1e6, 2),
+            "rss_delta_mb": round(rss / 1e6, 2),
+            "encode_s": round(enc_s, 3),
+            "decode_s": round(dec_s, 3),
+            "wire_mb": round(sum(len(p) for p in payloads) / 1e6, 2),
+            "persist_s": round(persist_s, 3),
+        }
+        del objs, payloads
+
+    store_dir = tempfile.mkdtemp(prefix="triagex-codec-")
+
+    def _dict_build():
+        ts = datetime.fromtimestamp(now, timezone.utc).isoformat()
+        return [{"id": tid, "text": text, "category": cat.label, "urgency_score": {"urgency": u},
+                 "is_high_urgency": u > 0.75, "timestamp": ts, "processed": False,
+                 "model_used": "transformer (M2)"} for tid, text, cat, u in rows]
+
+    def _dict_persist(objs):
+        # Legacy _save(): the whole queue rewritten as indented JSON (here once, not per change)
+        with open(os.path.join(store_dir, "queue_store.json"), "w") as f:
+            json.dump({"ticket_counter": len(objs), "tickets": [
+                {"neg_urgency": -o["urgency_score"]["urgency"], "seq": i, "ticket": o}
+                for i, o in enumerate(objs)]}, f, indent=2)
+
+    def _ticket_build():
+        return [Ticket(tid, text, cat, u, now, model_used="transformer (M2)") for tid, text, cat, u in rows]
+
+    def _ticket_persist(objs):
+        # New journal: one append per add_ticket
+        import events
+        import queue_manager
+        events.EVENTS_ENABLED = False  # measure the store alone
+        queue_manager.use_store(os.path.join(store_dir, "queue_store.bin"))
+        for o in objs:
+            queue_manager.add_ticket(o)
+        queue_manager.use_store(None)
+
+    _measure("dict+json", _dict_build, lambda o: json.dumps(o).encode(), json.loads, _dict_persist)
+    _measure("Ticket+msgpack", _ticket_build, Ticket.pack, Ticket.decode, _ticket_persist)
+
+    print(f"\n{BOLD}  TriageX — representation cost per {n} tickets{RESET}")
+    cols = ["objects_heap_mb", "rss_delta_mb", "encode_s", "decode_s", "wire_mb", "persist_s"]
+    print(f"  {'':<16}" + "".join(f"{c:>17}" for c in cols))
+    for name, row in results.items():
+        print(f"  {name:<16}" + "".join(f"{row[c]:>17}" for c in cols))
+    print(f"  {CYAN}(dict persist_s = ONE full JSON rewrite; the old code did this on every add/pop){RESET}\n")
+
+    out = args.out or f"bench_codec_{_git_commit()}_{uuid.uuid4().hex[:6]}.json"
+    with open(out, "w") as f:
+        json.dump({"meta": {"commit": _git_commit(), "timestamp": datetime.now(timezone.utc).isoformat(),
+                            "tickets": n}, "codec": results}, f, indent=2)
+    print(f"  Results written to {out}\n")
+
+
+def run_similar(args) -> None:
+    """
+    Recall and latency of the IVF similarity index against exact brute-force search.
+    History is synthetic: unit vectors scattered around `rows / 50` topic centres (the way
+    ticket embeddings bunch around recurring issues); queries are perturbed history rows.
+    """
+    import numpy as np
+    from similarity_index import SimilarityIndex
+    from ticket import Category, Ticket
+
+    rng = np.random.default_rng(args.seed)
+    dim, n = args.dim, args.rows
+    centres = rng.standard_normal((max(n // 50, 1), dim)).astype(np.float32)
+
+    def _vectors(count):
+        v = centres[rng.integers(len(centres), size=count)] + args.noise * rng.standard_normal((count, dim)).astype(np.float32)
+        return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+    index_dir = tempfile.mkdtemp(prefix="triagex-similar-")
+    index = SimilarityIndex(index_dir, nlist=args.nlist)
+    now = time.time()
+    t0 = time.perf_counter()
+    for start in range(0, n, 10_000):
+        count = min(10_000, n - start)
+        tickets = [Ticket(f"H{start + i}", f"historical ticket {start + i}", Category.TECHNICAL, 0.5, now)
+                   for i in range(count)]
+        index.add_batch(tickets, _vectors(count))
+    index.wait_for_training()  # training runs in the background once nlist × 40 rows exist
+    build_s = time.perf_counter() - t0
+    len(index)  # first refresh (reads meta, groups lists) outside the timed queries
+
+    queries = _vectors(args.queries)
+    exact, exact_lat = [], LatencyHistogram()
+    for q in queries:
+        t0 = time.perf_counter()
+        exact.append({row for row, _ in index.search(q, args.k, exact=True)})
+        exact_lat.record(time.perf_counter() - t0)
+
+    rows = [{"method": "brute_force", "nprobe": None, "recall": 1.0, **exact_lat.to_dict()}]
+    for nprobe in [int(x) for x in args.nprobe.split(",")]:
+        lat, hits = LatencyHistogram(), 0
+        for q, truth in zip(queries, exact):
+            t0 = time.perf_counter()
+            found = index.search(q, args.k, nprobe=nprobe)
+            lat.record(time.perf_counter() - t0)
+            hits += len(truth & {row for row, _ in found})
+        rows.append({"method": "ivf", "nprobe": nprobe,
+                     "recall": round(hits / (len(queries) * args.k), 4), **lat.to_dict()})
+
+    print(f"\n{BOLD}  TriageX — similarity index: {n} rows × {dim} dims, nlist={args.nlist}, "
+          f"recall@{args.k} over {len(queries)} queries{RESET}")
+    print(f"  build + train: {build_s:.1f}s\n")
+    print(f"  {'method':<12}{'nprobe':>8}{'recall':>9}{'p50_ms':>10}{'p99_ms':>10}")
+    for row in rows:
+        print(f"  {row['method']:<12}{row['nprobe'] or '-':>8}{row['recall']:>9}{row['p50_ms']:>10}{row['p99_ms']:>10}")
+    print()
+
+    out = args.out or f"bench_similar_{_git_commit()}_{uuid.uuid4().hex[:6]}.json"
+    with open(out, "w") as f:
+        json.dump({"meta": {"commit": _git_commit(), "timestamp": datetime.now(timezone.utc).isoformat(),
+                            "rows": n, "dim": dim, "nlist": args.nlist, "k": args.k, "build_s": round(build_s, 2)},
+                   "similar": rows}, f, indent=2)
+    print(f"  Results written to {out}\n")
+
+
+def run_cascade(args) -> None:
+    """
+    Offline report for the keyword→transformer cascade over a labeled JSONL file
+    ({"text", "expected_category"?, "expected_urgency"?: "high"|"medium"|"low"}).
+    Every ticket is scored by both tiers once; each threshold is then evaluated on
+    those scores: share of tasks settled by keywords, accuracy against the labels (or
+    agreement with the transformer where a label is missing), and transformer CPU saved.
+    """
+    if args.stub_models:
+        install_stub_models(args.model_latency_ms)
+    import cascade
+    from classifier import classify_ticket
+    from urgency import is_high_urgency, score_urgency
+
+    with open(args.input) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    scored = []
+    for rec in records:
+        text = rec["text"]
+        t0 = time.process_time()
+        tf_category = classify_ticket(text)
+        cls_cpu = time.process_time() - t0
+        t0 = time.process_time()
+        tf_high = is_high_urgency(score_urgency(text))
+        urg_cpu = time.process_time() - t0
+        kw_category, cat_conf = cascade.keyword_classify(text)
+        kw_urgency, urg_conf = cascade.keyword_urgency(text)
+        scored.append({
+            "expected_category": rec.get("expected_category"),
+            "expected_high": None if "expected_urgency" not in rec else rec["expected_urgency"] == "high",
+            "tf_category": tf_category, "tf_high": tf_high, "cls_cpu": cls_cpu, "urg_cpu": urg_cpu,
+            "kw_category": kw_category, "cat_conf": cat_conf,
+            "kw_high": is_high_urgency(kw_urgency), "urg_conf": urg_conf,
+        })
+
+    def _accuracy(pairs):
+        pairs = list(pairs)
+        return round(sum(a == b for a, b in pairs) / len(pairs), 4) if pairs else None
+
+    total_cpu = sum(s["cls_cpu"] + s["urg_cpu"] for s in scored) or 1e-9
+    rows = []
+    for th in [float(x) for x in args.thresholds.split(",")]:
+        cat_kw = [s["cat_conf"] >= th for s in scored]
+        urg_kw = [s["urg_conf"] >= th for s in scored]
+        cascade_cat = [s["kw_category"] if k else s["tf_category"] for s, k in zip(scored, cat_kw)]
+        cascade_high = [s["kw_high"] if k else s["tf_high"] for s, k in zip(scored, urg_kw)]
+        saved = sum(s["cls_cpu"] * k1 + s["urg_cpu"] * k2 for s, k1, k2 in zip(scored, cat_kw, urg_kw))
+
+        def _vs_truth(pred, key, tf_key):
+            # Label when present, otherwise the transformer's answer stands in for it
+            return [(p, s[key] if s[key] is not None else s[tf_key]) for p, s in zip(pred, scored)]
+
+        rows.append({
+            "threshold": th,
+            "classify_keyword_share": round(sum(cat_kw) / len(scored), 4),
+            "urgency_keyword_share": round(sum(urg_kw) / len(scored), 4),
+            "fully_keyword_share": round(sum(a and b for a, b in zip(cat_kw, urg_kw)) / len(scored), 4),
+            "classify_acc_cascade": _accuracy(_vs_truth(cascade_cat, "expected_category", "tf_category")),
+            "classify_acc_transformer": _accuracy(_vs_truth([s["tf_category"] for s in scored], "expected_category", "tf_category")),
+            "urgency_acc_cascade": _accuracy(_vs_truth(cascade_high, "expected_high", "tf_high")),
+            "urgency_acc_transformer": _accuracy(_vs_truth([s["tf_high"] for s in scored], "expected_high", "tf_high")),
+            "transformer_cpu_saved": round(saved / total_cpu, 4),
+        })
+
+    print(f"\n{BOLD}  TriageX — cascade report over {len(scored)} tickets ({args.input}){RESET}")
+    print(f"  {'thresh':>7}{'cls@kw':>9}{'urg@kw':>9}{'both@kw':>9}{'cls acc':>16}{'urg acc':>16}{'CPU saved':>11}")
+    for row in rows:
+        print(f"  {row['threshold']:>7.3f}{row['classify_keyword_share']*100:>8.1f}%{row['urgency_keyword_share']*100:>8.1f}%"
+              f"{row['fully_keyword_share']*100:>8.1f}%"
+              f"{row['classify_acc_cascade']:>8.3f}/{row['classify_acc_transformer']:<7.3f}"
+              f"{row['urgency_acc_cascade']:>8.3f}/{row['urgency_acc_transformer']:<7.3f}"
+              f"{row['transformer_cpu_saved']*100:>10.1f}%")
+    print(f"  {CYAN}(acc = cascade / transformer-only; labels where given, else agreement with the transformer){RESET}\n")
+
+    out = args.out or f"bench_cascade_{_git_commit()}_{uuid.uuid4().hex[:6]}.json"
+    with open(out, "w") as f:
+        json.dump({"meta": {"commit": _git_commit(), "timestamp": datetime.now(timezone.utc).isoformat(),
+                            "input": args.input, "tickets": len(scored)}, "cascade": rows}, f, indent=2)
+    print(f"  Results written to {out}\n")
+
+
+# ─── Results ──────────────────────────────────────────────────────────────────
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def build_results(args, workload: list, recorder: Recorder, elapsed: float) -> dict:
+    submitted = len(workload)
+    fallbacks = sum(v for k, v in recorder.counters.items() if k.startswith("outcome:keyword_fallback"))
+    # 409 = retry arrived while the original was still being scored — expected, not an error
+    errors = sum(v for k, v in recorder.counters.items()
+                 if k.startswith("outcome:error") or (k.startswith("outcome:http_") and k != "outcome:http_409"))
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "host": platform.node(),
+            "args": {k: v for k, v in vars(args).items() if k != "func"},
+        },
+        "summary": {
+            "submitted": submitted,
+            "elapsed_s": round(elapsed, 3),
+            "offered_rate": args.rate,
+            "achieved_rate": round(submitted / elapsed, 2) if elapsed else 0.0,
+            "fallback_rate": round(fallbacks / submitted, 4) if submitted else 0.0,
+            "error_rate": round(errors / submitted, 4) if submitted else 0.0,
+        },
+        "histograms": {name: h.to_dict() for name, h in sorted(recorder.histograms.items())},
+        "counters": dict(sorted(recorder.counters.items())),
+    }
+
+
+def print_results(results: dict) -> None:
+    s = results["summary"]
+    print(f"\n{BOLD}{'='*78}{RESET}")
+    print(f"{BOLD}  TriageX — Benchmark ({results['meta']['args']['target']}, commit {results['meta']['commit']}){RESET}")
+    print(f"{BOLD}{'='*78}{RESET}")
+    print(f"  Submitted : {s['submitted']} in {s['elapsed_s']:.1f}s  "
+          f"(offered {s['offered_rate']}/s, achieved {s['achieved_rate']}/s)")
+    fb_color = GREEN if s["fallback_rate"] < 0.01 else YELLOW
+    err_color = GREEN if not s["error_rate"] else RED
+    print(f"  Fallback  : {fb_color}{s['fallback_rate']*100:.2f}%{RESET}   "
+          f"Errors: {err_color}{s['error_rate']*100:.2f}%{RESET}")
+    print(f"\n  {'histogram':<22}{'count':>8}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'p99.9':>9}{'max':>9}  (ms)")
+    for name, h in results["histograms"].items():
+        print(f"  {name:<22}{h['count']:>8}{h['p50_ms']:>9.1f}{h['p90_ms']:>9.1f}{h['p95_ms']:>9.1f}"
+              f"{h['p99_ms']:>9.1f}{h['p999_ms']:>9.1f}{h['max_ms']:>9.1f}")
+    print(f"\n  {CYAN}Counters: {results['counters']}{RESET}")
+    print(f"{BOLD}{'='*78}{RESET}\n")
+
+
+def compare(args) -> None:
+    """Print p50/p99 and rate deltas between two result files (old → new)."""
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(f"\n{BOLD}  {old['meta']['commit']} → {new['meta']['commit']}{RESET}")
+    for key in ("achieved_rate", "fallback_rate", "error_rate"):
+        print(f"  {key:<22}{old['summary'][key]:>10} → {new['summary'][key]:<10}")
+    for name in sorted(set(old["histograms"]) | set(new["histograms"])):
+        o = old["histograms"].get(name)
+        n = new["histograms"].get(name)
+        if not o or not n:
+            continue
+        for p in ("p50_ms", "p99_ms"):
+            delta = (n[p] - o[p]) / o[p] * 100 if o[p] else 0.0
+            color = RED if delta > 10 else GREEN if delta < -10 else RESET
+            print(f"  {name + ' ' + p:<30}{o[p]:>9.1f} → {n[p]:<9.1f}{color}{delta:+6.1f}%{RESET}")
+    print()
+
+
+def _workload_from_args(args) -> list:
+    return build_workload(args.rate, args.duration, args.mean_words, parse_storms(args.storm), args.seed,
+                          args.retry_fraction, args.urgent_fraction, args.tier_fraction)
+
+
+def run(args) -> None:
+    workload = _workload_from_args(args)
+    recorder = Recorder()
+
+    if args.target == "api":
+        elapsed = run_open_loop(workload, _api_sender(args.url), recorder, args.concurrency)
+    else:
+        elapsed = run_inproc(args, workload, recorder)
+
+    results = build_results(args, workload, recorder, elapsed)
+    print_results(results)
+
+    out = args.out or f"bench_{args.target}_{results['meta']['commit']}_{uuid.uuid4().hex[:6]}.json"
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"  Results written to {out}\n")
+
+
+def run_lanes(args) -> None:
+    """
+    Same workload through the inproc pipeline twice: FIFO inference (INFERENCE_LANES=off)
+    and priority lanes. Reports submit latency and breaker fallback rate per lane.
+    """
+    workload = _workload_from_args(args)
+    import scheduler
+
+    def _lane(text, kind):
+        return scheduler.lane_for(text, "enterprise" if kind == "enterprise" else None)
+
+    modes = {}
+    for mode in ("fifo", "lanes"):
+        recorder = Recorder()
+
+        def _setup(main, lanes_enabled=(mode == "lanes")):
+            main.inference_scheduler = scheduler.InferenceScheduler(lanes_enabled=lanes_enabled)
+
+        elapsed = run_inproc(args, workload, recorder, label=_lane, setup=_setup)
+        per_lane = {}
+        for lane in scheduler.LANES:
+            hist = recorder.histograms.get(f"submit[{lane}]")
+            if hist is None:
+                continue
+            fallbacks = sum(v for k, v in recorder.counters.items() if k.startswith(f"{lane}:keyword_fallback"))
+            per_lane[lane] = {**hist.to_dict(), "fallback_rate": round(fallbacks / hist.total, 4)}
+        modes[mode] = {"elapsed_s": round(elapsed, 3), "lanes": per_lane}
+
+    print(f"\n{BOLD}  TriageX — inference lanes ({len(workload)} tickets at {args.rate}/s, "
+          f"stub latency {args.model_latency_ms}ms){RESET}")
+    print(f"  {'mode':<7}{'lane':<10}{'count':>7}{'p50':>9}{'p99':>9}{'fallback':>10}  (ms)")
+    for mode, result in modes.items():
+        for lane, row in result["lanes"].items():
+            color = GREEN if row["fallback_rate"] < 0.01 else YELLOW
+            print(f"  {mode:<7}{lane:<10}{row['count']:>7}{row['p50_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+                  f"{color}{row['fallback_rate']*100:>9.1f}%{RESET}")
+    print()
+
+    out = args.out or f"bench_lanes_{_git_commit()}_{uuid.uuid4().hex[:6]}.json"
+    with open(out, "w") as f:
+        json.dump({"meta": {"commit": _git_commit(), "timestamp": datetime.now(timezone.utc).isoformat(),
+                            "args": {k: v for k, v in vars(args).items() if k != "func"}},
+                   "modes": modes}, f, indent=2)
+    print(f"  Results written to {out}\n")
+
+
+def build_tenant_workload(args) -> list:
+    """
+    `args.tenants` quiet tenants sharing `args.rate`/s, plus one tenant ("noisy") sending
+    `args.noisy_rate`/s from `args.noisy_start` s on, every tenant with `args.urgent_fraction`
+    urgent tickets. Kinds are "tenant:<id>".
+    """
+    if not 0 <= args.noisy_start < args.duration:
+        raise ValueError(f"--noisy-start ({args.noisy_start:g}s) must be at least 0 and less than "
+                         f"--duration ({args.duration:g}s), or the noisy tenant sends nothing")
+    streams = [(f"quiet-{i + 1}", args.rate / args.tenants, args.duration, 0.0) for i in range(args.tenants)]
+    streams.append(("noisy", args.noisy_rate, args.duration - args.noisy_start, args.noisy_start))
+    workload = []
+    for seed, (tenant, rate, duration, start) in enumerate(streams, args.seed):
+        for offset, ticket_id, text, _ in build_workload(rate, duration, args.mean_words, [], seed,
+                                                         urgent_fraction=args.urgent_fraction):
+            workload.append((start + offset, f"{tenant}-{ticket_id}", text, f"tenant:{tenant}"))
+    workload.sort(key=lambda a: a[0])
+    return workload
+
+
+def run_tenants(args) -> None:
+    """
+    Same multi-tenant workload through the inproc pipeline three times: admission off
+    with FIFO inference lanes, per-tenant fair queuing only, and full admission control
+    (token buckets + load shedding + fair queuing). Reports per tenant group.
+    """
+    workload = build_tenant_workload(args)
+    import admission
+    import scheduler
+    admission.TENANT_RATE, admission.TENANT_BURST = args.tenant_rate, args.tenant_burst
+
+    def _group(text, kind):
+        return "noisy" if kind == "tenant:noisy" else "quiet"
+
+    modes = {}
+    for mode in ("off", "fair", "admission"):
+        recorder = Recorder()
+
+        def _setup(main, mode=mode):
+            main.inference_scheduler = scheduler.InferenceScheduler(fair_queuing=(mode != "off"))
+            # FakeRedis has no Lua, so buckets are per-process here — one process, same result
+            main.admission_controller = admission.AdmissionController(enabled=(mode == "admission"), backend="local")
+
+        elapsed = run_inproc(args, workload, recorder, label=_group, setup=_setup)
+        groups = {}
+        for group in ("quiet", "noisy"):
+            hist = recorder.histograms.get(f"submit[{group}]")
+            if hist is None:
+                continue
+            outcomes = {k.split(":", 1)[1]: v for k, v in recorder.counters.items() if k.startswith(f"{group}:")}
+            shed = outcomes.get("http_429", 0)
+            fallbacks = sum(v for k, v in outcomes.items() if k.startswith("keyword_fallback"))
+            groups[group] = {**hist.to_dict(), "shed_rate": round(shed / hist.total, 4),
+                             "fallback_rate": round(fallbacks / max(1, hist.total - shed), 4)}
+        modes[mode] = {"elapsed_s": round(elapsed, 3), "groups": groups}
+
+    print(f"\n{BOLD}  TriageX — tenant isolation ({args.tenants} quiet tenants at {args.rate}/s total, "
+          f"noisy tenant at {args.noisy_rate}/s, limit {args.tenant_rate:g}/s){RESET}")
+    print(f"  {'mode':<11}{'tenants':<8}{'count':>7}{'p50':>9}{'p99':>9}{'429':>8}{'fallback':>10}  (ms)")
+    for mode, result in modes.items():
+        for group, row in result["groups"].items():
+            color = GREEN if row["fallback_rate"] < 0.01 else YELLOW
+            print(f"  {mode:<11}{group:<8}{row['count']:>7}{row['p50_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+                  f"{row['shed_rate']*100:>7.1f}%{color}{row['fallback_rate']*100:>9.1f}%{RESET}")
+    print()
+
+    out = args.out or f"bench_tenants_{_git_commit()}_{uuid.uuid4().hex[:6]}.json"
+    with open(out, "w") as f:
+        json.dump({"meta": {"commit": _git_commit(), "timestamp": datetime.now(timezone.utc).isoformat(),
+                            "args": {k: v for k, v in vars(args).items() if k != "func"}},
+                   "modes": modes}, f, indent=2)
+    print(f"  Results written to {out}\n")
+
+
+def _add_load_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--rate", type=float, default=50.0, help="mean arrival rate (tickets/s, Poisson)")
+    p.add_argument("--duration", type=float, default=30.0, help="seconds of arrivals to generate")
+    p.add_argument("--mean-words", type=int, default=20, help="median ticket length in words")
+    p.add_argument("--storm", action="append", metavar="START:COUNT:SPAN",
+                   help="inject COUNT near-identical tickets over SPAN s starting at START s (repeatable)")
+    p.add_argument("--concurrency", type=int, default=256, help="max in-flight requests")
+    p.add_argument("--retry-fraction", type=float, default=0.0, help="fraction of tickets resubmitted with the same ID")
+    p.add_argument("--urgent-fraction", type=float, default=None,
+                   help="fraction of tickets with urgency keywords (default: the sample texts' natural mix)")
+    p.add_argument("--tier-fraction", type=float, default=0.0,
+                   help="fraction of tickets sent with X-Customer-Tier: enterprise")
+    p.add_argument("--seed", type=int, default=42, help="workload RNG seed (same seed → same workload)")
+    p.add_argument("--out", default=None, help="results JSON path")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TriageX open-loop benchmark harness.")
+    sub = parser.add_subparsers(dest="target", required=True)
+
+    api = sub.add_parser("api", help="drive a running API over HTTP")
+    api.add_argument("--url", default="http://localhost:8000")
+    _add_load_args(api)
+    api.set_defaults(func=run)
+
+    inproc = sub.add_parser("inproc", help="drive main/worker/queue/dedup/routing in-process")
+    inproc.add_argument("--stub-models", action="store_true", help="replace transformer models with keyword stubs")
+    inproc.add_argument("--model-latency-ms", type=float, default=50.0, help="mean stub inference latency per ticket")
+    inproc.add_argument("--route-interval", type=float, default=0.5, help="seconds between routing solves")
+    inproc.add_argument("--route-batch", type=int, default=10, help="tickets per routing solve")
+    _add_load_args(inproc)
+    inproc.set_defaults(func=run)
+
+    lanes = sub.add_parser("lanes", help="per-lane latency under mixed load: FIFO vs priority lanes")
+    lanes.add_argument("--stub-models", action="store_true", help="replace transformer models with keyword stubs")
+    lanes.add_argument("--model-latency-ms", type=float, default=50.0, help="mean stub inference latency per ticket")
+    lanes.add_argument("--route-interval", type=float, default=0.5, help="seconds between routing solves")
+    lanes.add_argument("--route-batch", type=int, default=10, help="tickets per routing solve")
+    _add_load_args(lanes)
+    lanes.set_defaults(func=run_lanes, rate=120.0, duration=20.0, urgent_fraction=0.05, tier_fraction=0.1)
+
+    tenants = sub.add_parser("tenants", help="noisy-tenant isolation: no admission vs fair queuing vs full admission")
+    tenants.add_argument("--stub-models", action="store_true", help="replace transformer models with keyword stubs")
+    tenants.add_argument("--model-latency-ms", type=float, default=50.0, help="mean stub inference latency per ticket")
+    tenants.add_argument("--route-interval", type=float, default=0.5, help="seconds between routing solves")
+    tenants.add_argument("--route-batch", type=int, default=10, help="tickets per routing solve")
+    tenants.add_argument("--tenants", type=int, default=4, help="quiet tenants sharing --rate")
+    tenants.add_argument("--noisy-rate", type=float, default=300.0, help="noisy tenant's arrival rate (tickets/s)")
+    tenants.add_argument("--noisy-start", type=float, default=5.0, help="seconds before the noisy tenant starts")
+    tenants.add_argument("--tenant-rate", type=float, default=10.0, help="per-tenant token bucket rate")
+    tenants.add_argument("--tenant-burst", type=float, default=50.0, help="per-tenant token bucket size")
+    _add_load_args(tenants)
+    tenants.set_defaults(func=run_tenants, rate=20.0, duration=20.0)
+
+    drain = sub.add_parser("drain", help="stream drain throughput vs number of workers (real Redis)")
+    drain.add_argument("--tickets", type=int, default=10000, help="entries pre-filled into the stream")
+    drain.add_argument("--workers", default="1,2,4", help="comma-separated worker counts to try")
+    drain.add_argument("--stub-models", action="store_true", help="replace the MiniLM embedder with a stub")
+    drain.add_argument("--model-latency-ms", type=float, default=0.0, help="mean stub inference latency")
+    drain.add_argument("--mean-words", type=int, default=20)
+    drain.add_argument("--seed", type=int, default=42)
+    drain.add_argument("--out", default=None)
+    drain.set_defaults(func=run_drain)
+
+    codec = sub.add_parser("codec", help="memory and serialization cost: dict/JSON vs Ticket/msgpack")
+    codec.add_argument("--tickets", type=int, default=100_000)
+    codec.add_argument("--mean-words", type=int, default=20)
+    codec.add_argument("--seed", type=int, default=42)
+    codec.add_argument("--out", default=None)
+    codec.set_defaults(func=run_codec)
+
+    casc = sub.add_parser("cascade", help="tier shares, accuracy and CPU saved for the model cascade")
+    casc.add_argument("input", nargs="?", default="labeled_tickets.jsonl", help="labeled JSONL tickets")
+    casc.add_argument("--thresholds", default="0.5,0.75,0.875", help="comma-separated escalation thresholds")
+    casc.add_argument("--stub-models", action="store_true")
+    casc.add_argument("--model-latency-ms", type=float, default=0.0)
+    casc.add_argument("--out", default=None)
+    casc.set_defaults(func=run_cascade)
+
+    sim = sub.add_parser("similar", help="recall/latency of the similarity index vs brute force")
+    sim.add_argument("--rows", type=int, default=200_000, help="historical tickets in the index")
+    sim.add_argument("--dim", type=int, default=384, help="embedding size (MiniLM = 384)")
+    sim.add_argument("--nlist", type=int, default=1024, help="IVF lists")
+    sim.add_argument("--nprobe", default="4,8,16,32,64", help="comma-separated lists scanned per query")
+    sim.add_argument("--k", type=int, default=10)
+    sim.add_argument("--queries", type=int, default=200)
+    sim.add_argument("--noise", type=float, default=0.5, help="per-dim spread of tickets around a topic")
+    sim.add_argument("--seed", type=int, default=42)
+    sim.add_argument("--out", default=None)
+    sim.set_defaults(func=run_similar)
+
+    cmp_ = sub.add_parser("compare", help="compare two result files")
+    cmp_.add_argument("old")
+    cmp_.add_argument("new")
+    cmp_.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    if args.target == "tenants" and not 0 <= args.noisy_start < args.duration:
+        parser.error(f"--noisy-start ({args.noisy_start:g}) must be at least 0 and less than --duration ({args.duration:g})")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
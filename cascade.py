@@ -0,0 +1,93 @@
+# Confidence-gated model cascade: a scored keyword tier decides the easy tickets,
+# and only ambiguous ones are escalated to the transformers.
+#
+# Classification and urgency are gated independently — "refund for invoice" skips
+# BART-MNLI but may still need RoBERTa for urgency, and vice versa.
+#
+# Confidence is (share of keyword hits going to the winner) × (1 − 0.5^hits): a single
+# exclusive hit scores 0.5, two exclusive hits 0.75, three 0.875. Mixed signals
+# ("refund" + "lawsuit") score lower. The default threshold of 0.75 therefore needs
+# at least two unambiguous keywords before the transformer is skipped.
+#
+# Because a confident hit skips the transformer, keywords only count as whole words
+# (plus a plural "s"/"es"): "downgrade" is not "down", "rapid" is not "api". A keyword
+# with a negation up to two words before it ("not urgent", "isn't really critical",
+# "no billing question") in the same sentence does not count either. "can't"/"cannot" are not negations here:
+# "can't login" is still a login problem.
+
+import os
+import re
+
+from config import BILLING_KEYWORDS, LEGAL_KEYWORDS, TECHNICAL_KEYWORDS, URGENCY_FLAGS
+
+CASCADE_ENABLED = os.getenv("CASCADE_MODE", "off").lower() in ("on", "1", "true")
+CASCADE_THRESHOLD = float(os.getenv("CASCADE_THRESHOLD", 0.75))
+
+_CATEGORY_KEYWORDS = {
+    "Billing": BILLING_KEYWORDS,
+    "Technical": TECHNICAL_KEYWORDS,
+    "Legal": LEGAL_KEYWORDS,
+}
+
+KEYWORD_HIGH_URGENCY = 0.9  # same value _fallback_urgency uses for a flagged ticket
+
+_NEGATION = re.compile(
+    r"\b(?:no|not|never|without|nothing|(?:is|are|was|were|do|does|did)n't)[^\w.!?;]+(?:\w+[^\w.!?;]+){0,2}$"
+)
+
+
+def _patterns(keywords) -> list:
+    return [re.compile(r"\b" + re.escape(kw) + r"(?:s|es)?\b") for kw in keywords]
+
+
+_CATEGORY_PATTERNS = {cat: _patterns(kws) for cat, kws in _CATEGORY_KEYWORDS.items()}
+_URGENCY_PATTERNS = _patterns(URGENCY_FLAGS)
+
+
+def _normalize(text: str) -> str:
+    return text.lower().replace("\u2019", "'")
+
+
+def _hits(t: str, patterns: list) -> int:
+    """Number of keywords with at least one non-negated whole-word occurrence in t."""
+    return sum(
+        any(not _NEGATION.search(t[max(0, m.start() - 40):m.start()]) for m in p.finditer(t))
+        for p in patterns
+    )
+
+
+def _confidence(winner_hits: int, total_hits: int) -> float:
+    if not winner_hits:
+        return 0.0
+    return (winner_hits / total_hits) * (1.0 - 0.5 ** winner_hits)
+
+
+def keyword_classify(text: str) -> tuple:
+    """Return (category, confidence) from keyword hits; confidence 0.0 if nothing matched."""
+    t = _normalize(text)
+    hits = {cat: _hits(t, patterns) for cat, patterns in _CATEGORY_PATTERNS.items()}
+    category = max(hits, key=hits.get)
+    return category, _confidence(hits[category], sum(hits.values()))
+
+
+def keyword_urgency(text: str) -> tuple:
+    """
+    Return ({"urgency": float}, confidence). Only the presence of urgency flags is
+    trusted — a flag-free ticket can still be furious, so it always gets confidence 0.0.
+    """
+    flags = _hits(_normalize(text), _URGENCY_PATTERNS)
+    return {"urgency": KEYWORD_HIGH_URGENCY if flags else 0.3}, _confidence(flags, flags)
+
+
+def decide(text: str, threshold: float = None) -> tuple:
+    """
+    Keyword tier of the cascade. Returns (category or None, urgency_score or None);
+    None means that task is ambiguous and must be escalated to the transformer.
+    """
+    threshold = CASCADE_THRESHOLD if threshold is None else threshold
+    category, cat_conf = keyword_classify(text)
+    urgency, urg_conf = keyword_urgency(text)
+    return (
+        category if cat_conf >= threshold else None,
+        urgency if urg_conf >= threshold else None,
+    )
@@ -8,11 +8,7 @@ _classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mn
 CANDIDATE_LABELS = ["Billing", "Technical", "Legal"]
 
 
-def classify_ticket(text: str) -> str:
-    if not text or not text.strip():
-        return "General"
-
-    result = _classifier(text, CANDIDATE_LABELS, multi_label=False)
+def _label_from_result(result) -> str:
     top_label = result["labels"][0]
     top_score = result["scores"][0]
 
@@ -21,3 +17,24 @@ def classify_ticket(text: str) -> str:
         return "General"
 
     return top_label
+
+
+def classify_ticket(text: str) -> str:
+    if not text or not text.strip():
+        return "General"
+
+    result = _classifier(text, CANDIDATE_LABELS, multi_label=False)
+    return _label_from_result(result)
+
+
+def classify_tickets(texts: list, batch_size: int = 16) -> list:
+    """Batched variant of classify_ticket — one pipeline call for the whole list."""
+    labels = ["General"] * len(texts)
+    idx = [i for i, t in enumerate(texts) if t and t.strip()]
+    if not idx:
+        return labels
+
+    results = _classifier([texts[i] for i in idx], CANDIDATE_LABELS, multi_label=False, batch_size=batch_size)
+    for i, result in zip(idx, results):
+        labels[i] = _label_from_result(result)
+    return labels
@@ -22,5 +22,7 @@ URGENCY_FLAGS = [
     "right now", "as soon as possible"
 ]
 
+HIGH_URGENCY_THRESHOLD = 0.75  # raised: 0.7 → 0.75 to reduce false positives
+
 MAX_URGENCY_SCORE = 10
 BASE_URGENCY_SCORE = 1
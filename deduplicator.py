@@ -1,33 +1,62 @@
+import math
+import os
 import time
 import threading
-from sentence_transformers import SentenceTransformer, util
+import uuid
+
+import numpy as np
+import redis
+from sentence_transformers import SentenceTransformer
+
+import metrics
+
+# local = per-process ticket list (single worker); redis = storm state shared by all workers
+STORM_BACKEND = os.getenv("STORM_BACKEND", "local")
 
 # Load lightweight sentence embedding model
 # Uses all-MiniLM-L6-v2 which is fast and perfect for real-time deduplication
 embedder = SentenceTransformer('all-MiniLM-L6-v2')
 
+
+def _unit(emb):
+    """Any embedding (numpy row, CPU tensor) as a unit-length float32 vector."""
+    vec = np.asarray(emb, dtype=np.float32).ravel()
+    return vec / (np.linalg.norm(vec) or 1.0)
+
+
+def embed(text: str):
+    """
+    MiniLM embedding as a unit-length float32 vector. The worker computes it once per
+    ticket and hands it to both check_storm() and the similarity index.
+    """
+    with metrics.STORM_ENCODE_SECONDS.time():
+        return _unit(embedder.encode(text))
+
+
 class Deduplicator:
     def __init__(self):
-        # Stores tuples of (timestamp, text, embedding_tensor)
+        # Stores tuples of (timestamp, text, unit embedding)
         self.recent_tickets = []
         self.lock = threading.Lock()
         self.similarity_threshold = 0.9
         self.time_window_seconds = 300  # 5 minutes
         self.storm_threshold = 10       # Suppress if > 10 similar tickets
 
-    def check_storm(self, text: str) -> str:
+    def check_storm(self, text: str, now: float = None, emb=None) -> str:
         """
         Identify Ticket Storms / Flash-Floods using Semantic Deduplication.
+        `now` overrides the wall clock (used when replaying historical tickets) and
+        `emb` lets callers pass an embedding they already computed in a batch.
         Returns:
             "master" if exactly storm_threshold similar tickets triggered a master incident.
             "suppress" if part of an existing storm (suppress individual alert).
             "normal" if it's a unique ticket or storm threshold not met.
         """
-        current_time = time.time()
+        current_time = time.time() if now is None else now
         # Compute sentence embedding for the incoming ticket
-        emb = embedder.encode(text, convert_to_tensor=True)
+        emb = embed(text) if emb is None else _unit(emb)
 
-        with self.lock:
+        with metrics.STORM_SIMILAR_SECONDS.time(), self.lock:
             # 1. Clean up tickets older than the 5-minute time window
             self.recent_tickets = [
                 t for t in self.recent_tickets
@@ -35,13 +64,12 @@ class Deduplicator:
             ]
 
             # 2. Calculate Cosine Similarity against all remaining recent tickets
+            #    (unit vectors, so one matrix-vector product covers the whole window)
             similar_count = 0
-            for t in self.recent_tickets:
-                # util.cos_sim returns a 2D tensor, .item() gets the float value
-                sim = util.cos_sim(emb, t[2]).item()
-                if sim > self.similarity_threshold:
-                    similar_count += 1
-                    
+            if self.recent_tickets:
+                sims = np.stack([t[2] for t in self.recent_tickets]) @ emb
+                similar_count = int((sims > self.similarity_threshold).sum())
+
             # 3. Add current ticket to recent list
             self.recent_tickets.append((current_time, text, emb))
 
@@ -56,5 +84,212 @@ class Deduplicator:
                 # Under threshold: business as usual
                 return "normal"
 
+
+# ─── Shared backend ───────────────────────────────────────────────────────────
+#
+# With several worker containers each Deduplicator above sees only its share of a storm.
+# The shared backend keeps storm state in Redis as clusters instead of raw tickets:
+#
+#   {storm}:centroids           HASH  cluster_id → float32 leader embedding
+#   {storm}:clusters            ZSET  cluster_id → last activity timestamp
+#   {storm}:members:<cid>       ZSET  one member per ticket → timestamp
+#   {storm}:master:<cid>        flag, SET NX by whichever worker tips the cluster over
+#   {storm}:incident:<cid>      flag, SET NX on the storm's oldest cluster; one per storm
+#
+# A ticket joins the oldest cluster whose leader is > similarity_threshold away, else it
+# leads a new one. The window trim, count, insert and master flag run in one Lua script,
+# so any number of workers agree on each cluster's count. Workers that miss at the same
+# moment can each open a cluster for the same storm, so a cluster tipping over does not
+# fire the Master Incident by itself: the worker re-matches against every active
+# cluster and claims the incident flag of the oldest similar one, and only the worker
+# that sets it gets "master".
+# Centroids never change once written, so each worker caches the active ones and only
+# fetches clusters that became active since its last refresh — a ticket that matches
+# the cache costs a single round-trip. On a miss the cache is topped up with clusters
+# newer than the last refresh, at most once per STORM_MISS_REFRESH seconds, and a new
+# cluster's centroid is written by the same script call that counts the ticket, so a
+# run of unique tickets does not pay two extra round-trips each. The {storm} hash tag
+# keeps every key in one slot.
+
+STORM_KEY_PREFIX = "{storm}:"
+STORM_CACHE_TTL = float(os.getenv("STORM_CACHE_TTL", 1.0))  # seconds between cache refreshes
+STORM_MISS_REFRESH = float(os.getenv("STORM_MISS_REFRESH", 0.1))  # min seconds between refreshes forced by a miss
+CLOCK_SKEW_MARGIN = 5.0   # seconds of overlap when asking Redis what changed since the last refresh
+CLEANUP_INTERVAL = 30.0   # seconds between sweeps of expired clusters
+
+_STORM_SCRIPT = """
+local now, window = tonumber(ARGV[1]), tonumber(ARGV[2])
+local ttl = math.ceil(window)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local similar = redis.call('ZCARD', KEYS[1])
+redis.call('ZADD', KEYS[1], now, ARGV[3])
+redis.call('EXPIRE', KEYS[1], ttl)
+if ARGV[6] ~= '' then
+    redis.call('HSET', KEYS[4], ARGV[5], ARGV[6])
+end
+redis.call('ZADD', KEYS[3], 'GT', now, ARGV[5])
+if similar < tonumber(ARGV[4]) then
+    return 'normal'
+end
+if redis.call('SET', KEYS[2], '1', 'NX', 'EX', ttl) then
+    return 'master'
+end
+redis.call('EXPIRE', KEYS[2], ttl)
+return 'suppress'
+"""
+
+_CLEANUP_SCRIPT = """
+local stale = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 1000)
+if #stale > 0 then
+    redis.call('ZREM', KEYS[1], unpack(stale))
+    redis.call('HDEL', KEYS[2], unpack(stale))
+end
+return #stale
+"""
+
+
+class SharedDeduplicator:
+    def __init__(self, r=None):
+        self.r = r or redis.Redis(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            db=0,
+            decode_responses=False,
+        )
+        self.lock = threading.Lock()
+        self.similarity_threshold = 0.9
+        self.time_window_seconds = 300  # 5 minutes
+        self.storm_threshold = 10       # Suppress if > 10 similar tickets
+
+        self.centroids_key = STORM_KEY_PREFIX + "centroids"
+        self.clusters_key = STORM_KEY_PREFIX + "clusters"
+        self._storm = self.r.register_script(_STORM_SCRIPT)
+        self._cleanup = self.r.register_script(_CLEANUP_SCRIPT)
+
+        # Local cache of active clusters: ids, stacked unit-length leader embeddings, last activity
+        self._ids = []
+        self._matrix = None
+        self._last_active = {}
+        self._last_refresh = 0.0
+        self._last_miss_refresh = 0.0
+        self._last_cleanup = 0.0
+
+    def _refresh(self, now: float, since: float = None) -> None:
+        """
+        Pull clusters active since `since`; by default a full refresh from the last one,
+        minus CLOCK_SKEW_MARGIN. Must be called while holding self.lock.
+        """
+        full = since is None
+        if full:
+            since = self._last_refresh - CLOCK_SKEW_MARGIN if self._last_refresh else now - self.time_window_seconds
+        active = self.r.zrangebyscore(self.clusters_key, since, "+inf", withscores=True)
+        for cid, ts in active:
+            self._last_active[cid.decode()] = ts
+
+        horizon = now - self.time_window_seconds
+        keep = [i for i, cid in enumerate(self._ids) if self._last_active.get(cid, 0) > horizon]
+        ids = [self._ids[i] for i in keep]
+        rows = [self._matrix[keep]] if keep else []
+
+        known = set(ids)
+        new = [cid for cid, ts in self._last_active.items() if cid not in known and ts > horizon]
+        if new:
+            for cid, blob in zip(new, self.r.hmget(self.centroids_key, new)):
+                if blob is not None:
+                    ids.append(cid)
+                    rows.append(np.frombuffer(blob, dtype=np.float32)[None, :])
+
+        self._ids = ids
+        self._matrix = np.vstack(rows) if rows else None
+        self._last_active = {cid: ts for cid, ts in self._last_active.items() if ts > horizon}
+        if full:
+            self._last_refresh = now
+
+        if now - self._last_cleanup >= CLEANUP_INTERVAL:
+            self._cleanup(keys=[self.clusters_key, self.centroids_key], args=[horizon])
+            self._last_cleanup = now
+
+    def _match(self, vec):
+        """Oldest cached cluster whose leader is similar enough, so racing workers converge on one."""
+        if self._matrix is None or self._matrix.shape[1] != vec.shape[0]:
+            return None
+        hits = np.flatnonzero(self._matrix @ vec > self.similarity_threshold)
+        if not len(hits):
+            return None
+        return min(self._ids[i] for i in hits)  # ids start with the creation time, so min = oldest
+
+    def _open_cluster(self, vec, now: float) -> str:
+        """
+        Make this ticket the leader of a new cluster in the local cache; the storm script
+        writes its centroid to Redis. Must be called while holding self.lock.
+        """
+        cid = f"{int(now * 1000):013d}-{uuid.uuid4().hex[:8]}"
+        self._ids.append(cid)
+        self._matrix = vec[None, :] if self._matrix is None else np.vstack([self._matrix, vec])
+        self._last_active[cid] = now
+        return cid
+
+    def _forget(self, cid: str) -> None:
+        """Drop a cluster from the local cache. Must be called while holding self.lock."""
+        if cid in self._ids:
+            i = self._ids.index(cid)
+            del self._ids[i]
+            self._matrix = np.delete(self._matrix, i, axis=0) if self._ids else None
+        self._last_active.pop(cid, None)
+
+    def _claim_incident(self, cid: str, vec, now: float) -> str:
+        """
+        `cid` just tipped over. Claim the Master Incident for the storm's oldest active
+        cluster similar to this ticket — the same root for every cluster racing workers
+        opened — so a storm split across clusters still fires once.
+        """
+        with self.lock:
+            self._refresh(now)
+            root = min(filter(None, (self._match(vec), cid)))
+        claimed = self.r.set(STORM_KEY_PREFIX + "incident:" + root, "1", nx=True,
+                             ex=math.ceil(self.time_window_seconds))
+        return "master" if claimed else "suppress"
+
+    def check_storm(self, text: str, now: float = None, emb=None) -> str:
+        """Same contract as Deduplicator.check_storm, counted across every worker sharing Redis."""
+        current_time = time.time() if now is None else now
+        vec = embed(text) if emb is None else _unit(emb)
+
+        with metrics.STORM_SIMILAR_SECONDS.time():
+            with self.lock:
+                if current_time - self._last_refresh >= STORM_CACHE_TTL:
+                    self._refresh(current_time)
+                cid = self._match(vec)
+                if cid is None and current_time - self._last_miss_refresh >= STORM_MISS_REFRESH:
+                    # Another worker may have opened a matching cluster since the last refresh
+                    self._refresh(current_time, since=max(self._last_refresh, self._last_miss_refresh))
+                    self._last_miss_refresh = current_time
+                    cid = self._match(vec)
+                centroid = b""
+                if cid is None:
+                    cid = self._open_cluster(vec, current_time)
+                    centroid = vec.tobytes()
+
+            try:
+                status = self._storm(
+                    keys=[
+                        STORM_KEY_PREFIX + "members:" + cid,
+                        STORM_KEY_PREFIX + "master:" + cid,
+                        self.clusters_key,
+                        self.centroids_key,
+                    ],
+                    args=[current_time, self.time_window_seconds, uuid.uuid4().hex, self.storm_threshold, cid, centroid],
+                )
+            except redis.RedisError:
+                if centroid:
+                    with self.lock:
+                        self._forget(cid)  # its centroid never reached Redis
+                raise
+            status = status.decode() if isinstance(status, bytes) else status
+            if status == "master":
+                status = self._claim_incident(cid, vec, current_time)
+        return status
+
+
 # Singleton instance
-deduplicator = Deduplicator()
+deduplicator = SharedDeduplicator() if STORM_BACKEND == "redis" else Deduplicator()
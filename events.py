@@ -0,0 +1,183 @@
+# Push channel for dashboards (GET /stream). Queue and agent changes are published once
+# to Redis pub/sub and fanned out by each API process to its SSE viewers, so keeping N
+# dashboards current no longer costs N polls of peek_queue / get_agent_status.
+#
+# Producer side (API or worker): emitting is a non-blocking put on a bounded in-process
+# buffer; a daemon thread drains it and PUBLISHes batches as one JSON array, so
+# queue_manager never does network I/O under its lock. Events are best-effort — when
+# Redis is unreachable or the buffer is full they are dropped and counted, and viewers
+# recover by resyncing from a snapshot.
+#
+# Consumer side (API): one Broadcaster thread holds the only subscription and hands each
+# message, framed as SSE text once, to every viewer's bounded asyncio.Queue. A viewer too
+# slow to keep up has its backlog replaced by a single RESYNC marker.
+#
+# Queue events: enqueued, popped. Agent events: agent_load. (There is no reprioritize
+# operation in queue_manager — a ticket's urgency is fixed once it is scored.)
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import redis
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+EVENTS_ENABLED = os.getenv("EVENTS", "on").lower() in ("on", "1", "true")
+EVENTS_CHANNEL = "triagex:events"
+BUFFER_SIZE = 10_000        # pending events per process before new ones are dropped
+PUBLISH_BATCH = 256         # events per PUBLISH
+VIEWER_QUEUE_SIZE = 256     # frames a viewer may lag behind before it is told to resync
+RESYNC = "resync"           # marker: deltas were lost, send the viewer a fresh snapshot
+
+_buffer = queue.Queue(maxsize=BUFFER_SIZE)
+_publisher = None
+_start_lock = threading.Lock()
+_client = None
+
+
+def _redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            db=0,
+            decode_responses=True,
+        )
+    return _client
+
+
+# ─── Producer ─────────────────────────────────────────────────────────────────
+
+def _emit(kind: str, payload) -> None:
+    global _publisher
+    if not EVENTS_ENABLED:
+        return
+    if _publisher is None:
+        with _start_lock:
+            if _publisher is None:
+                _publisher = threading.Thread(target=_publish_loop, name="events-publisher", daemon=True)
+                _publisher.start()
+    try:
+        _buffer.put_nowait((kind, time.time(), payload))
+    except queue.Full:
+        metrics.EVENTS_DROPPED.inc()
+
+
+def ticket_enqueued(ticket) -> None:
+    _emit("enqueued", ticket)
+
+
+def ticket_popped(ticket) -> None:
+    _emit("popped", ticket)
+
+
+def agent_load(agent) -> None:
+    # Snapshot now: the agent keeps changing after this returns
+    _emit("agent_load", {
+        "id": agent.agent_id,
+        "capacity": agent.capacity,
+        "current_load": len(agent.assigned_tickets),
+        "assigned_tickets": [t.id for t in agent.assigned_tickets],
+    })
+
+
+def _encode(kind: str, ts: float, payload) -> dict:
+    """Serialize off the hot path, in the publisher thread."""
+    if kind == "enqueued":
+        return {"type": kind, "ts": ts, "ticket": payload.to_dict()}
+    if kind == "popped":
+        return {"type": kind, "ts": ts, "id": payload.id, "category": payload.category.label}
+    return {"type": kind, "ts": ts, "agent": payload}
+
+
+def _publish_loop() -> None:
+    warned = 0.0
+    while True:
+        batch = [_buffer.get()]
+        while len(batch) < PUBLISH_BATCH:
+            try:
+                batch.append(_buffer.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _redis().publish(EVENTS_CHANNEL, json.dumps([_encode(*e) for e in batch]))
+            metrics.EVENTS_PUBLISHED.inc(len(batch))
+        except redis.RedisError as e:
+            metrics.EVENTS_DROPPED.inc(len(batch))
+            if time.monotonic() - warned > 60:
+                log.warning("Dropping dashboard events, Redis publish failed: %s", e)
+                warned = time.monotonic()
+
+
+# ─── Consumer (API) ───────────────────────────────────────────────────────────
+
+def _offer(queues: list, frame: str) -> None:
+    """Runs on the viewers' event loop."""
+    for q in queues:
+        if q.full():
+            while not q.empty():
+                q.get_nowait()
+            q.put_nowait(RESYNC)
+        else:
+            q.put_nowait(frame)
+
+
+class Broadcaster:
+    def __init__(self):
+        self._viewers = {}  # event loop → set of viewer queues on that loop
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self) -> asyncio.Queue:
+        """Register a viewer on the running event loop; returns the queue its frames arrive on."""
+        loop = asyncio.get_running_loop()
+        q = asyncio.Queue(maxsize=VIEWER_QUEUE_SIZE)
+        with self._lock:
+            self._viewers.setdefault(loop, set()).add(q)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="events-broadcaster", daemon=True)
+                self._thread.start()
+        metrics.STREAM_VIEWERS.inc()
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue) -> None:
+        with self._lock:
+            for loop, queues in list(self._viewers.items()):
+                queues.discard(q)
+                if not queues:
+                    del self._viewers[loop]
+        metrics.STREAM_VIEWERS.dec()
+
+    def _deliver(self, frame: str) -> None:
+        with self._lock:
+            targets = [(loop, list(queues)) for loop, queues in self._viewers.items()]
+        # One callback per event loop, not per viewer
+        for loop, queues in targets:
+            try:
+                loop.call_soon_threadsafe(_offer, queues, frame)
+            except RuntimeError:
+                pass  # loop closed during shutdown
+
+    def _run(self) -> None:
+        while True:
+            try:
+                pubsub = _redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(EVENTS_CHANNEL)
+                for message in pubsub.listen():
+                    self._deliver(f"event: update\ndata: {message['data']}\n\n")
+            except redis.RedisError as e:
+                log.warning("Event subscription lost (%s) — resubscribing in 1s", e)
+                self._deliver(RESYNC)  # whatever was published meanwhile is gone
+                time.sleep(1)
+
+
+# One subscription per API process, shared by every /stream viewer
+broadcaster = Broadcaster()
@@ -0,0 +1,172 @@
+# Ingest channel between the API (producer) and the workers (consumers).
+#
+#   INGEST_MODE=list    LPUSH / BRPOP on a Redis list — the original single-consumer pattern.
+#                       A worker crash between BRPOP and add_ticket loses the ticket.
+#   INGEST_MODE=stream  XADD / XREADGROUP on a Redis Stream with one consumer group.
+#                       Entries are XACKed only after processing, so delivery is
+#                       at-least-once; entries left pending by a crashed worker are
+#                       reclaimed by the survivors via XAUTOCLAIM. Any number of worker
+#                       containers can join the group — Redis partitions entries between them.
+#                       An entry still unacknowledged after MAX_DELIVERIES deliveries is
+#                       moved to DEAD_LETTER_KEY, so one poison ticket cannot loop forever.
+
+import logging
+import os
+import socket
+import time
+
+import redis
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+INGEST_MODE = os.getenv("INGEST_MODE", "list")
+
+REDIS_QUEUE_KEY = "ticket_queue"
+REDIS_STREAM_KEY = "ticket_stream"
+DEAD_LETTER_KEY = "ticket_stream:dead"
+CONSUMER_GROUP = "triagex-workers"
+
+STREAM_MAXLEN = int(os.getenv("INGEST_STREAM_MAXLEN", 1_000_000))   # approximate trim on XADD
+READ_COUNT = int(os.getenv("INGEST_READ_COUNT", 32))                # entries per XREADGROUP
+CLAIM_IDLE_MS = int(os.getenv("INGEST_CLAIM_IDLE_MS", 60_000))      # pending this long ⇒ owner presumed dead
+CLAIM_INTERVAL = 10                                                 # seconds between reclaim sweeps
+MAX_DELIVERIES = int(os.getenv("INGEST_MAX_DELIVERIES", 5))         # then dead-lettered instead of retried
+
+
+def publish(r, payload: str) -> None:
+    """Enqueue one serialized ticket (Ticket.pack()). `r` may be a client or a pipeline."""
+    if INGEST_MODE == "stream":
+        r.xadd(REDIS_STREAM_KEY, {"ticket": payload}, maxlen=STREAM_MAXLEN, approximate=True)
+    else:
+        r.lpush(REDIS_QUEUE_KEY, payload)
+
+
+def backlog(r) -> int:
+    """Tickets published but not yet processed by a worker."""
+    if INGEST_MODE != "stream":
+        return r.llen(REDIS_QUEUE_KEY)
+    try:
+        for group in r.xinfo_groups(REDIS_STREAM_KEY):
+            if group["name"] == CONSUMER_GROUP:
+                # lag = never delivered, pending = delivered but not yet acknowledged
+                lag = group.get("lag")
+                if lag is None:  # Redis < 7 or lag unknown after trimming
+                    lag = r.xlen(REDIS_STREAM_KEY)
+                return lag + group["pending"]
+    except redis.ResponseError:
+        return 0  # stream not created yet
+    return r.xlen(REDIS_STREAM_KEY)
+
+
+def _payload(fields: dict):
+    # Workers use a bytes client (decode_responses=False), so field names may be bytes
+    return fields[b"ticket"] if b"ticket" in fields else fields["ticket"]
+
+
+def default_consumer_name() -> str:
+    """Stable per-container name: WORKER_ID if set, else hostname-pid."""
+    return os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class StreamConsumer:
+    """One member of the worker consumer group."""
+
+    def __init__(self, r, name: str = None, count: int = READ_COUNT):
+        self.r = r
+        self.name = name or default_consumer_name()
+        self.count = count
+        self._last_claim = 0.0
+        self._claim_cursor = "0-0"  # where the next XAUTOCLAIM sweep resumes the pending list
+        self.ensure_group()
+
+    def ensure_group(self) -> None:
+        try:
+            # id="0" so a group created after tickets were published still sees them
+            self.r.xgroup_create(REDIS_STREAM_KEY, CONSUMER_GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def read(self, block_ms: int) -> list:
+        """
+        Return up to `count` (entry_id, payload) pairs. Entries abandoned by dead
+        consumers are reclaimed first (a sweep every CLAIM_INTERVAL seconds, continued on
+        each call until it has covered the whole pending list); otherwise new entries are
+        read, blocking up to `block_ms`.
+        """
+        if self._sweeping() or time.monotonic() - self._last_claim >= CLAIM_INTERVAL:
+            self._last_claim = time.monotonic()
+            claimed = self.reclaim()
+            if claimed:
+                return claimed
+
+        try:
+            resp = self.r.xreadgroup(
+                CONSUMER_GROUP, self.name, {REDIS_STREAM_KEY: ">"},
+                count=self.count, block=block_ms,
+            )
+        except redis.ResponseError as e:
+            if "NOGROUP" not in str(e):
+                raise
+            self.ensure_group()  # stream/group was deleted under us (e.g. FLUSHALL)
+            return []
+        if not resp:
+            return []
+        _, entries = resp[0]
+        return [(entry_id, _payload(fields)) for entry_id, fields in entries]
+
+    def _sweeping(self) -> bool:
+        return self._claim_cursor not in ("0-0", b"0-0")
+
+    def reclaim(self) -> list:
+        """
+        Take over entries that a consumer has held for longer than CLAIM_IDLE_MS, resuming
+        where the previous sweep stopped. Entries already delivered MAX_DELIVERIES times
+        are dead-lettered instead of being returned.
+        """
+        resp = self.r.xautoclaim(
+            REDIS_STREAM_KEY, CONSUMER_GROUP, self.name,
+            min_idle_time=CLAIM_IDLE_MS, start_id=self._claim_cursor, count=self.count,
+        )
+        self._claim_cursor, entries = resp[0], resp[1]
+        # Entries trimmed from the stream come back with empty fields (Redis 6.2)
+        # or in a separate deleted-IDs list (Redis 7+) — ack them away
+        gone = [entry_id for entry_id, fields in entries if not fields]
+        if len(resp) > 2:
+            gone.extend(resp[2])
+        if gone:
+            self.ack(gone)
+        entries = [(entry_id, _payload(fields)) for entry_id, fields in entries if fields]
+        return self._dead_letter(entries)
+
+    def _dead_letter(self, entries: list) -> list:
+        """Move entries past MAX_DELIVERIES to DEAD_LETTER_KEY; return the rest."""
+        if not entries:
+            return entries
+        pending = self.r.xpending_range(
+            REDIS_STREAM_KEY, CONSUMER_GROUP, min=entries[0][0], max=entries[-1][0],
+            count=len(entries), consumername=self.name,
+        )
+        deliveries = {p["message_id"]: p["times_delivered"] for p in pending}
+        dead = [(entry_id, payload) for entry_id, payload in entries
+                if deliveries.get(entry_id, 0) > MAX_DELIVERIES]
+        if not dead:
+            return entries
+        pipe = self.r.pipeline(transaction=True)
+        for entry_id, payload in dead:
+            pipe.xadd(DEAD_LETTER_KEY, {"ticket": payload, "entry_id": entry_id,
+                                        "deliveries": deliveries[entry_id] - 1})
+        pipe.xack(REDIS_STREAM_KEY, CONSUMER_GROUP, *(entry_id for entry_id, _ in dead))
+        pipe.execute()
+        metrics.INGEST_DEAD_LETTERED.inc(len(dead))
+        for entry_id, _ in dead:
+            log.error("Stream entry %s failed %d deliveries, moved to %s",
+                      entry_id, deliveries[entry_id] - 1, DEAD_LETTER_KEY)
+        dead_ids = {entry_id for entry_id, _ in dead}
+        return [(entry_id, payload) for entry_id, payload in entries if entry_id not in dead_ids]
+
+    def ack(self, entry_ids: list) -> None:
+        if entry_ids:
+            self.r.xack(REDIS_STREAM_KEY, CONSUMER_GROUP, *entry_ids)
@@ -1,7 +1,9 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from datetime import datetime, timezone
+import asyncio
+import time
+from typing import Optional
 import os
 import redis
 import json
@@ -11,14 +13,23 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from classifier import classify_ticket
-from urgency import score_urgency, is_high_urgency
+from urgency import score_urgency
 from queue_manager import get_next_ticket, peek_queue, get_queue_size
 from config import BILLING_KEYWORDS, LEGAL_KEYWORDS, URGENCY_FLAGS
-from routing import map_tickets_to_agents, get_agent_status
+from admission import Rejected, admission_controller, tenant_id, tenant_weight
+from routing import (AGENTS_BY_ID, AgentAtCapacity, TicketNotAssigned, map_tickets_to_agents, get_agent_status,
+                     pull_next_ticket, release_ticket)
+import cascade
+import events
+import ingest
+import metrics
+from scheduler import FALLBACKS, inference_scheduler, lane_for
+from similarity_index import similarity_index
+from ticket import Category, Ticket
 
-# Circuit Breaker / ML ThreadPool
-# "If the Transformer model latency exceeds 500ms... failover"
-ml_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+# Circuit Breaker: "If the Transformer model latency exceeds 500ms... failover"
+# Inference runs on scheduler.inference_scheduler, which orders queued work by lane.
+BREAKER_TIMEOUT = 0.5  # seconds
 
 def _fallback_classify(text: str) -> str:
     """Lightweight Milestone 1 model fallback (Keyword-based)"""
@@ -46,7 +57,18 @@ r = redis.Redis(
     decode_responses=True,
 )
 
-REDIS_QUEUE_KEY = "ticket_queue"
+REDIS_QUEUE_KEY = ingest.REDIS_QUEUE_KEY
+
+# Idempotency: the first request for a ticket ID claims "ticket_seen:<id>" with SET NX;
+# retries find the key and get the stored response back without re-running the models.
+# The "pending" claim only lives IDEMPOTENCY_PENDING_TTL seconds (a request finishes
+# within BREAKER_TIMEOUT plus one Redis round-trip), so if the process dies before it
+# can store or release the claim, retries get through again within seconds instead of
+# 409 for a day. The stored response is kept for IDEMPOTENCY_TTL.
+IDEMPOTENCY_KEY_PREFIX = "ticket_seen:"
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 24 * 3600))  # seconds
+IDEMPOTENCY_PENDING_TTL = int(os.getenv("IDEMPOTENCY_PENDING_TTL", 5))  # seconds
+_IDEMPOTENCY_PENDING = "pending"
 
 
 class TicketRequest(BaseModel):
@@ -63,8 +85,14 @@ def index():
             "submit_ticket": "POST /ticket",
             "view_queue": "GET /queue",
             "next_ticket": "GET /ticket/next",
+            "similar_tickets": "GET /ticket/{id}/similar",
             "route_assignments": "POST /route",
-            "agent_status": "GET /agents"
+            "agent_status": "GET /agents",
+            "agent_next_ticket": "GET /agents/{agent_id}/next",
+            "agent_complete_ticket": "POST /agents/{agent_id}/tickets/{ticket_id}/complete",
+            "agent_release_ticket": "POST /agents/{agent_id}/tickets/{ticket_id}/release",
+            "live_updates": "GET /stream (Server-Sent Events)",
+            "metrics": "GET /metrics"
         },
     }
 
@@ -72,73 +100,165 @@ def index():
 @app.get("/health")
 def health():
     try:
-        redis_queue_size = r.llen(REDIS_QUEUE_KEY)
+        redis_queue_size = ingest.backlog(r)
     except redis.RedisError:
         redis_queue_size = -1  # Redis unavailable
     return {
         "status": "ok",
+        "ingest_mode": ingest.INGEST_MODE,
         "redis_queue_size": redis_queue_size,       # awaiting worker processing
         "processed_queue_size": get_queue_size(),   # already in heapq
     }
 
 
+def _replay_submission(idem_key: str, ticket_id: str) -> JSONResponse:
+    """Answer a repeated ticket ID from the stored result of the first submission."""
+    try:
+        stored = r.get(idem_key)
+    except redis.RedisError as e:
+        raise HTTPException(status_code=503, detail=f"Redis unavailable: {e}")
+
+    if stored is None or stored == _IDEMPOTENCY_PENDING:
+        # First submission is still being scored (or its claim just expired)
+        raise HTTPException(status_code=409, detail=f"Ticket '{ticket_id}' is already being processed")
+
+    return JSONResponse(status_code=202, content=json.loads(stored), headers={"Idempotent-Replay": "true"})
+
+
+def _release_claim(idem_key: str) -> None:
+    """Drop a pending claim so the client's retry is processed instead of getting 409."""
+    try:
+        r.delete(idem_key)
+    except redis.RedisError:
+        pass  # the claim expires on its own after IDEMPOTENCY_PENDING_TTL
+
+
+def _too_many(e: Rejected) -> HTTPException:
+    return HTTPException(status_code=429, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+
+
 @app.post("/ticket", status_code=202)
-async def submit_ticket(ticket: TicketRequest):
+async def submit_ticket(ticket: TicketRequest, x_customer_tier: Optional[str] = Header(default=None),
+                        x_tenant_id: Optional[str] = Header(default=None)):
     if not ticket.text.strip():
         raise HTTPException(status_code=400, detail="'text' must not be empty")
+    try:
+        tenant = tenant_id(x_tenant_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+    # IDEMPOTENCY: short-circuit client retries before admission or any model runs, so a
+    # retry of an accepted ticket is replayed without spending a token or being shed
+    idem_key = IDEMPOTENCY_KEY_PREFIX + ticket.id
     try:
-        # CIRCUIT BREAKER: Evaluate latency over a 500ms timeout
-        def _ml_task():
-            return classify_ticket(ticket.text), score_urgency(ticket.text)
-            
-        future = ml_executor.submit(_ml_task)
-        # Wait up to 0.5s (500ms)
-        category, urgency_score = future.result(timeout=0.5)
-        model_used = "transformer (M2)"
-    except concurrent.futures.TimeoutError:
+        claimed = r.set(idem_key, _IDEMPOTENCY_PENDING, nx=True, ex=IDEMPOTENCY_PENDING_TTL)
+    except redis.RedisError as e:
+        raise HTTPException(status_code=503, detail=f"Redis unavailable: {e}")
+    if not claimed:
+        metrics.IDEMPOTENT_REPLAYS.inc()
+        return _replay_submission(idem_key, ticket.id)
+
+    # Any failure from here on (429, model error, Redis error, client gone) must drop the
+    # pending claim, or every retry would get 409 until IDEMPOTENCY_PENDING_TTL runs out
+    try:
+        # ADMISSION: shed before anything is scored (429 + Retry-After)
+        try:
+            admission_controller.check_backlog(r)
+            admission_controller.check_tenant(tenant)
+        except Rejected as e:
+            raise _too_many(e)
+        return await _triage_and_enqueue(ticket, tenant, x_customer_tier, idem_key)
+    except BaseException:
+        _release_claim(idem_key)
+        raise
+
+
+async def _triage_and_enqueue(ticket: TicketRequest, tenant, x_customer_tier, idem_key: str) -> JSONResponse:
+    """Score a claimed ticket, enqueue it and store the response for retries."""
+    # CASCADE: the keyword tier settles confidently-unambiguous tasks without a transformer
+    kw_category, kw_urgency = None, None
+    if cascade.CASCADE_ENABLED:
+        kw_category, kw_urgency = cascade.decide(ticket.text)
+        metrics.CASCADE_DECISIONS.labels("classify", "keyword" if kw_category else "transformer").inc()
+        metrics.CASCADE_DECISIONS.labels("urgency", "keyword" if kw_urgency else "transformer").inc()
+
+    lane = lane_for(ticket.text, x_customer_tier)
+    try:
+        if kw_category is not None and kw_urgency is not None:
+            category, urgency_score = kw_category, kw_urgency
+            model_used = "keyword_cascade (M1)"
+            metrics.TICKETS_CASCADE.inc()
+        else:
+            # CIRCUIT BREAKER: Evaluate latency over a 500ms timeout
+            def _ml_task():
+                category = kw_category
+                if category is None:
+                    with metrics.CLASSIFY_SECONDS.time():
+                        category = classify_ticket(ticket.text)
+                urgency = kw_urgency
+                if urgency is None:
+                    with metrics.URGENCY_SECONDS.time():
+                        urgency = score_urgency(ticket.text)
+                return category, urgency
+
+            try:
+                admission_controller.check_inference(inference_scheduler, lane)
+            except Rejected as e:
+                raise _too_many(e)  # the claim is released, so a retry gets through once the queue drains
+            future = inference_scheduler.submit(lane, _ml_task, timeout=BREAKER_TIMEOUT,
+                                                tenant=tenant, weight=tenant_weight(tenant))
+            # Wait up to 0.5s (500ms) without blocking the event loop; on timeout wait_for
+            # cancels the job, so it is skipped if it is still queued
+            category, urgency_score = await asyncio.wait_for(asyncio.wrap_future(future), timeout=BREAKER_TIMEOUT)
+            model_used = "transformer (M2)" if kw_category is None and kw_urgency is None else "cascade (M1+M2)"
+            metrics.TICKETS_TRANSFORMER.inc()
+    except (asyncio.TimeoutError, concurrent.futures.TimeoutError):
         # "automatically failover to the lightweight Milestone 1 model."
+        FALLBACKS[lane].inc()
         print(f"⚠️ Circuit Breaker Tripped! Transformer timeout for [{ticket.id}]. Failing over to M1 model.")
         category = _fallback_classify(ticket.text)
         urgency_score = _fallback_urgency(ticket.text)
         model_used = "keyword_fallback (M1)"
+        metrics.TICKETS_FALLBACK.inc()
         
     try:
-        ticket_data = {
-            "id": ticket.id,
-            "text": ticket.text,
-            "category": category,
-            "urgency_score": urgency_score,
-            "is_high_urgency": is_high_urgency(urgency_score),
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "processed": False,
-            "model_used": model_used
+        ticket_data = Ticket(
+            ticket.id,
+            ticket.text,
+            Category.from_label(category),
+            urgency_score["urgency"],
+            time.time(),
+            model_used=model_used,
+        )
+
+        response = {
+            "status": "accepted",
+            "ticket_id": ticket.id,
+            "category": ticket_data.category.label,
+            "is_high_urgency": ticket_data.is_high_urgency,
+            "model_used": ticket_data.model_used,
         }
 
-        # Atomic LPUSH — returns immediately after enqueue
-        r.lpush(REDIS_QUEUE_KEY, json.dumps(ticket_data))
+        # Enqueue (msgpack-encoded) and record the result for retries in one MULTI/EXEC round-trip
+        with metrics.REDIS_PUSH_SECONDS.time():
+            pipe = r.pipeline(transaction=True)
+            ingest.publish(pipe, ticket_data.pack())
+            pipe.set(idem_key, json.dumps(response), ex=IDEMPOTENCY_TTL)
+            pipe.execute()
 
     except redis.RedisError as e:
         raise HTTPException(status_code=503, detail=f"Redis unavailable: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
 
-    return JSONResponse(
-        status_code=202,
-        content={
-            "status": "accepted",
-            "ticket_id": ticket.id,
-            "category": ticket_data["category"],
-            "is_high_urgency": ticket_data["is_high_urgency"],
-        },
-    )
+    return JSONResponse(status_code=202, content=response)
 
 
 @app.get("/queue")
 def view_queue(limit: int = 10):
     limit = min(max(limit, 1), 50)
     tickets = peek_queue(limit)
-    return {"processed_queue_size": get_queue_size(), "tickets": tickets}
+    return {"processed_queue_size": get_queue_size(), "tickets": [t.to_dict() for t in tickets]}
 
 
 @app.get("/ticket/next")
@@ -146,7 +266,18 @@ def next_ticket():
     ticket = get_next_ticket()
     if ticket is None:
         raise HTTPException(status_code=404, detail="Queue is empty")
-    return ticket
+    return ticket.to_dict()
+
+@app.get("/ticket/{ticket_id}/similar")
+def similar_tickets(ticket_id: str, k: int = 5):
+    """Past tickets closest in meaning to a processed one (approximate nearest neighbours)."""
+    if similarity_index is None:
+        raise HTTPException(status_code=503, detail="Similarity index is disabled (SIMILARITY_INDEX=off)")
+    k = min(max(k, 1), 50)
+    similar = similarity_index.similar_to(ticket_id, k)
+    if similar is None:
+        raise HTTPException(status_code=404, detail=f"Ticket '{ticket_id}' is not indexed yet")
+    return {"ticket_id": ticket_id, "similar": similar}
 
 @app.post("/route")
 def route_tickets(limit: int = 10):
@@ -173,6 +304,104 @@ def get_agents():
     """Returns stateful registry and load status"""
     return get_agent_status()
 
+@app.get("/agents/{agent_id}/next")
+def agent_next_ticket(agent_id: str):
+    """
+    Agent pull: pop and assign the queued ticket with the best urgency × skill match for
+    this agent (per-category heaps, no Hungarian solve).
+    """
+    agent = AGENTS_BY_ID.get(agent_id)
+    if agent is None:
+        raise HTTPException(status_code=404, detail=f"Unknown agent '{agent_id}'")
+    try:
+        ticket = pull_next_ticket(agent)
+    except AgentAtCapacity:
+        raise HTTPException(status_code=409, detail=f"Agent '{agent_id}' is at capacity ({agent.capacity})")
+    if ticket is None:
+        raise HTTPException(status_code=404, detail="No queued ticket matches this agent's skills")
+    return {
+        "agent_id": agent.agent_id,
+        "skill_match": agent.skills.get(ticket.category.label, 0.1),
+        "current_load": len(agent.assigned_tickets),
+        "capacity": agent.capacity,
+        "ticket": ticket.to_dict(),
+    }
+
+@app.post("/agents/{agent_id}/tickets/{ticket_id}/complete")
+def agent_complete_ticket(agent_id: str, ticket_id: str):
+    """The agent finished a ticket: free its slot so the agent can pull or be routed more work."""
+    return _release(agent_id, ticket_id, requeue=False)
+
+@app.post("/agents/{agent_id}/tickets/{ticket_id}/release")
+def agent_release_ticket(agent_id: str, ticket_id: str):
+    """The agent hands a ticket back: free its slot and put the ticket back in the priority queue."""
+    return _release(agent_id, ticket_id, requeue=True)
+
+def _release(agent_id: str, ticket_id: str, requeue: bool):
+    agent = AGENTS_BY_ID.get(agent_id)
+    if agent is None:
+        raise HTTPException(status_code=404, detail=f"Unknown agent '{agent_id}'")
+    try:
+        release_ticket(agent, ticket_id, requeue=requeue)
+    except TicketNotAssigned:
+        raise HTTPException(status_code=404, detail=f"Ticket '{ticket_id}' is not assigned to agent '{agent_id}'")
+    return {
+        "agent_id": agent.agent_id,
+        "ticket_id": ticket_id,
+        "requeued": requeue,
+        "current_load": len(agent.assigned_tickets),
+        "capacity": agent.capacity,
+    }
+
+STREAM_SNAPSHOT_LIMIT = 50
+STREAM_KEEPALIVE = 15  # seconds; keeps proxies from closing an idle stream
+
+
+def _snapshot_frame() -> str:
+    snapshot = {
+        "processed_queue_size": get_queue_size(),
+        "tickets": [t.to_dict() for t in peek_queue(STREAM_SNAPSHOT_LIMIT)],
+        "agents": get_agent_status(),
+    }
+    return f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+
+
+@app.get("/stream")
+async def stream_updates(request: Request):
+    """
+    Server-Sent Events for dashboards: one `snapshot` (the /queue and /agents view), then
+    `update` events carrying JSON arrays of enqueued / popped / agent_load deltas.
+    A new snapshot is sent whenever this viewer fell behind and deltas were dropped.
+    """
+    if not events.EVENTS_ENABLED:
+        raise HTTPException(status_code=503, detail="Live updates are disabled (EVENTS=off)")
+    viewer = events.broadcaster.subscribe()
+
+    async def frames():
+        try:
+            yield _snapshot_frame()
+            while not await request.is_disconnected():
+                try:
+                    frame = await asyncio.wait_for(viewer.get(), timeout=STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _snapshot_frame() if frame is events.RESYNC else frame
+        finally:
+            events.broadcaster.unsubscribe(viewer)
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint: per-stage latency histograms and pipeline counters"""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=False)
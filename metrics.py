@@ -0,0 +1,150 @@
+# Prometheus metrics shared by the API (GET /metrics) and the worker (standalone listener).
+#
+# Label children are bound once at import so the hot path only pays for a
+# perf_counter() pair and a bucket increment — no label lookups per ticket.
+#
+# When the API runs with several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an
+# empty directory and /metrics aggregates every process.
+
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+
+# Latency buckets from 100µs to 10s — covers Redis round-trips up to breaker-tripping inference
+_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+STAGE_SECONDS = Histogram(
+    "triagex_stage_seconds",
+    "Time spent in each pipeline stage",
+    ["stage"],
+    buckets=_BUCKETS,
+)
+
+CLASSIFY_SECONDS      = STAGE_SECONDS.labels("classify")
+URGENCY_SECONDS       = STAGE_SECONDS.labels("urgency")
+REDIS_PUSH_SECONDS    = STAGE_SECONDS.labels("redis_push")
+REDIS_WAIT_SECONDS    = STAGE_SECONDS.labels("redis_wait")
+QUEUE_ADD_SECONDS     = STAGE_SECONDS.labels("queue_add")
+QUEUE_SAVE_SECONDS    = STAGE_SECONDS.labels("queue_save")
+STORM_ENCODE_SECONDS  = STAGE_SECONDS.labels("storm_encode")
+STORM_SIMILAR_SECONDS = STAGE_SECONDS.labels("storm_similarity")
+WEBHOOK_SECONDS       = STAGE_SECONDS.labels("webhook")
+ROUTE_SOLVE_SECONDS   = STAGE_SECONDS.labels("route_solve")
+
+INFERENCE_SECONDS = Histogram(
+    "triagex_inference_seconds",
+    "Ingest inference per scheduler lane: time queued (wait) and time scoring (run)",
+    ["lane", "phase"],
+    buckets=_BUCKETS,
+)
+
+INFERENCE_JOBS = Counter(
+    "triagex_inference_jobs_total",
+    "Inference jobs per lane: scored, cancelled (breaker gave up while queued), "
+    "expired (dropped: could not finish before the breaker deadline)",
+    ["lane", "outcome"],
+)
+
+INFERENCE_FALLBACKS = Counter(
+    "triagex_inference_fallbacks_total",
+    "Circuit-breaker keyword fallbacks per inference lane",
+    ["lane"],
+)
+
+INFERENCE_QUEUED = Gauge(
+    "triagex_inference_queued",
+    "Inference jobs waiting for a thread, by lane",
+    ["lane"],
+    multiprocess_mode="livesum",
+)
+
+ADMISSION_REJECTED = Counter(
+    "triagex_admission_rejected_total",
+    "Tickets shed at ingest with 429, by reason: backlog, tenant (rate limit), inference",
+    ["reason"],
+)
+
+TICKETS_TOTAL = Counter(
+    "triagex_tickets_total",
+    "Tickets scored at ingest, by model tier (fallback rate = keyword_fallback / all)",
+    ["model"],
+)
+TICKETS_TRANSFORMER = TICKETS_TOTAL.labels("transformer")
+TICKETS_FALLBACK    = TICKETS_TOTAL.labels("keyword_fallback")
+TICKETS_CASCADE     = TICKETS_TOTAL.labels("keyword_cascade")
+
+CASCADE_DECISIONS = Counter(
+    "triagex_cascade_decisions_total",
+    "Per-task cascade tier: settled by keywords or escalated to the transformer",
+    ["task", "tier"],
+)
+
+IDEMPOTENT_REPLAYS = Counter(
+    "triagex_idempotent_replays_total",
+    "Repeated ticket IDs answered from the stored result without running the models",
+)
+
+STORM_TOTAL = Counter(
+    "triagex_storm_status_total",
+    "Storm-detection outcomes per processed ticket",
+    ["status"],
+)
+
+WEBHOOKS_TOTAL = Counter(
+    "triagex_webhooks_total",
+    "Webhook deliveries",
+    ["kind", "outcome"],
+)
+
+EVENTS_PUBLISHED = Counter(
+    "triagex_events_published_total",
+    "Dashboard events published to Redis pub/sub",
+)
+EVENTS_DROPPED = Counter(
+    "triagex_events_dropped_total",
+    "Dashboard events dropped (publish buffer full or Redis unavailable)",
+)
+
+INGEST_DEAD_LETTERED = Counter(
+    "triagex_ingest_dead_lettered_total",
+    "Stream entries moved to the dead-letter stream after INGEST_MAX_DELIVERIES failed deliveries",
+)
+
+STREAM_VIEWERS = Gauge(
+    "triagex_stream_viewers",
+    "Connected GET /stream viewers",
+    multiprocess_mode="livesum",
+)
+
+QUEUE_DEPTH = Gauge(
+    "triagex_queue_depth",
+    "Tickets waiting in the priority queue, by category",
+    ["category"],
+    multiprocess_mode="livesum",
+)
+
+
+def render():
+    """Return (body, content_type) for a /metrics response."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int) -> None:
+    """Expose /metrics on a background thread (used by worker.py, which has no web server)."""
+    start_http_server(port)
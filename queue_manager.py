@@ -1,86 +1,395 @@
+import collections
+import contextlib
 import heapq
 import json
+import logging
 import os
+import shutil
+import tempfile
 import threading
+import time
 
-QUEUE_FILE = os.path.join(os.path.dirname(__file__), "queue_store.json")
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, run a single process per store
+    fcntl = None
+
+import msgpack
+
+import events
+import metrics
+from ticket import Category, Ticket
+
+log = logging.getLogger(__name__)
+
+QUEUE_FILE = os.path.join(os.path.dirname(__file__), "queue_store.bin")
+
+# The store is an append-only msgpack journal rather than a full rewrite on every change:
+#   [OP_SNAPSHOT, ticket_counter]      first record of a compacted file
+#   [OP_ADD, seq, ticket_row]          see Ticket.to_row()
+#   [OP_POP, seq, ticket_id]           (older journals: [OP_POP, seq])
+# Replaying it rebuilds the heap. Once dead records outnumber live tickets the file is
+# compacted (snapshot + one ADD per live ticket) and atomically swapped in, so each
+# add/pop costs one small append instead of serializing the whole queue.
+#
+# The API processes and worker.py all append to the same file, each with its own seq
+# counter, so replay matches POPs to ADDs by ticket ID and renumbers in journal order.
+# Appends and compaction hold an flock on QUEUE_FILE + ".lock"; compaction re-reads the
+# file rather than snapshotting one process's heap, and a process whose journal handle
+# was swapped out by another's compaction reopens the file before its next append.
+#
+# Damage is handled by kind: a torn final record (crash mid-append) is cut off; a record
+# that is well-framed but undecodable is skipped; bytes msgpack cannot frame at all leave
+# no way to find the next record, so the file is copied to QUEUE_FILE + ".corrupt-<ts>"
+# and the store is rewritten from the records read before the damage.
+_OP_SNAPSHOT, _OP_ADD, _OP_POP = 0, 1, 2
+COMPACT_MIN_RECORDS = 10_000
 
 # Atomic lock — ensures no two threads can mutate the heap simultaneously.
 # Required by Milestone 2: "atomic locks to prevent race conditions or duplicate ticket processing"
 _lock = threading.Lock()
 
-ticket_queue = []
+# Two indexes over the same (-urgency, seq, Ticket) entries: one global heap for
+# get_next_ticket and one heap per category for pop_best_for_skills. A pop through
+# either index only removes the ticket from `live`; the copy left in the other heap is
+# stale and is discarded lazily when it reaches the top (or by _prune).
+ticket_queue = []   # heap of (-urgency, seq, Ticket), all categories
+category_queues = {category: [] for category in Category}
+live = {}           # seq → Ticket currently queued
 ticket_counter = 0  # used to break ties; older tickets surface first within same urgency
+queued_ids = {}    # ID → seq of tickets currently queued — at-least-once redelivery must not queue twice
+
+_journal = None       # append handle on QUEUE_FILE, opened lazily
+_journal_records = 0  # records this process appended since its last compaction/open
+_lock_file = None     # handle flock()ed for cross-process journal access
+
+
+@contextlib.contextmanager
+def _file_lock():
+    """Hold the cross-process journal lock. Must be called while holding _lock."""
+    global _lock_file
+    if fcntl is None:
+        yield
+        return
+    if _lock_file is None:
+        _lock_file = open(QUEUE_FILE + ".lock", "ab")
+    fcntl.flock(_lock_file, fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(_lock_file, fcntl.LOCK_UN)
+
+
+def _open_journal():
+    """(Re)open the append handle if it is missing or another process compacted the file."""
+    global _journal, _journal_records
+    if _journal is not None:
+        try:
+            if os.stat(QUEUE_FILE).st_ino == os.fstat(_journal.fileno()).st_ino:
+                return
+        except FileNotFoundError:
+            pass
+        _journal.close()
+        _journal_records = 0
+    _journal = open(QUEUE_FILE, "ab")
+
+
+def _append(record):
+    """Append one journal record. Must be called while holding _lock."""
+    global _journal, _journal_records
+    if QUEUE_FILE is None:
+        return  # in-memory only (simulations, benchmarks)
+    with metrics.QUEUE_SAVE_SECONDS.time(), _file_lock():
+        _open_journal()
+        _journal.write(msgpack.packb(record, use_bin_type=True))
+        _journal.flush()
+        _journal_records += 1
+        if _journal_records > max(COMPACT_MIN_RECORDS, 2 * len(live)):
+            _compact()
+
+
+def _compact():
+    """
+    Rewrite the journal as a snapshot of every process's live tickets.
+    Must be called while holding _lock and _file_lock().
+    """
+    tickets, _, _, damaged = _replay_journal()
+    if damaged:
+        _set_aside()
+    _write_snapshot(tickets)
+
+
+def _set_aside():
+    """Copy a journal that cannot be fully replayed next to it before it is rewritten."""
+    aside = f"{QUEUE_FILE}.corrupt-{int(time.time())}"
+    shutil.copyfile(QUEUE_FILE, aside)
+    log.error("Queue journal %s is damaged past the last readable record; copied to %s, "
+              "tickets journaled after the damage are only in that copy", QUEUE_FILE, aside)
+
+
+def _write_snapshot(tickets: dict):
+    """Atomically replace QUEUE_FILE with a snapshot of {seq: Ticket}. Must hold _lock and _file_lock()."""
+    global _journal, _journal_records
+    directory, name = os.path.split(os.path.abspath(QUEUE_FILE))
+    fd, tmp = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=directory)
+    packer = msgpack.Packer(use_bin_type=True)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(packer.pack([_OP_SNAPSHOT, max(tickets, default=0)]))
+            for seq, t in tickets.items():
+                f.write(packer.pack([_OP_ADD, seq, t.to_row()]))
+        os.replace(tmp, QUEUE_FILE)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+    if _journal is not None:
+        _journal.close()
+    _journal = open(QUEUE_FILE, "ab")
+    _journal_records = len(tickets) + 1
+
+
+def _replay_journal():
+    """
+    Rebuild {seq: Ticket} from QUEUE_FILE, renumbered in journal order, plus the highest
+    seq, the byte length of the readable records and whether replay stopped at bytes that
+    are not msgpack. Undecodable records are skipped and logged; a torn final record
+    (crash mid-append) just ends the replay.
+    """
+    by_id = {}       # ticket ID → Ticket, in the order the tickets were added
+    id_of_seq = {}   # for POP records written before they carried the ticket ID
+    valid, damaged = 0, False
+    with open(QUEUE_FILE, "rb") as f:
+        unpacker = msgpack.Unpacker(f, raw=False)
+        try:
+            for record in unpacker:
+                try:
+                    op = record[0]
+                    if op == _OP_ADD:
+                        ticket = Ticket.from_row(record[2])
+                        by_id.setdefault(ticket.id, ticket)
+                        id_of_seq[record[1]] = ticket.id
+                    elif op == _OP_POP:
+                        by_id.pop(record[2] if len(record) > 2 else id_of_seq.get(record[1]), None)
+                except (ValueError, LookupError, TypeError) as e:
+                    log.error("Skipping unreadable record ending at byte %d of %s: %s",
+                              unpacker.tell(), QUEUE_FILE, e)
+                valid = unpacker.tell()
+        except (ValueError, msgpack.UnpackException) as e:
+            damaged = True
+            log.error("Queue journal %s is not msgpack after byte %d: %s", QUEUE_FILE, valid, e)
+    live = dict(enumerate(by_id.values(), 1))
+    return live, len(live), valid, damaged
+
 
+def _legacy_file():
+    return os.path.splitext(QUEUE_FILE)[0] + ".json"
 
-def _save():
-    """Persist the current queue to disk. Must be called while holding _lock."""
-    data = {
-        "ticket_counter": ticket_counter,
-        "tickets": [
-            {"neg_urgency": neg, "seq": seq, "ticket": t}
-            for neg, seq, t in ticket_queue
-        ],
-    }
-    with open(QUEUE_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+
+def _replay_legacy_json():
+    """Read the pre-journal queue_store.json so an upgrade keeps the existing queue."""
+    with open(_legacy_file()) as f:
+        data = json.load(f)
+    live = {item["seq"]: Ticket.from_dict(item["ticket"]) for item in data.get("tickets", [])}
+    return live, data.get("ticket_counter", 0)
 
 
 def _load():
     """Load the queue from disk if it exists."""
-    global ticket_queue, ticket_counter
-    if not os.path.exists(QUEUE_FILE):
-        return
+    global live, ticket_counter, queued_ids
+    loaded, counter = {}, 0
+    if QUEUE_FILE:
+        with _file_lock():
+            loaded, counter = _load_store()
+
+    live = loaded
+    _rebuild_indexes()
+    ticket_counter = counter
+    queued_ids = {t.id: seq for seq, t in live.items()}
+
+    depth = collections.Counter(t.category for t in live.values())
+    for category in Category:
+        metrics.QUEUE_DEPTH.labels(category.label).set(depth[category])
+
+
+def _load_store():
+    """
+    Read the store for _load. No compaction here: every API worker and the queue worker
+    load at import, and rewriting the shared file from each of them would race. Only a
+    torn tail is cut off (later appends would land behind it and be lost on replay), a
+    damaged journal is set aside and rewritten, and a legacy JSON store is migrated once.
+    Must be called while holding _file_lock().
+    """
     try:
-        with open(QUEUE_FILE) as f:
-            data = json.load(f)
-        ticket_counter = data.get("ticket_counter", 0)
-        ticket_queue = [
-            (item["neg_urgency"], item["seq"], item["ticket"])
-            for item in data.get("tickets", [])
-        ]
-        heapq.heapify(ticket_queue)
-    except (json.JSONDecodeError, KeyError):
-        # Corrupted store — start fresh
-        ticket_queue = []
-        ticket_counter = 0
+        if os.path.exists(QUEUE_FILE):
+            loaded, counter, valid, damaged = _replay_journal()
+            if damaged:
+                _set_aside()
+                _write_snapshot(loaded)
+            elif valid < os.path.getsize(QUEUE_FILE):
+                log.warning("Cutting a torn final record off %s at byte %d", QUEUE_FILE, valid)
+                os.truncate(QUEUE_FILE, valid)
+            return loaded, counter
+        if os.path.exists(_legacy_file()):
+            loaded, counter = _replay_legacy_json()
+            _write_snapshot(loaded)
+            return loaded, counter
+    except (json.JSONDecodeError, KeyError, ValueError):
+        pass  # corrupted store — start fresh
+    return {}, 0
+
+
+def _rebuild_indexes():
+    """Rebuild both heap indexes from `live`, dropping stale entries. Must be called while holding _lock."""
+    global ticket_queue, category_queues
+    ticket_queue = [(-t.urgency, seq, t) for seq, t in live.items()]
+    heapq.heapify(ticket_queue)
+    category_queues = {category: [] for category in Category}
+    for entry in ticket_queue:
+        category_queues[entry[2].category].append(entry)
+    for heap in category_queues.values():
+        heapq.heapify(heap)
+
+
+def _top(heap):
+    """Best live entry of a heap without removing it (stale entries above it are discarded)."""
+    while heap and heap[0][1] not in live:
+        heapq.heappop(heap)
+    return heap[0] if heap else None
+
+
+def _take(entry):
+    """Remove a live entry from the queue and journal it. Must be called while holding _lock."""
+    _, seq, ticket = entry
+    del live[seq]
+    queued_ids.pop(ticket.id, None)
+    _append([_OP_POP, seq, ticket.id])
+    # Stale copies are normally dropped as they surface; rebuild if they pile up in a
+    # heap that is rarely popped (e.g. agents pull by skill and nobody uses /ticket/next)
+    stale = len(ticket_queue) + sum(map(len, category_queues.values())) - 2 * len(live)
+    if stale > len(live) + 1024:
+        _rebuild_indexes()
+    return ticket
+
+
+def use_store(path):
+    """
+    Point the queue at a different store file (None = in-memory only) and reload from it.
+    Used by the benchmark and simulator so they never touch the real queue_store.bin.
+    """
+    global QUEUE_FILE, _journal, _journal_records, _lock_file
+    with _lock:
+        for handle in (_journal, _lock_file):
+            if handle is not None:
+                handle.close()
+        _journal, _journal_records, _lock_file = None, 0, None
+        QUEUE_FILE = path
+        _load()
 
 
 # Load persisted queue on module import
 _load()
 
 
-def add_ticket(ticket_dict):
-    """Adds a ticket to the priority queue. Thread-safe via _lock."""
+def add_ticket(ticket):
+    """
+    Adds a ticket (Ticket, or a dict in the HTTP shape) to the priority queue. Thread-safe via _lock.
+    Returns False (and changes nothing) if a ticket with the same ID is already queued.
+    """
     global ticket_counter
-    with _lock:
+    if not isinstance(ticket, Ticket):
+        ticket = Ticket.from_dict(ticket)
+    with metrics.QUEUE_ADD_SECONDS.time(), _lock:
+        if ticket.id in queued_ids:
+            return False
         ticket_counter += 1
-        # urgency_score is {\"urgency\": float} ∈ [0, 1]
-        urgency = ticket_dict["urgency_score"].get("urgency", 0.0)
+        queued_ids[ticket.id] = ticket_counter
         # negate urgency so heapq (min-heap) returns highest urgency first
-        heapq.heappush(ticket_queue, (-urgency, ticket_counter, ticket_dict))
-        _save()
+        entry = (-ticket.urgency, ticket_counter, ticket)
+        live[ticket_counter] = ticket
+        heapq.heappush(ticket_queue, entry)
+        heapq.heappush(category_queues[ticket.category], entry)
+        _append([_OP_ADD, ticket_counter, ticket.to_row()])
+    metrics.QUEUE_DEPTH.labels(ticket.category.label).inc()
+    events.ticket_enqueued(ticket)
+    return True
 
 
 def get_next_ticket():
-    """Removes and returns the most urgent ticket. Thread-safe via _lock."""
+    """Removes and returns the most urgent Ticket. Thread-safe via _lock."""
+    with _lock:
+        entry = _top(ticket_queue)
+        if entry is None:
+            return None
+        heapq.heappop(ticket_queue)
+        ticket = _take(entry)
+    metrics.QUEUE_DEPTH.labels(ticket.category.label).dec()
+    events.ticket_popped(ticket)
+    return ticket
+
+
+def pop_best_for_skills(skills: dict, default_skill: float = 0.1):
+    """
+    Removes and returns the Ticket with the highest urgency × skill match for a skill
+    vector like Agent.skills ({"Technical": 0.9, ...}); categories missing from it count
+    as `default_skill`, as in routing's cost matrix, and categories with skill 0 are never
+    chosen. Only the top of each category heap is compared, so this is O(categories · log n).
+    Ties go to the older ticket. Returns None if nothing suitable is queued. Thread-safe.
+    """
+    with _lock:
+        best, best_value = None, 0.0
+        for category, heap in category_queues.items():
+            skill = skills.get(category.label, default_skill)
+            entry = _top(heap) if skill > 0 else None
+            if entry is None:
+                continue
+            value = -entry[0] * skill
+            if best is None or value > best_value or (value == best_value and entry[1] < best[1]):
+                best, best_value = entry, value
+        if best is None:
+            return None
+        heapq.heappop(category_queues[best[2].category])
+        ticket = _take(best)
+    metrics.QUEUE_DEPTH.labels(ticket.category.label).dec()
+    events.ticket_popped(ticket)
+    return ticket
+
+
+def remove_ticket(ticket_id):
+    """
+    Removes and returns the queued Ticket with this ID wherever it sits in the queue, or
+    None if it is not queued. Its heap entries become stale, as after any pop. Thread-safe.
+    """
     with _lock:
-        if not ticket_queue:
+        seq = queued_ids.get(ticket_id)
+        if seq is None:
             return None
-        _, _, ticket_dict = heapq.heappop(ticket_queue)
-        _save()
-        return ticket_dict
+        ticket = _take((-live[seq].urgency, seq, live[seq]))
+    metrics.QUEUE_DEPTH.labels(ticket.category.label).dec()
+    events.ticket_popped(ticket)
+    return ticket
 
 
 def peek_queue(limit=10):
-    """Returns a sorted snapshot of up to `limit` tickets without removing them. Thread-safe."""
+    """Returns up to `limit` Tickets in priority order without removing them. Thread-safe."""
     with _lock:
-        # Sort a copy so we don't disturb the underlying heap structure
-        sorted_items = sorted(ticket_queue, key=lambda item: item[0])
-        return [ticket_dict for _, _, ticket_dict in sorted_items[:limit]]
+        # Walk the heap from the root, expanding only the best frontier node, so this is
+        # O(limit · log limit) plus any stale entries passed over — not O(n) per peek.
+        # Stale entries at the root (e.g. left by remove_ticket) are discarded first.
+        # (neg, seq) keys are unique, so tuples never compare on the Ticket.
+        _top(ticket_queue)
+        found, frontier = [], [(ticket_queue[0], 0)] if ticket_queue else []
+        while frontier and len(found) < limit:
+            entry, i = heapq.heappop(frontier)
+            if entry[1] in live:
+                found.append(entry[2])
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(ticket_queue):
+                    heapq.heappush(frontier, (ticket_queue[child], child))
+        return found
 
 
 def get_queue_size():
     """Returns the current number of tickets waiting in the queue. Thread-safe."""
     with _lock:
-        return len(ticket_queue)
+        return len(live)
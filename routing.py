@@ -1,6 +1,10 @@
+import threading
+
 import numpy as np
 from scipy.optimize import linear_sum_assignment
-from queue_manager import get_queue_size
+from queue_manager import add_ticket, get_queue_size, pop_best_for_skills
+import events
+import metrics
 
 class Agent:
     def __init__(self, agent_id, name, skill_vector, capacity):
@@ -8,7 +12,7 @@ class Agent:
         self.name = name
         self.skills = skill_vector      # e.g., {"Technical": 0.9, "Billing": 0.1, "Legal": 0.0}
         self.capacity = capacity        # max tickets they can handle at once
-        self.assigned_tickets = []      # list of assigned ticket dicts
+        self.assigned_tickets = []      # list of assigned Tickets
 
 # Stateful Registry of Agents (skill vectors based on hackathon spec)
 AGENT_REGISTRY = [
@@ -17,6 +21,19 @@ AGENT_REGISTRY = [
     Agent("A3", "Agent Z (Legal Eval)",  {"Technical": 0.0, "Billing": 0.2, "Legal": 0.8}, capacity=2),
     Agent("A4", "Agent W (Generalist)",  {"Technical": 0.4, "Billing": 0.4, "Legal": 0.4}, capacity=4)
 ]
+AGENTS_BY_ID = {a.agent_id: a for a in AGENT_REGISTRY}
+
+# Serialises every change to assigned_tickets: the batch solve and agent pulls must not
+# both hand out the same free slot.
+_assign_lock = threading.Lock()
+
+
+class AgentAtCapacity(Exception):
+    pass
+
+
+class TicketNotAssigned(Exception):
+    pass
 
 def map_tickets_to_agents(tickets: list) -> list:
     """
@@ -26,6 +43,11 @@ def map_tickets_to_agents(tickets: list) -> list:
     if not tickets:
         return []
 
+    with _assign_lock:
+        return _solve_and_assign(tickets)
+
+
+def _solve_and_assign(tickets: list) -> list:
     # 1. Expand agents into available 'slots' based on their remaining capacity
     agent_slots = []
     for agent in AGENT_REGISTRY:
@@ -46,35 +68,77 @@ def map_tickets_to_agents(tickets: list) -> list:
     cost_matrix = np.zeros((n_tickets, n_slots))
     
     for i, ticket in enumerate(tickets):
-        category = ticket.get("category", "Technical") # fallback to Technical
+        category = ticket.category.label
         for j, slot in enumerate(agent_slots):
             # Give a default low skill of 0.1 if category is completely unknown to agent
             skill_match = slot.skills.get(category, 0.1)
             cost_matrix[i, j] = 1.0 - skill_match
 
     # 3. Solve Constraint Optimization via Hungarian Algorithm
-    ticket_indices, slot_indices = linear_sum_assignment(cost_matrix)
+    with metrics.ROUTE_SOLVE_SECONDS.time():
+        ticket_indices, slot_indices = linear_sum_assignment(cost_matrix)
 
     # 4. Process the matching results
     routed_assignments = []
+    changed_agents = {}
     for t_idx, s_idx in zip(ticket_indices, slot_indices):
         ticket = tickets[t_idx]
         agent = agent_slots[s_idx]
         
         # Stateful update: assign ticket to the agent
         agent.assigned_tickets.append(ticket)
-        category = ticket.get("category", "Unknown")
+        changed_agents[agent.agent_id] = agent
+        category = ticket.category.label
         
         routed_assignments.append({
-            "ticket_id": ticket["id"],
+            "ticket_id": ticket.id,
             "category": category,
             "agent_name": agent.name,
             "skill_match": agent.skills.get(category, 0.1),
-            "text_preview": ticket["text"][:50] + "..."
+            "text_preview": ticket.text[:50] + "..."
         })
 
+    # Push one load delta per agent that took work, for GET /stream dashboards
+    for agent in changed_agents.values():
+        events.agent_load(agent)
+
     return routed_assignments
 
+def pull_next_ticket(agent: Agent):
+    """
+    Pop the queued ticket with the highest urgency × skill match for this agent and
+    assign it, without a global solve. The capacity check, pop and assignment happen
+    under one lock. Raises AgentAtCapacity when the agent has no free slot. Returns None
+    when nothing suitable is queued.
+    """
+    with _assign_lock:
+        if len(agent.assigned_tickets) >= agent.capacity:
+            raise AgentAtCapacity(agent.agent_id)
+        ticket = pop_best_for_skills(agent.skills)
+        if ticket is None:
+            return None
+        agent.assigned_tickets.append(ticket)
+    events.agent_load(agent)
+    return ticket
+
+def release_ticket(agent: Agent, ticket_id: str, requeue: bool = False):
+    """
+    Free the slot `ticket_id` holds on this agent — when the agent completes it, or with
+    requeue=True to hand it back to the priority queue for another agent. Raises
+    TicketNotAssigned if the agent does not hold the ticket. Returns the Ticket.
+    """
+    with _assign_lock:
+        for i, ticket in enumerate(agent.assigned_tickets):
+            if ticket.id == ticket_id:
+                break
+        else:
+            raise TicketNotAssigned(ticket_id)
+        del agent.assigned_tickets[i]
+        if requeue:
+            add_ticket(ticket)
+    events.agent_load(agent)
+    return ticket
+
 def get_agent_status():
     """Return the current capacity and load of all registered agents."""
     status = []
@@ -85,6 +149,6 @@ def get_agent_status():
             "skills": a.skills,
             "capacity": a.capacity,
             "current_load": len(a.assigned_tickets),
-            "assigned_tickets": [t["id"] for t in a.assigned_tickets]
+            "assigned_tickets": [t.id for t in a.assigned_tickets]
         })
     return status
@@ -0,0 +1,242 @@
+# Priority-lane scheduler for transformer inference at ingest (replaces the FIFO
+# ml_executor in main.py).
+#
+# A FIFO pool lets a flood of routine tickets sit in front of "production is down",
+# which then trips the 500ms breaker and loses its transformer score exactly when it
+# matters. Here each job is put in a lane from a cheap pre-signal:
+#
+#   urgent    text contains an URGENCY_FLAGS keyword
+#   priority  X-Customer-Tier header is one of PRIORITY_TIERS
+#   standard  everything else
+#
+# A free inference thread always takes the oldest job of the highest lane that is below
+# its concurrency limit. Standard and priority work together may occupy at most
+# ML_WORKERS - 1 threads (on top of their own LANE_LIMITS), so with two or more workers
+# one thread is always able to pick up an urgent ticket.
+# When the breaker gives up on a ticket its job is cancelled, and if it is still queued
+# it is skipped instead of being scored for nobody. Jobs carry the breaker deadline, and
+# a job that has waited so long that it cannot finish in time (judged by a running
+# average of recent run times) fails at once with TimeoutError. Its ticket falls back
+# to keywords immediately, and the thread goes to a job that can still make it.
+# Without this an overloaded FIFO serves only tickets that are about to time out.
+# An estimate at or above the whole timeout would expire every job and never be
+# re-measured, so jobs are then run anyway. Each expiry also decays the estimate a
+# little, so one slow spell cannot keep expiring work after the models recover.
+#
+# Within a lane, jobs are weighted-fair-queued by tenant (X-Tenant-ID, weights from
+# admission.TENANT_WEIGHTS). Each job gets a virtual finish tag: the later of the lane's
+# virtual clock and the tenant's previous tag, plus 1/weight. The smallest tag runs first.
+# A tenant that submits 500 jobs at once therefore takes turns with the others instead
+# of queueing them all ahead. Jobs without a tenant share one flow, so a single flow is
+# plain FIFO.
+#
+# Lanes are strict priority, so fair queuing inside each lane alone would let one tenant
+# whose tickets all hit urgency keywords take every thread and starve every other
+# tenant's standard work. A tenant may therefore hold at most URGENT_TENANT_LIMIT urgent
+# jobs in flight (default half the threads). Above that its urgent jobs yield to other
+# tenants' queued work, though never to its own lower lanes. Idle threads still take them,
+# so the cap costs nothing when nobody else is waiting.
+#
+# INFERENCE_LANES=off keeps a single queue (the old behaviour, FIFO apart from the
+# tenant fairness) but still reports metrics per lane, so the two modes can be compared
+# under the same load.
+
+import collections
+import concurrent.futures
+import heapq
+import itertools
+import os
+import threading
+import time
+
+import metrics
+from config import URGENCY_FLAGS
+
+INFERENCE_LANES_ENABLED = os.getenv("INFERENCE_LANES", "on").lower() in ("on", "1", "true")
+ML_WORKERS = int(os.getenv("ML_WORKERS", 4))
+LANES = ("urgent", "priority", "standard")  # dispatch order
+EXPIRY_DECAY = 0.98  # run estimate multiplier per expired job (expiries give no new measurement)
+URGENT_TENANT_LIMIT = int(os.getenv("URGENT_TENANT_LIMIT", 0)) or max(1, ML_WORKERS // 2)
+PRIORITY_TIERS = {t.strip().lower() for t in os.getenv("PRIORITY_TIERS", "enterprise,premium").split(",") if t.strip()}
+
+
+def parse_lane_limits(spec: str, workers: int) -> dict:
+    """'urgent=4,standard=2' → per-lane max concurrent jobs; unlisted lanes use the defaults."""
+    limits = {"urgent": workers, "priority": max(1, workers - 1), "standard": max(1, workers - 1)}
+    for part in (spec or "").split(","):
+        lane, _, value = part.partition("=")
+        if lane.strip() in limits and value.strip():
+            limits[lane.strip()] = max(1, int(value))
+    return limits
+
+
+LANE_LIMITS = parse_lane_limits(os.getenv("LANE_LIMITS", ""), ML_WORKERS)
+
+# Label children bound once, as in metrics.py
+_WAIT = {lane: metrics.INFERENCE_SECONDS.labels(lane, "wait") for lane in LANES}
+_RUN = {lane: metrics.INFERENCE_SECONDS.labels(lane, "run") for lane in LANES}
+_QUEUED = {lane: metrics.INFERENCE_QUEUED.labels(lane) for lane in LANES}
+_SCORED = {lane: metrics.INFERENCE_JOBS.labels(lane, "scored") for lane in LANES}
+_CANCELLED = {lane: metrics.INFERENCE_JOBS.labels(lane, "cancelled") for lane in LANES}
+_EXPIRED = {lane: metrics.INFERENCE_JOBS.labels(lane, "expired") for lane in LANES}
+FALLBACKS = {lane: metrics.INFERENCE_FALLBACKS.labels(lane) for lane in LANES}
+
+
+def lane_for(text: str, tier: str = None) -> str:
+    """Pick a lane from the pre-signals (keyword flags, then customer tier)."""
+    t = text.lower()
+    if any(kw in t for kw in URGENCY_FLAGS):
+        return "urgent"
+    if isinstance(tier, str) and tier.strip().lower() in PRIORITY_TIERS:
+        return "priority"
+    return "standard"
+
+
+class InferenceScheduler:
+    def __init__(self, workers: int = ML_WORKERS, limits: dict = None, lanes_enabled: bool = INFERENCE_LANES_ENABLED,
+                 fair_queuing: bool = True, urgent_tenant_limit: int = None):
+        self.lanes_enabled = lanes_enabled
+        self.fair_queuing = fair_queuing  # off: tenants are ignored and each lane is FIFO
+        self.limits = dict(limits or LANE_LIMITS) if lanes_enabled else {lane: workers for lane in LANES}
+        # Combined cap for the non-urgent lanes: the thread it leaves free is reserved for urgent work
+        self.non_urgent_limit = max(1, workers - 1) if lanes_enabled else workers
+        # Per-tenant in-flight urgent cap (only meaningful when tenants are told apart)
+        self.urgent_tenant_limit = (urgent_tenant_limit or URGENT_TENANT_LIMIT) if lanes_enabled and fair_queuing else None
+        self._flows = {lane: {} for lane in LANES}          # tenant → deque of (finish tag, seq, job), tags ascending
+        self._heads = {lane: [] for lane in LANES}          # heap of (tag, seq, tenant): each queued tenant's first job
+        self._vtime = {lane: 0.0 for lane in LANES}         # finish tag of the last dispatched job
+        self._last_tag = {lane: {} for lane in LANES}       # tenant → finish tag of its newest job
+        self._seq = itertools.count()                       # FIFO among equal tags
+        self._queued = 0
+        self._running = {lane: 0 for lane in LANES}
+        self._urgent_running = collections.Counter()        # tenant → urgent jobs in flight
+        self._cond = threading.Condition()
+        self._run_estimate = 0.0  # moving average of fn() run time, seconds
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"inference-{i}", daemon=True).start()
+
+    def submit(self, lane: str, fn, timeout: float = None, tenant: str = None,
+               weight: float = 1.0) -> concurrent.futures.Future:
+        """
+        Queue fn() in a lane, fair-queued against other tenants by `weight`. Cancelling
+        the returned future drops the job if it has not started; with a `timeout` the
+        future fails with TimeoutError as soon as the job can no longer finish within it.
+        """
+        future = concurrent.futures.Future()
+        queue_lane = lane if self.lanes_enabled else "standard"  # FIFO mode: one queue, per-lane metrics
+        queued_at = time.perf_counter()
+        deadline = queued_at + timeout if timeout else None
+        if not self.fair_queuing:
+            tenant, weight = None, 1.0
+        with self._cond:
+            last = self._last_tag[queue_lane]
+            tag = max(self._vtime[queue_lane], last.get(tenant, 0.0)) + 1.0 / weight
+            last[tenant] = tag
+            seq = next(self._seq)
+            flow = self._flows[queue_lane].get(tenant)
+            if flow is None:
+                flow = self._flows[queue_lane][tenant] = collections.deque()
+                heapq.heappush(self._heads[queue_lane], (tag, seq, tenant))
+            flow.append((tag, seq, (future, fn, lane, queued_at, deadline, tenant)))
+            self._queued += 1
+            _QUEUED[lane].inc()
+            self._cond.notify()
+        return future
+
+    def _pop(self, queue_lane: str, skip=()):
+        """Smallest-tag job of a lane, ignoring tenants in `skip`. Must be called while holding _cond."""
+        heads = self._heads[queue_lane]
+        passed = []
+        while heads and heads[0][2] in skip:
+            passed.append(heapq.heappop(heads))
+        head = heapq.heappop(heads) if heads else None
+        for entry in passed:
+            heapq.heappush(heads, entry)
+        if head is None:
+            return None
+        tag, _, tenant = head
+        flow = self._flows[queue_lane][tenant]
+        _, _, job = flow.popleft()
+        if flow:
+            heapq.heappush(heads, (flow[0][0], flow[0][1], tenant))
+        else:
+            del self._flows[queue_lane][tenant]
+        self._vtime[queue_lane] = tag
+        if not heads:
+            self._last_tag[queue_lane].clear()  # every tenant is idle: start level again
+        self._queued -= 1
+        return job
+
+    def _next_job(self):
+        """
+        Smallest-tag job of the highest lane with spare concurrency; tenants at their urgent
+        cap go after other tenants' work. Must be called while holding _cond.
+        """
+        capped = ()
+        if self.urgent_tenant_limit is not None:
+            capped = {t for t, n in self._urgent_running.items() if n >= self.urgent_tenant_limit}
+        urgent_free = self._running["urgent"] < self.limits["urgent"]
+        if urgent_free and self._heads["urgent"]:
+            job = self._pop("urgent", capped)
+            if job is not None:
+                return "urgent", job
+        if self._running["priority"] + self._running["standard"] < self.non_urgent_limit:
+            for queue_lane in LANES[1:]:
+                if self._heads[queue_lane] and self._running[queue_lane] < self.limits[queue_lane]:
+                    # A capped tenant's own lower lanes still wait behind its urgent work
+                    job = self._pop(queue_lane, capped)
+                    if job is not None:
+                        return queue_lane, job
+        if capped and urgent_free and self._heads["urgent"]:
+            return "urgent", self._pop("urgent")  # nobody else is waiting: stay work-conserving
+        return None
+
+    def queued(self) -> int:
+        """Jobs waiting for a thread, across all lanes."""
+        with self._cond:
+            return self._queued
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                picked = self._next_job()
+                while picked is None:
+                    self._cond.wait()
+                    picked = self._next_job()
+                queue_lane, (future, fn, lane, queued_at, deadline, tenant) = picked
+                self._running[queue_lane] += 1
+                if queue_lane == "urgent":
+                    self._urgent_running[tenant] += 1
+            _QUEUED[lane].dec()
+            try:
+                if not future.set_running_or_notify_cancel():
+                    _CANCELLED[lane].inc()  # the breaker already gave up on this ticket
+                    continue
+                started = time.perf_counter()
+                _WAIT[lane].observe(started - queued_at)
+                if (deadline is not None and self._run_estimate < deadline - queued_at
+                        and started + self._run_estimate > deadline):
+                    _EXPIRED[lane].inc()
+                    self._run_estimate *= EXPIRY_DECAY
+                    future.set_exception(concurrent.futures.TimeoutError("inference would miss the breaker deadline"))
+                    continue
+                try:
+                    future.set_result(fn())
+                    _SCORED[lane].inc()
+                except BaseException as e:
+                    future.set_exception(e)
+                elapsed = time.perf_counter() - started
+                _RUN[lane].observe(elapsed)
+                self._run_estimate += 0.1 * (elapsed - self._run_estimate)
+            finally:
+                with self._cond:
+                    self._running[queue_lane] -= 1
+                    if queue_lane == "urgent":
+                        self._urgent_running[tenant] -= 1
+                        if not self._urgent_running[tenant]:
+                            del self._urgent_running[tenant]
+                    self._cond.notify_all()  # a lane that was at its limit may dispatch again
+
+
+# Shared by every request in this API process
+inference_scheduler = InferenceScheduler()
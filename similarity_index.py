@@ -0,0 +1,362 @@
+# Persistent approximate-nearest-neighbour index over every processed ticket's MiniLM
+# embedding — answers "has this been seen before, and how was it triaged?" across
+# months of history instead of the 5-minute storm window.
+#
+# Layout under SIMILARITY_INDEX_DIR, one row per ticket, every file append-only:
+#   vectors.f32     row-major float32 unit vectors, memory-mapped for search
+#   lists.i32       IVF list of each row (-1 = appended before the index was trained)
+#   meta.bin        msgpack {"dim": d} header, then [row, id, category, urgency, timestamp,
+#                   model_used, text snippet] per row
+#   centroids.npy   IVF coarse quantizer, written once enough rows exist
+#
+# Below TRAIN_ROWS rows, search is exact brute force (a few ms). Once that many exist the
+# writer starts spherical k-means on them in a background thread, so appends never wait
+# for it, and search stays exact until the centroids are written together with every
+# row's list label; from then on each append also records its nearest centroid. A query scores the NPROBE
+# nearest lists — roughly NPROBE/NLIST of the history — plus rows appended since the
+# reader last regrouped its lists, so latency stays in milliseconds at millions of rows.
+#
+# Any number of worker processes may append (serialised by an flock on the directory);
+# the API only reads and picks up new rows by watching file sizes.
+
+import contextlib
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, run a single writer process per index
+    fcntl = None
+from datetime import datetime, timezone
+
+import msgpack
+import numpy as np
+
+from ticket import Category
+
+log = logging.getLogger(__name__)
+
+INDEX_ENABLED = os.getenv("SIMILARITY_INDEX", "on").lower() in ("on", "1", "true")
+INDEX_DIR = os.getenv("SIMILARITY_INDEX_DIR", os.path.join(os.path.dirname(__file__), "similarity_index"))
+NLIST = int(os.getenv("SIMILARITY_NLIST", 1024))    # IVF lists; ~4·√N suits N rows of history
+NPROBE = int(os.getenv("SIMILARITY_NPROBE", 16))    # lists scanned per query (recall vs latency)
+TRAIN_ROWS_PER_LIST = 40                            # k-means needs a few dozen points per centroid
+KMEANS_ITERATIONS = 10
+REGROUP_MIN_TAIL = 10_000                           # unsorted rows tolerated before regrouping lists
+SNIPPET_CHARS = 300
+
+_VECTORS, _LISTS, _META, _CENTROIDS = "vectors.f32", "lists.i32", "meta.bin", "centroids.npy"
+_LOCK, _TRAIN_LOCK = ".lock", ".train.lock"
+
+
+def _nearest(x, centroids, chunk=8192):
+    """Index of the highest-dot-product centroid for each row of x."""
+    out = np.empty(len(x), dtype=np.int32)
+    for start in range(0, len(x), chunk):
+        out[start:start + chunk] = np.argmax(x[start:start + chunk] @ centroids.T, axis=1)
+    return out
+
+
+def _kmeans(x, k, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means (centroids kept unit length, assignment by cosine similarity)."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(x, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        empty = np.bincount(assign, minlength=k) == 0
+        sums[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]  # re-seed dead lists
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+class SimilarityIndex:
+    def __init__(self, path: str = INDEX_DIR, nlist: int = NLIST, nprobe: int = NPROBE):
+        self.path = path
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_rows = nlist * TRAIN_ROWS_PER_LIST
+        self.lock = threading.Lock()
+        self._write_lock = threading.Lock()  # the flock does not order threads of one process without fcntl
+        self._trainer = None                 # background training thread, if one was started
+
+        # Reader state, advanced by refresh()
+        self.dim = None
+        self._rows = 0               # rows with both a vector and a list label
+        self._vectors = None         # memmap over vectors.f32[:_rows]
+        self._lists = np.empty(0, dtype=np.int32)
+        self._centroids = None
+        self._centroids_mtime = None
+        self._order = None           # rows < _grouped, sorted by IVF list
+        self._bounds = None          # _order[_bounds[l]:_bounds[l + 1]] are the rows of list l
+        self._grouped = 0
+        self._meta_pos = 0           # bytes of meta.bin consumed
+        self._meta_offsets = np.full(0, -1, dtype=np.int64)
+        self._row_of = {}            # ticket id → newest row
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @contextlib.contextmanager
+    def _flock(self, name, blocking=True):
+        """Hold an flock on a file in the index directory; yields False if not blocking and it is taken."""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(name), "a") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    yield False
+                    return
+            yield True  # closing the file releases the lock
+
+    @contextlib.contextmanager
+    def _append_lock(self):
+        with self._write_lock, self._flock(_LOCK):
+            yield
+
+    def _stored_rows(self, dim: int) -> int:
+        """Rows with both a vector and a list label on disk."""
+        return min(os.path.getsize(self._file(_VECTORS)) // (dim * 4), os.path.getsize(self._file(_LISTS)) // 4)
+
+    # ─── Writer (worker) ──────────────────────────────────────────────────────
+
+    def add(self, ticket, vec) -> None:
+        """Append one processed Ticket and its embedding."""
+        self.add_batch([ticket], np.asarray(vec, dtype=np.float32)[None, :])
+
+    def add_batch(self, tickets: list, vecs) -> None:
+        """Append Tickets and their embeddings (one row each) under the cross-process lock."""
+        vecs = np.asarray(vecs, dtype=np.float32).reshape(len(tickets), -1)
+        vecs = vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+        with self._append_lock():
+            row_bytes = vecs.shape[1] * 4
+            with open(self._file(_VECTORS), "ab") as vf, open(self._file(_LISTS), "ab") as lf:
+                # A writer killed between appends leaves the two files uneven; cut back to the shorter
+                first = min(os.fstat(vf.fileno()).st_size // row_bytes, os.fstat(lf.fileno()).st_size // 4)
+                vf.truncate(first * row_bytes)
+                lf.truncate(first * 4)
+
+                centroids = self._load_centroids()
+                labels = (np.full(len(tickets), -1, dtype=np.int32) if centroids is None
+                          else _nearest(vecs, centroids))
+                vf.write(vecs.tobytes())
+                vf.flush()
+                lf.write(labels.tobytes())
+                lf.flush()
+
+            with open(self._file(_META), "ab") as mf:
+                packer = msgpack.Packer(use_bin_type=True)
+                if not mf.tell():
+                    mf.write(packer.pack({"dim": vecs.shape[1]}))
+                for i, t in enumerate(tickets):
+                    mf.write(packer.pack([first + i, t.id, int(t.category), t.urgency, t.timestamp,
+                                          t.model_used, t.text[:SNIPPET_CHARS]]))
+
+        if centroids is None and first + len(tickets) >= self.train_rows:
+            self._train_in_background(vecs.shape[1])
+
+    def train(self) -> None:
+        """
+        (Re)build the IVF quantizer from every row so far — e.g. after history has grown 10×.
+        Runs in the calling thread; appends carry on meanwhile.
+        """
+        with self.lock:
+            self.refresh()
+            dim = self.dim
+        if dim is not None:
+            with self._flock(_TRAIN_LOCK):
+                self._train(dim)
+
+    def wait_for_training(self, timeout: float = None) -> bool:
+        """Wait for this process's background training, if any; True once the index is trained."""
+        if self._trainer is not None:
+            self._trainer.join(timeout)
+        return self._load_centroids() is not None
+
+    def _train_in_background(self, dim: int) -> None:
+        if self._trainer is not None and self._trainer.is_alive():
+            return
+        self._trainer = threading.Thread(target=self._train_once, args=(dim,),
+                                         name="similarity-index-train", daemon=True)
+        self._trainer.start()
+
+    def _train_once(self, dim: int) -> None:
+        """First training; skipped if another process is training or has already trained."""
+        try:
+            with self._flock(_TRAIN_LOCK, blocking=False) as held:
+                if held and self._load_centroids() is None:
+                    self._train(dim)
+        except Exception:
+            log.exception("Training the similarity index failed; search stays exact until the next attempt")
+
+    def _train(self, dim: int) -> None:
+        """
+        Fit centroids on the rows stored now, then publish them with every row's list label.
+        k-means and labelling run without the append lock; only rows appended meanwhile are
+        labelled under it, just before the files are swapped. Must hold the _TRAIN_LOCK flock.
+        """
+        rows = self._stored_rows(dim)
+        if rows < self.nlist:
+            return
+        vectors = np.memmap(self._file(_VECTORS), dtype=np.float32, mode="r", shape=(rows, dim))
+        sample_size = min(rows, self.train_rows)
+        sample = np.asarray(vectors[np.sort(np.random.default_rng(0).choice(rows, sample_size, replace=False))])
+        centroids = _kmeans(sample, self.nlist)
+        labels = _nearest(vectors, centroids)
+
+        with self._append_lock():
+            total = self._stored_rows(dim)
+            if total > rows:
+                vectors = np.memmap(self._file(_VECTORS), dtype=np.float32, mode="r", shape=(total, dim))
+                labels = np.concatenate([labels, _nearest(vectors[rows:], centroids)])
+            tmp = self._file(_LISTS + ".tmp")
+            labels[:total].tofile(tmp)
+            os.replace(tmp, self._file(_LISTS))
+            tmp = self._file("centroids.tmp.npy")
+            np.save(tmp, centroids)
+            os.replace(tmp, self._file(_CENTROIDS))
+
+    def _load_centroids(self):
+        try:
+            return np.load(self._file(_CENTROIDS))
+        except (OSError, ValueError):
+            return None
+
+    # ─── Reader (API) ─────────────────────────────────────────────────────────
+
+    def refresh(self) -> None:
+        """Pick up rows appended (or a quantizer trained) by any writer since the last call."""
+        try:
+            centroids_mtime = os.stat(self._file(_CENTROIDS)).st_mtime_ns
+        except OSError:
+            centroids_mtime = None
+        if centroids_mtime != self._centroids_mtime:
+            # Trained (or retrained) — every row's list label changed
+            self._centroids = self._load_centroids()
+            self._centroids_mtime = centroids_mtime
+            self._lists = np.empty(0, dtype=np.int32)
+            self._grouped, self._order, self._bounds = 0, None, None
+
+        self._read_meta()
+        if self.dim is None:
+            return
+
+        try:
+            labelled = os.path.getsize(self._file(_LISTS)) // 4
+            stored = os.path.getsize(self._file(_VECTORS)) // (self.dim * 4)
+        except OSError:
+            return
+        rows = min(labelled, stored)
+        if rows > len(self._lists):
+            tail = np.fromfile(self._file(_LISTS), dtype=np.int32, count=rows - len(self._lists),
+                               offset=len(self._lists) * 4)
+            self._lists = np.concatenate([self._lists, tail])
+        if rows != self._rows:
+            self._rows = rows
+            self._vectors = np.memmap(self._file(_VECTORS), dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+        tail = self._rows - self._grouped
+        if self._centroids is not None and (self._order is None or tail > max(REGROUP_MIN_TAIL, self._grouped // 20)):
+            self._order = np.argsort(self._lists[:self._rows], kind="stable").astype(np.int64)
+            self._bounds = np.searchsorted(self._lists[:self._rows][self._order], np.arange(self.nlist + 1))
+            self._grouped = self._rows
+
+    def _read_meta(self) -> None:
+        try:
+            with open(self._file(_META), "rb") as f:
+                f.seek(self._meta_pos)
+                data = f.read()
+        except OSError:
+            return
+        if not data:
+            return
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(data)
+        consumed = 0
+        for record in unpacker:  # stops before a record still being written
+            if isinstance(record, dict):
+                self.dim = record["dim"]
+                consumed = unpacker.tell()
+                continue
+            row, ticket_id = record[0], record[1]
+            if row >= len(self._meta_offsets):
+                grown = np.full(max(row + 1, 2 * len(self._meta_offsets)), -1, dtype=np.int64)
+                grown[:len(self._meta_offsets)] = self._meta_offsets
+                self._meta_offsets = grown
+            self._meta_offsets[row] = self._meta_pos + consumed
+            self._row_of[ticket_id] = row
+            consumed = unpacker.tell()
+        self._meta_pos += consumed
+
+    def _meta(self, row):
+        offset = self._meta_offsets[row] if row < len(self._meta_offsets) else -1
+        if offset < 0:
+            return None
+        with open(self._file(_META), "rb") as f:
+            f.seek(offset)
+            unpacker = msgpack.Unpacker(f, raw=False)
+            return next(unpacker)
+
+    def search(self, vec, k: int = 10, nprobe: int = None, exact: bool = False) -> list:
+        """Return up to k (row, cosine similarity) pairs, best first."""
+        with self.lock:
+            self.refresh()
+            if not self._rows:
+                return []
+            q = np.asarray(vec, dtype=np.float32).ravel()
+            q = q / (np.linalg.norm(q) or 1.0)
+
+            if exact or self._centroids is None:
+                candidates = np.arange(self._rows)
+            else:
+                nprobe = min(nprobe or self.nprobe, self.nlist)
+                probe = np.argpartition(-(self._centroids @ q), nprobe - 1)[:nprobe]
+                parts = [self._order[self._bounds[l]:self._bounds[l + 1]] for l in probe]
+                parts.append(np.arange(self._grouped, self._rows))
+                candidates = np.sort(np.concatenate(parts))  # ascending rows read the memmap sequentially
+
+            scores = np.empty(len(candidates), dtype=np.float32)
+            for start in range(0, len(candidates), 65536):
+                chunk = candidates[start:start + 65536]
+                scores[start:start + len(chunk)] = self._vectors[chunk] @ q
+            k = min(k, len(candidates))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(int(candidates[i]), float(scores[i])) for i in top]
+
+    def similar_to(self, ticket_id: str, k: int = 5):
+        """Past tickets most similar to an indexed ticket (itself excluded); None if not indexed."""
+        with self.lock:
+            self.refresh()
+            row = self._row_of.get(ticket_id)
+            if row is None or row >= self._rows:
+                return None
+            vec = np.array(self._vectors[row])
+        results = []
+        for other, score in self.search(vec, k + 1):
+            meta = self._meta(other)
+            if meta is None or meta[1] == ticket_id:
+                continue
+            _, id_, category, urgency, ts, model_used, snippet = meta
+            results.append({
+                "id": id_,
+                "similarity": round(score, 4),
+                "category": Category(category).label,
+                "urgency_score": {"urgency": urgency},
+                "timestamp": datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+                "model_used": model_used,
+                "text": snippet,
+            })
+        return results[:k]
+
+    def __len__(self):
+        with self.lock:
+            self.refresh()
+            return self._rows
+
+
+# Shared instance: the worker appends to it, the API searches it
+similarity_index = SimilarityIndex() if INDEX_ENABLED else None
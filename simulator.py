@@ -0,0 +1,412 @@
+"""
+TriageX Capacity Simulator
+==========================
+Discrete-event simulation of the support floor for capacity planning: "how many agents
+of which skill mix keep high-urgency waits under 30 minutes at next month's volume?"
+
+The simulation drives the real ordering and routing code on a virtual clock.
+queue_manager supplies the priority order (in memory, no journal). routing supplies the
+assignment policy: map_tickets_to_agents, the batch Hungarian solve behind POST /route,
+or pull_next_ticket, the per-agent pull behind GET /agents/{id}/next. No models, Redis or
+sleeps are involved. Events (arrivals, handle-time completions, routing ticks) are
+processed in time order from a heap, so a month of traffic takes seconds.
+
+  * Arrivals are either synthetic or replayed. Synthetic arrivals form a Poisson process
+    with a daily cycle and quieter weekends. Replayed arrivals come from a JSONL file of
+    {"id", "text", "category"?, "urgency_score"?, "timestamp"?} lines, such as
+    batch_triage.py output. Missing category/urgency come from the keyword tier in
+    cascade.py, and --scale compresses the replay to model higher volume.
+  * Agents are copies of the AGENT_REGISTRY templates (--agents A1=3,A4=6), each with
+    the template's skills and concurrent-ticket capacity.
+  * Handle time is lognormal around a per-category mean, scaled by the agent's skill
+    for the category: × (1.5 − skill), so a 0.9 specialist takes 0.6× and an agent
+    with no skill 1.5×. Agents are on shift around the clock.
+  * The wait is the time from arrival until assignment. A ticket breaches its SLA when
+    the wait exceeds the SLA for its class (high urgency or normal). Tickets still
+    queued at the end count if they have already waited longer than that.
+
+Run:
+    python simulator.py --days 30 --per-day 3000
+    python simulator.py --days 30 --per-day 3000 --agents A1=3,A2=3,A3=1,A4=4
+    python simulator.py --replay triaged.jsonl --scale 1.5 --agents A4=8
+    python simulator.py --days 7 --per-day 3000 --policy pull --report sim.json
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault("EVENTS", "off")  # nobody is watching a simulated floor
+
+import numpy as np
+
+import events
+import queue_manager
+import routing
+from cascade import keyword_classify, keyword_urgency
+from config import HIGH_URGENCY_THRESHOLD
+from ticket import Category, Ticket
+
+RESET = "\033[0m"
+GREEN = "\033[92m"
+RED   = "\033[91m"
+BOLD  = "\033[1m"
+CYAN  = "\033[96m"
+
+DAY = 86_400.0
+PEAK_HOUR = 14  # synthetic arrivals peak mid-afternoon and bottom out at 02:00
+
+
+def parse_spec(spec: str, cast=float) -> dict:
+    """'Technical=0.4,Billing=0.3' → {"Technical": 0.4, "Billing": 0.3}."""
+    out = {}
+    for part in (spec or "").split(","):
+        key, _, value = part.partition("=")
+        if key.strip() and value.strip():
+            out[key.strip()] = cast(value)
+    return out
+
+
+# ─── Arrivals ─────────────────────────────────────────────────────────────────
+
+def synthetic_arrivals(args, rng) -> list:
+    """
+    Non-homogeneous Poisson arrivals, generated by thinning. The rate follows
+    1 + diurnal·cos(2π(h − PEAK_HOUR)/24) and is multiplied by --weekend on Saturdays
+    and Sundays. --per-day is the mean volume on a weekday.
+    """
+    horizon = args.days * DAY
+    peak = args.per_day / DAY * (1 + args.diurnal)
+    times = np.sort(rng.uniform(0, horizon, rng.poisson(peak * horizon)))
+    hours = times % DAY / 3600
+    rate = 1 + args.diurnal * np.cos(2 * np.pi * (hours - PEAK_HOUR) / 24)
+    rate *= np.where((times // DAY) % 7 >= 5, args.weekend, 1.0)  # day 0 is a Monday
+    times = times[rng.uniform(0, 1 + args.diurnal, len(times)) < rate]
+
+    mix = parse_spec(args.mix)
+    labels = list(mix)
+    weights = np.array([mix[k] for k in labels]) / sum(mix.values())
+    categories = rng.choice(len(labels), size=len(times), p=weights)
+    high = rng.uniform(size=len(times)) < args.high_fraction
+    urgency = np.where(high, rng.uniform(HIGH_URGENCY_THRESHOLD + 0.01, 1.0, len(times)),
+                       rng.uniform(0.0, HIGH_URGENCY_THRESHOLD, len(times)))
+    return [(float(t), f"S{i}", Category.from_label(labels[c]), float(u))
+            for i, (t, c, u) in enumerate(zip(times, categories, urgency))]
+
+
+def _epoch(ts):
+    if isinstance(ts, str):
+        parsed = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    return float(ts)
+
+
+def replayed_arrivals(args, rng) -> list:
+    """
+    Arrivals from a JSONL file, ordered by timestamp. The offsets from the first
+    timestamp are divided by --scale. If any line has no timestamp, arrival times are
+    drawn as a Poisson stream at --per-day instead.
+    """
+    records = []
+    with open(args.replay) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                d = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            text = d.get("text") or d.get("body") or d.get("title") or ""
+            category = d.get("category")
+            if category is None:
+                category, confidence = keyword_classify(text)
+                category = category if confidence else "General"
+            urgency = d.get("urgency_score")
+            if urgency is None:
+                urgency = keyword_urgency(text)[0]
+            if isinstance(urgency, dict):
+                urgency = urgency.get("urgency", 0.0)
+            ts = d.get("timestamp")
+            records.append((None if ts is None else _epoch(ts), str(d.get("id", d.get("request_id", len(records)))),
+                            Category.from_label(category), float(urgency)))
+    if not records:
+        return []
+    if any(ts is None for ts, *_ in records):
+        offsets = np.cumsum(rng.exponential(DAY / args.per_day, len(records)))
+    else:
+        records.sort(key=lambda r: r[0])
+        offsets = np.array([r[0] for r in records]) - records[0][0]
+    return [(float(t) / args.scale, ticket_id, category, urgency)
+            for t, (_, ticket_id, category, urgency) in zip(offsets, records)]
+
+
+# ─── Agents ───────────────────────────────────────────────────────────────────
+
+def build_agents(spec: str) -> list:
+    """Copies of the registry templates: 'A1=3,A4=6' (unlisted templates keep one agent, 0 leaves one out)."""
+    counts = parse_spec(spec, int)
+    unknown = set(counts) - {a.agent_id for a in routing.AGENT_REGISTRY}
+    if unknown:
+        raise SystemExit(f"Unknown agent template(s) in --agents: {', '.join(sorted(unknown))}")
+    agents = []
+    for template in routing.AGENT_REGISTRY:
+        for n in range(counts.get(template.agent_id, 1)):
+            agent = routing.Agent(f"{template.agent_id}#{n + 1}", template.name, template.skills, template.capacity)
+            agent.template = template.agent_id
+            agents.append(agent)
+    return agents
+
+
+# ─── Simulation ───────────────────────────────────────────────────────────────
+
+def simulate(args, arrivals: list, agents: list, rng) -> dict:
+    """
+    Run the event loop over `arrivals` [(t, id, Category, urgency)] with `agents`
+    installed as the routing registry. The real registry and queue are restored afterwards.
+    """
+    saved_registry, saved_by_id = list(routing.AGENT_REGISTRY), dict(routing.AGENTS_BY_ID)
+    saved_events, saved_store = events.EVENTS_ENABLED, queue_manager.QUEUE_FILE
+    events.EVENTS_ENABLED = False
+    queue_manager.use_store(None)
+    routing.AGENT_REGISTRY[:] = agents
+    routing.AGENTS_BY_ID.clear()
+    routing.AGENTS_BY_ID.update({a.agent_id: a for a in agents})
+    try:
+        return _run(args, arrivals, agents, rng)
+    finally:
+        for agent in agents:
+            agent.assigned_tickets.clear()
+        routing.AGENT_REGISTRY[:] = saved_registry
+        routing.AGENTS_BY_ID.clear()
+        routing.AGENTS_BY_ID.update(saved_by_id)
+        events.EVENTS_ENABLED = saved_events
+        queue_manager.use_store(saved_store)
+
+
+def _run(args, arrivals: list, agents: list, rng) -> dict:
+    n = len(arrivals)
+    # A replay ends one routing interval after its last arrival
+    horizon = args.days * DAY if not args.replay else (arrivals[-1][0] + args.route_interval if arrivals else 0.0)
+    handle_mean = {Category.from_label(k): v * 60 for k, v in parse_spec(args.handle).items()}
+    default_handle = float(np.mean(list(handle_mean.values()))) if handle_mean else 900.0
+    sigma = args.handle_sigma
+
+    # Per-ticket outcome columns, indexed by arrival order
+    arrived = np.array([a[0] for a in arrivals])
+    category = np.array([int(a[2]) for a in arrivals], dtype=np.int8)
+    high = np.array([a[3] > HIGH_URGENCY_THRESHOLD for a in arrivals], dtype=bool)
+    assigned = np.full(n, np.nan)
+    # Intrinsic work per ticket: lognormal with the category mean (mu = ln m − σ²/2)
+    means = np.array([handle_mean.get(Category(c), default_handle) for c in category])
+    work = rng.lognormal(np.log(means) - sigma ** 2 / 2, sigma) if n else np.zeros(0)
+
+    index = {}           # ticket id → arrival index (ids seen in this run)
+    duplicates = 0
+    busy = {a.template: 0.0 for a in agents}      # slot-seconds of handling per template
+    slots = {a.template: 0 for a in agents}
+    headcount = {a.template: 0 for a in agents}
+    for a in agents:
+        slots[a.template] += a.capacity
+        headcount[a.template] += 1
+    # Pull policy: specialists get the first chance at a fresh ticket of their category
+    by_skill = {c: sorted(agents, key=lambda a: -a.skills.get(c.label, 0.1)) for c in Category}
+    free = sum(a.capacity for a in agents)
+    completions = []     # heap of (t_done, seq, agent, ticket)
+    seq = 0
+    depth, depth_area, max_depth, last_t = 0, 0.0, 0, 0.0
+    solves = 0
+    epoch = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()  # a Monday
+
+    def start(agent, ticket, now):
+        nonlocal seq, free, depth
+        i = index[ticket.id]
+        assigned[i] = now
+        duration = work[i] * (1.5 - agent.skills.get(ticket.category.label, 0.1))
+        busy[agent.template] += min(now + duration, horizon) - now
+        seq += 1
+        heapq.heappush(completions, (now + duration, seq, agent, ticket))
+        free -= 1
+        depth -= 1
+
+    def route_batch(now):
+        nonlocal solves
+        before = {a.agent_id: len(a.assigned_tickets) for a in agents}
+        routing.map_tickets_to_agents(queue_manager.peek_queue(args.route_batch))
+        solves += 1
+        for agent in agents:
+            for ticket in agent.assigned_tickets[before[agent.agent_id]:]:
+                queue_manager.remove_ticket(ticket.id)
+                start(agent, ticket, now)
+
+    def pull(agent, now):
+        while len(agent.assigned_tickets) < agent.capacity:
+            ticket = routing.pull_next_ticket(agent)
+            if ticket is None:
+                return False
+            start(agent, ticket, now)
+        return True
+
+    wall_start = time.perf_counter()
+    i, next_tick = 0, 0.0
+    processed = 0
+    inf = math.inf
+    while True:
+        t_arrival = arrivals[i][0] if i < n else inf
+        t_done = completions[0][0] if completions else inf
+        batch = args.policy == "batch"
+        t_tick = next_tick if batch and depth else inf  # an empty queue needs no solve
+        now = min(t_arrival, t_done, t_tick)
+        if now >= horizon or now == inf:
+            break
+        depth_area += depth * (now - last_t)
+        last_t = now
+        processed += 1
+
+        if now == t_done:
+            _, _, agent, ticket = heapq.heappop(completions)
+            agent.assigned_tickets.remove(ticket)
+            free += 1
+            if not batch and depth:
+                pull(agent, now)
+        elif now == t_arrival:
+            _, ticket_id, cat, urgency = arrivals[i]
+            if ticket_id in index:
+                duplicates += 1
+                ticket_id = f"{ticket_id}~{i}"
+            index[ticket_id] = i
+            i += 1
+            queue_manager.add_ticket(Ticket(ticket_id, "", cat, urgency, epoch + now))
+            depth += 1
+            max_depth = max(max_depth, depth)
+            if batch and next_tick < now:
+                next_tick = math.ceil(now / args.route_interval) * args.route_interval
+            if not batch and free:
+                for agent in by_skill[cat]:
+                    if len(agent.assigned_tickets) < agent.capacity and routing.pull_next_ticket(agent) is not None:
+                        start(agent, agent.assigned_tickets[-1], now)
+                        break
+        else:
+            if free and depth:
+                route_batch(now)
+            next_tick = now + args.route_interval
+    depth_area += depth * (horizon - last_t)
+    wall_s = time.perf_counter() - wall_start
+
+    return _report(args, horizon, arrived[:i], category[:i], high[:i], assigned[:i],
+                   busy, slots, headcount, depth, depth_area, max_depth, solves, processed, duplicates, wall_s)
+
+
+# ─── Report ───────────────────────────────────────────────────────────────────
+
+def _percentiles(minutes: np.ndarray) -> dict:
+    if not len(minutes):
+        return {"count": 0}
+    p50, p90, p99 = np.percentile(minutes, [50, 90, 99])
+    return {"count": int(len(minutes)), "p50_min": round(float(p50), 1), "p90_min": round(float(p90), 1),
+            "p99_min": round(float(p99), 1), "max_min": round(float(minutes.max()), 1)}
+
+
+def _report(args, horizon, arrived, category, high, assigned, busy, slots, headcount,
+            depth, depth_area, max_depth, solves, processed, duplicates, wall_s) -> dict:
+    done = ~np.isnan(assigned)
+    waits = (assigned - arrived) / 60
+    # Censored: a still-queued ticket has waited at least until the end of the run
+    waited = np.where(done, waits, (horizon - arrived) / 60)
+    sla = parse_spec(args.sla)
+    report = {
+        "policy": args.policy,
+        "simulated_days": round(horizon / DAY, 2),
+        "arrivals": int(len(arrived)),
+        "assigned": int(done.sum()),
+        "still_queued": int(depth),
+        "duplicate_ids": duplicates,
+        "wait": _percentiles(waits[done]),
+        "wait_by_category": {Category(c).label: _percentiles(waits[done & (category == c)])
+                             for c in sorted(set(category.tolist()))},
+        "sla": {},
+        "queue_depth": {"mean": round(depth_area / horizon, 1) if horizon else 0.0, "max": int(max_depth)},
+        "utilization": {t: round(busy[t] / (slots[t] * horizon), 3) if horizon and slots[t] else 0.0 for t in busy},
+        "agents": headcount,
+        "route_solves": solves,
+        "events": processed,
+        "wall_s": round(wall_s, 2),
+    }
+    for cls, mask in (("high", high), ("normal", ~high)):
+        limit = sla.get(cls)
+        report["wait"][cls] = _percentiles(waits[done & mask])
+        if limit is not None:
+            breached = int((waited[mask] > limit).sum())
+            report["sla"][cls] = {"target_min": limit, "tickets": int(mask.sum()), "breached": breached,
+                                  "breach_pct": round(100 * breached / mask.sum(), 2) if mask.sum() else 0.0}
+    return report
+
+
+def _print_report(report: dict) -> None:
+    print(f"\n{BOLD}{'='*65}{RESET}")
+    print(f"{BOLD}  TriageX — Capacity Simulation ({report['policy']} routing){RESET}")
+    print(f"{BOLD}{'='*65}{RESET}")
+    print(f"  Simulated: {report['simulated_days']} days, {report['arrivals']} tickets, "
+          f"{report['events']} events in {report['wall_s']:.1f} s")
+    print(f"  Agents   : {report['agents']}")
+    w = report["wait"]
+    if w.get("count"):
+        print(f"  Wait     : p50={w['p50_min']}m  p90={w['p90_min']}m  p99={w['p99_min']}m  max={w['max_min']}m")
+    for cls in ("high", "normal"):
+        c = w.get(cls, {})
+        if c.get("count"):
+            print(f"    {cls:<7}: p50={c['p50_min']}m  p90={c['p90_min']}m  p99={c['p99_min']}m")
+    for cls, s in report["sla"].items():
+        colour = GREEN if s["breach_pct"] < 1 else RED
+        print(f"  {colour}SLA {cls:<6}: {s['breached']}/{s['tickets']} over {s['target_min']:g} min "
+              f"({s['breach_pct']}%){RESET}")
+    print(f"  Util.    : " + "  ".join(f"{t}={u:.0%}" for t, u in report["utilization"].items()))
+    print(f"  Queue    : mean depth {report['queue_depth']['mean']}, max {report['queue_depth']['max']}, "
+          f"{report['still_queued']} still queued at the end")
+    print(f"{BOLD}{'='*65}{RESET}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Discrete-event capacity simulation of queue, routing and agents.")
+    parser.add_argument("--replay", default=None, help="JSONL arrivals to replay instead of synthetic traffic")
+    parser.add_argument("--scale", type=float, default=1.0, help="replay volume multiplier (compresses time)")
+    parser.add_argument("--days", type=float, default=30, help="synthetic horizon in days")
+    parser.add_argument("--per-day", type=float, default=600, help="mean tickets per weekday")
+    parser.add_argument("--diurnal", type=float, default=0.6, help="daily rate swing, 0 (flat) .. <1")
+    parser.add_argument("--weekend", type=float, default=0.4, help="weekend volume relative to weekdays")
+    parser.add_argument("--mix", default="Technical=0.4,Billing=0.35,Legal=0.1,General=0.15",
+                        help="synthetic category mix")
+    parser.add_argument("--high-fraction", type=float, default=0.15, help="share of synthetic tickets that are high urgency")
+    parser.add_argument("--agents", default="", help="agents per AGENT_REGISTRY template, e.g. A1=3,A4=6")
+    parser.add_argument("--handle", default="Technical=25,Billing=12,Legal=40,General=10",
+                        help="mean handle minutes per category at skill 0.5")
+    parser.add_argument("--handle-sigma", type=float, default=0.6, help="lognormal sigma of handle times")
+    parser.add_argument("--sla", default="high=30,normal=480", help="max minutes to assignment per urgency class")
+    parser.add_argument("--policy", choices=("batch", "pull"), default="batch",
+                        help="batch: map_tickets_to_agents every --route-interval; pull: agents pull_next_ticket")
+    parser.add_argument("--route-interval", type=float, default=60, help="seconds between batch solves")
+    parser.add_argument("--route-batch", type=int, default=10, help="tickets peeked per batch solve")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--report", default=None, help="also write the report as JSON here")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    arrivals = replayed_arrivals(args, rng) if args.replay else synthetic_arrivals(args, rng)
+    if not arrivals:
+        sys.exit("No arrivals to simulate.")
+    print(f"  {CYAN}… simulating {len(arrivals)} arrivals{RESET}", flush=True)
+    report = simulate(args, arrivals, build_agents(args.agents), rng)
+    _print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ Fires 20 tickets simultaneously using a ThreadPoolExecutor, then validates:
   1. All 20 receive HTTP 202
   2. No duplicate ticket IDs appear in the processed queue
   3. Latency stats are printed
+  4. Resubmitting an already-accepted ticket ID replays the original result
 
 Run:
     python stress_test.py
@@ -118,6 +119,25 @@ def main():
     except Exception as exc:
         print(f"  {RED}Could not check queue: {exc}{RESET}")
 
+    # --- Validate idempotent resubmission ---
+    print(f"\n{CYAN}  Resubmitting one ticket ID (simulated client retry)…{RESET}")
+    original = successes[0] if successes else None
+    if original:
+        try:
+            retry = requests.post(
+                f"{API_URL}/ticket",
+                json={"id": original["ticket_id"], "text": "retry payload"},
+                timeout=30,
+            )
+            replayed = retry.headers.get("Idempotent-Replay") == "true"
+            same = retry.status_code == 202 and retry.json() == original["body"]
+            if replayed and same:
+                print(f"  {GREEN}✅ Retry answered from the original result — models not re-run{RESET}")
+            else:
+                print(f"  {RED}❌ Retry was not deduplicated (HTTP {retry.status_code}, replay={replayed}){RESET}")
+        except Exception as exc:
+            print(f"  {RED}Could not resubmit: {exc}{RESET}")
+
     print(f"{BOLD}{'='*65}{RESET}\n")
 
     if failures:
@@ -0,0 +1,12 @@
+# Unit tests never download the transformer models: benchmark.py's keyword stubs stand in
+# for `transformers` / `sentence_transformers` (hashed bag-of-words embeddings, so similar
+# texts still cluster). Stores and indexes that modules open at import go to a temp dir.
+
+import os
+import tempfile
+
+os.environ.setdefault("SIMILARITY_INDEX_DIR", os.path.join(tempfile.mkdtemp(prefix="triagex-tests-"), "similarity_index"))
+
+import benchmark  # noqa: E402
+
+benchmark.install_stub_models(0)
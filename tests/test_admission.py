@@ -0,0 +1,125 @@
+import os
+import time
+
+import pytest
+import redis
+
+import admission
+from admission import AdmissionController, Rejected
+
+
+class _DownRedis:
+    def register_script(self, script):
+        def call(keys, args):
+            raise redis.ConnectionError("Connection refused")
+        return call
+
+
+class _Scheduler:
+    def __init__(self, queued):
+        self._queued = queued
+
+    def queued(self):
+        return self._queued
+
+
+def test_local_bucket_admits_a_burst_then_sheds_until_refilled(monkeypatch):
+    monkeypatch.setitem(admission.TENANT_LIMITS, "acme", (50.0, 3.0))
+    ac = AdmissionController(enabled=True, backend="local")
+    for _ in range(3):
+        ac.check_tenant("acme")
+    with pytest.raises(Rejected) as e:
+        ac.check_tenant("acme")
+    assert e.value.reason == "tenant"
+    assert e.value.retry_after == 1  # whole seconds, rounded up
+
+    time.sleep(0.05)  # 50 tokens/s → at least one token back
+    ac.check_tenant("acme")
+
+
+def test_tenants_have_separate_buckets(monkeypatch):
+    monkeypatch.setitem(admission.TENANT_LIMITS, "noisy", (0.001, 1.0))
+    ac = AdmissionController(enabled=True, backend="local")
+    ac.check_tenant("noisy")
+    with pytest.raises(Rejected):
+        ac.check_tenant("noisy")
+    ac.check_tenant("quiet")
+
+
+def test_untagged_requests_share_the_default_bucket(monkeypatch):
+    assert admission.tenant_id(None) == admission.DEFAULT_TENANT
+    assert admission.tenant_id("") == admission.DEFAULT_TENANT
+    monkeypatch.setitem(admission.TENANT_LIMITS, admission.DEFAULT_TENANT, (0.001, 2.0))
+    ac = AdmissionController(enabled=True, backend="local")
+    ac.check_tenant(admission.tenant_id(None))
+    ac.check_tenant(admission.tenant_id(None))
+    with pytest.raises(Rejected):
+        ac.check_tenant(admission.tenant_id(None))
+
+
+def test_malformed_tenant_id_is_refused():
+    with pytest.raises(ValueError):
+        admission.tenant_id("acme corp; DROP")
+    assert admission.tenant_id("acme.eu-1") == "acme.eu-1"
+
+
+def test_redis_outage_falls_back_to_local_buckets(monkeypatch):
+    monkeypatch.setitem(admission.TENANT_LIMITS, "acme", (0.001, 1.0))
+    ac = AdmissionController(enabled=True, backend="redis", r=_DownRedis())
+    ac.check_tenant("acme")
+    with pytest.raises(Rejected):
+        ac.check_tenant("acme")
+
+
+def test_backlog_check_sheds_everyone_and_caches_the_depth(monkeypatch):
+    reads = []
+
+    def backlog(r):
+        reads.append(r)
+        return admission.INGEST_MAX_BACKLOG
+
+    monkeypatch.setattr(admission.ingest, "backlog", backlog)
+    ac = AdmissionController(enabled=True, backend="local")
+    for _ in range(3):
+        with pytest.raises(Rejected) as e:
+            ac.check_backlog(None)
+        assert e.value.reason == "backlog"
+        assert e.value.retry_after == admission.SHED_RETRY_AFTER
+    assert len(reads) == 1
+
+
+def test_inference_check_exempts_the_urgent_lane():
+    ac = AdmissionController(enabled=True, backend="local")
+    full = _Scheduler(admission.INFERENCE_MAX_QUEUED)
+    ac.check_inference(full, "urgent")
+    with pytest.raises(Rejected) as e:
+        ac.check_inference(full, "standard")
+    assert e.value.reason == "inference"
+    ac.check_inference(_Scheduler(admission.INFERENCE_MAX_QUEUED - 1), "standard")
+
+
+def test_disabled_controller_admits_everything(monkeypatch):
+    monkeypatch.setitem(admission.TENANT_LIMITS, "acme", (0.001, 1.0))
+    monkeypatch.setattr(admission.ingest, "backlog", lambda r: 10 ** 9)
+    ac = AdmissionController(enabled=False, backend="local")
+    for _ in range(5):
+        ac.check_backlog(None)
+        ac.check_tenant("acme")
+        ac.check_inference(_Scheduler(10 ** 9), "standard")
+
+
+def test_parse_tenant_limits_and_weights():
+    assert admission.parse_tenant_limits("acme=100:500, trial=1") == {
+        "acme": (100.0, 500.0),
+        "trial": (1.0, admission.TENANT_BURST),
+    }
+    assert admission.parse_tenant_weights("acme=4,bad=0") == {"acme": 4.0, "bad": 0.01}
+
+
+@pytest.mark.skipif("ADMISSION" in os.environ, reason="ADMISSION set in the environment")
+def test_admission_is_opt_in(monkeypatch):
+    monkeypatch.setitem(admission.TENANT_LIMITS, admission.DEFAULT_TENANT, (0.001, 1.0))
+    ac = AdmissionController(backend="local")
+    assert not ac.enabled
+    for _ in range(5):
+        ac.check_tenant(admission.tenant_id(None))
@@ -0,0 +1,90 @@
+import argparse
+import collections
+import json
+import time
+
+import pytest
+
+import batch_triage
+
+
+def _args(tmp_path, records, **overrides):
+    src = tmp_path / "backlog.jsonl"
+    src.write_text("".join(json.dumps(r) + "\n" for r in records))
+    args = dict(
+        input=str(src), output=str(tmp_path / "triaged.jsonl"), redis=False, workers=1,
+        batch_size=4, model_batch_size=4, no_storm=False, checkpoint=str(tmp_path / "ckpt"),
+        resume=False, progress=0, report=None,
+    )
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def _storm(n, start="2026-01-01T00:00:00"):
+    return [{"id": f"S{i}", "text": "payment gateway down cannot checkout", "timestamp": start} for i in range(n)]
+
+
+def test_replay_never_touches_the_shared_storm_detector(tmp_path, monkeypatch):
+    pytest.importorskip("torch")  # the pool processes pin torch threads
+    import deduplicator
+
+    class Live:
+        def check_storm(self, *args, **kwargs):
+            raise AssertionError("backfill used the live storm detector")
+
+    monkeypatch.setattr(deduplicator, "deduplicator", Live())
+    report = batch_triage.run(_args(tmp_path, _storm(12)))
+    assert report["storm"] == {"normal": 10, "master": 1, "suppress": 1}
+
+
+def test_redis_sink_publishes_backfill_tickets(tmp_path, monkeypatch):
+    pytest.importorskip("torch")
+    fakeredis = pytest.importorskip("fakeredis")
+    import ingest
+    import redis
+    from ticket import Ticket
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis, "Redis", lambda **kwargs: fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(ingest, "INGEST_MODE", "list")
+    batch_triage.run(_args(tmp_path, _storm(3), redis=True, no_storm=True))
+
+    published = fakeredis.FakeRedis(server=server).lrange(ingest.REDIS_QUEUE_KEY, 0, -1)
+    tickets = [Ticket.decode(raw) for raw in published]
+    assert sorted(t.id for t in tickets) == ["S0", "S1", "S2"]
+    assert all(t.backfill and not t.processed for t in tickets)
+
+
+def test_read_batches_skips_malformed_lines_and_resumes_at_an_offset(tmp_path):
+    src = tmp_path / "backlog.jsonl"
+    src.write_text(
+        '{"id": "a", "text": "refund please"}\n'
+        "not json\n"
+        '{"id": "b", "text": "   "}\n'
+        "\n"
+        '{"text": "login broken"}\n'
+        '{"id": "c", "text": "invoice wrong"}\n'
+    )
+    stats = collections.Counter()
+    batches = list(batch_triage._read_batches(str(src), 0, 2, stats))
+    assert [[r["id"] for r in records] for _, records in batches] == [["a", "BATCH-0-5"], ["c"]]
+    assert (stats["lines"], stats["malformed"]) == (6, 2)
+
+    # A checkpoint stores the end offset of the last finished batch
+    resumed = list(batch_triage._read_batches(str(src), batches[0][0], 2, collections.Counter()))
+    assert [[r["id"] for r in records] for _, records in resumed] == [["c"]]
+
+
+def test_ticket_time_uses_the_record_timestamp():
+    assert batch_triage._ticket_time({"timestamp": "2026-01-01T00:00:00Z"}) == 1767225600.0
+    assert batch_triage._ticket_time({"timestamp": "2026-01-01T00:00:00"}) == 1767225600.0
+    before = time.time()
+    assert batch_triage._ticket_time({"timestamp": "yesterday"}) >= before
+
+
+def test_checkpoint_for_another_input_is_refused(tmp_path):
+    ckpt = str(tmp_path / "ckpt")
+    batch_triage._save_checkpoint(ckpt, {"input": str(tmp_path / "other.jsonl"), "offset": 10})
+    with pytest.raises(SystemExit):
+        batch_triage._load_checkpoint(ckpt, str(tmp_path / "backlog.jsonl"))
+    assert batch_triage._load_checkpoint(str(tmp_path / "missing"), "x") == {}
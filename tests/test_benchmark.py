@@ -0,0 +1,57 @@
+import argparse
+
+import pytest
+
+import benchmark
+
+
+def _tenant_args(**overrides):
+    args = dict(tenants=2, rate=20.0, duration=10.0, noisy_rate=50.0, noisy_start=5.0,
+                mean_words=5, urgent_fraction=None, seed=1)
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def _urgent(text):
+    return any(text.startswith(u) for u in benchmark.URGENT_TEXTS)
+
+
+@pytest.mark.parametrize("fraction", [0.0, 1.0])
+def test_tenant_workload_honours_the_urgent_fraction(fraction):
+    workload = benchmark.build_tenant_workload(_tenant_args(urgent_fraction=fraction))
+    assert workload
+    assert all(_urgent(text) == bool(fraction) for _, _, text, _ in workload)
+
+
+def test_noisy_tenant_starts_at_noisy_start():
+    workload = benchmark.build_tenant_workload(_tenant_args())
+    noisy = [offset for offset, _, _, kind in workload if kind == "tenant:noisy"]
+    assert noisy and min(noisy) >= 5.0 and max(noisy) < 10.0
+    assert {kind for *_, kind in workload} == {"tenant:quiet-1", "tenant:quiet-2", "tenant:noisy"}
+
+
+@pytest.mark.parametrize("noisy_start", [10.0, 12.0, -1.0])
+def test_noisy_start_outside_the_run_is_rejected(noisy_start):
+    with pytest.raises(ValueError, match="--noisy-start"):
+        benchmark.build_tenant_workload(_tenant_args(noisy_start=noisy_start))
+
+
+def test_histogram_percentiles_stay_within_the_bucket_error():
+    h = benchmark.LatencyHistogram()
+    for ms in range(1, 1001):
+        h.record(ms / 1000.0)
+    for p, exact_ms in [(50, 500), (90, 900), (99, 990)]:
+        assert exact_ms <= h.percentile(p) <= exact_ms * (1 + 1 / h.sub_buckets)
+    assert h.to_dict()["max_ms"] == 1000.0 and h.to_dict()["count"] == 1000
+
+
+def test_workload_is_reproducible_and_includes_retries_and_storms():
+    build = lambda seed: benchmark.build_workload(20.0, 5.0, 10, [(1.0, 5, 0.5)], seed, retry_fraction=0.2)
+    assert build(7) == build(7) != build(8)
+
+    workload = build(7)
+    assert [a[0] for a in workload] == sorted(a[0] for a in workload)
+    retries = [a for a in workload if a[3] == "retry"]
+    originals = {a[1] for a in workload if a[3] == "normal"}
+    assert retries and all(a[1] in originals for a in retries)  # a retry reuses its ticket's ID
+    assert sum(a[3] == "storm" for a in workload) == 5
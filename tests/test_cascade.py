@@ -0,0 +1,40 @@
+import pytest
+
+import cascade
+
+# One keyword hit has confidence 0.5, so at this threshold any stray hit would decide
+ONE_HIT = 0.5
+
+
+@pytest.mark.parametrize("text", [
+    "Please downgrade our plan before the next cycle",  # "down" inside "downgrade"
+    "The breakdown on page two looks odd",              # "down" inside "breakdown"
+])
+def test_urgency_flags_inside_other_words_fall_through_to_the_model(text):
+    assert cascade.decide(text, threshold=ONE_HIT)[1] is None
+
+
+def test_category_keywords_inside_other_words_fall_through_to_the_model():
+    assert cascade.decide("We saw rapid growth this quarter", threshold=ONE_HIT) == (None, None)  # "api"
+
+
+@pytest.mark.parametrize("text", [
+    "This is not urgent, whenever you get a chance",
+    "It isn't really critical but the export looks odd",
+    "No emergency here, just curious",
+    "It’s not urgent",
+])
+def test_negated_urgency_flags_fall_through_to_the_model(text):
+    assert cascade.decide(text, threshold=ONE_HIT)[1] is None
+
+
+def test_negation_does_not_cross_sentences():
+    _, conf = cascade.keyword_urgency("We did not expect this. Production is down, urgent!")
+    assert conf == 0.875
+
+
+def test_whole_words_and_plurals_still_decide():
+    assert cascade.decide("Refund the duplicate charges on my invoices")[0] == "Billing"
+    assert cascade.decide("Production is down, urgent!")[1] == {"urgency": cascade.KEYWORD_HIGH_URGENCY}
+    # "can't" is a failure, not a negation of the topic
+    assert cascade.decide("I can't login, error 500 from the api")[0] == "Technical"
@@ -0,0 +1,71 @@
+import collections
+import threading
+import time
+
+import pytest
+
+from deduplicator import Deduplicator, SharedDeduplicator
+
+fakeredis = pytest.importorskip("fakeredis")
+
+STORM = "payment gateway is down and nobody can check out"
+
+
+def test_local_storm_fires_master_once_then_suppresses():
+    d = Deduplicator()
+    now = time.time()
+    statuses = [d.check_storm(STORM, now=now + i) for i in range(13)]
+    assert statuses == ["normal"] * 10 + ["master", "suppress", "suppress"]
+    assert d.check_storm("refund for invoice 1234 please", now=now + 14) == "normal"
+
+
+def test_local_window_forgets_old_tickets():
+    d = Deduplicator()
+    for i in range(10):
+        d.check_storm(STORM, now=1000.0 + i)
+    assert d.check_storm(STORM, now=1000.0 + 9 + d.time_window_seconds + 1) == "normal"
+
+
+def test_workers_that_each_opened_a_cluster_fire_one_master():
+    r = fakeredis.FakeRedis()
+    now = time.time()
+    workers = [SharedDeduplicator(r) for _ in range(4)]
+    for w in workers:
+        # Each worker has just refreshed and knows no cluster, as when a storm starts
+        w._last_refresh = w._last_miss_refresh = now
+    statuses = collections.Counter()
+    for _ in range(13):
+        for w in workers:
+            statuses[w.check_storm(STORM, now=now)] += 1
+
+    assert r.zcard("{storm}:clusters") == 4  # the race did split the storm
+    assert statuses["master"] == 1
+    assert statuses["normal"] == 40
+
+
+def test_concurrent_workers_fire_one_master():
+    r = fakeredis.FakeRedis()
+    workers = [SharedDeduplicator(r) for _ in range(4)]
+    statuses = collections.Counter()
+    start = threading.Barrier(len(workers))
+
+    def feed(w):
+        start.wait()
+        for _ in range(25):
+            statuses[w.check_storm(STORM)] += 1
+
+    threads = [threading.Thread(target=feed, args=(w,)) for w in workers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert statuses["master"] == 1
+    assert sum(statuses.values()) == 100
+
+
+def test_shared_unique_tickets_stay_normal_and_open_clusters():
+    r = fakeredis.FakeRedis()
+    w = SharedDeduplicator(r)
+    texts = ["refund invoice", "password reset loop", "gdpr data request", "dashboard is slow"]
+    assert [w.check_storm(t) for t in texts] == ["normal"] * 4
+    assert r.hlen("{storm}:centroids") == 4
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import queue
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+import events
+import main
+import queue_manager
+from ticket import Category, Ticket
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def _ticket(id):
+    return Ticket(id, f"invoice {id}", Category.BILLING, 0.5, time.time())
+
+
+class _Request:
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+@pytest.fixture
+def live(tmp_path, monkeypatch):
+    """Events on, published through fake Redis, with a fresh broadcaster and queue store."""
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(events, "EVENTS_ENABLED", True)
+    monkeypatch.setattr(events, "_client", client)
+    monkeypatch.setattr(events, "broadcaster", events.Broadcaster())
+    queue_manager.use_store(str(tmp_path / "queue_store.bin"))
+    yield client
+    queue_manager.use_store(None)
+
+
+async def _subscribed(client):
+    for _ in range(200):
+        if client.pubsub_numsub(events.EVENTS_CHANNEL)[0][1]:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("broadcaster never subscribed")
+
+
+def _data(frame):
+    kind, data = frame.strip().split("\n")
+    return kind.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+def test_encoded_event_shapes():
+    t = _ticket("E-1")
+    assert events._encode("enqueued", 1.0, t) == {"type": "enqueued", "ts": 1.0, "ticket": t.to_dict()}
+    assert events._encode("popped", 1.0, t) == {"type": "popped", "ts": 1.0, "id": "E-1", "category": "Billing"}
+    agent = {"id": "A1", "capacity": 2, "current_load": 1, "assigned_tickets": ["E-1"]}
+    assert events._encode("agent_load", 1.0, agent) == {"type": "agent_load", "ts": 1.0, "agent": agent}
+
+
+def test_slow_viewer_backlog_is_replaced_by_one_resync():
+    async def run():
+        slow, fast = asyncio.Queue(maxsize=2), asyncio.Queue(maxsize=10)
+        for frame in ("f1", "f2", "f3"):
+            events._offer([slow, fast], frame)
+        return [slow.get_nowait() for _ in range(slow.qsize())], fast.qsize()
+
+    assert asyncio.run(run()) == ([events.RESYNC], 3)
+
+
+def test_full_buffer_drops_and_counts_events(monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_ENABLED", True)
+    monkeypatch.setattr(events, "_buffer", queue.Queue(maxsize=1))
+    monkeypatch.setattr(events, "_publisher", object())  # no thread draining the buffer
+    dropped = REGISTRY.get_sample_value("triagex_events_dropped_total")
+    events.ticket_enqueued(_ticket("E-2"))
+    events.ticket_enqueued(_ticket("E-3"))
+    assert REGISTRY.get_sample_value("triagex_events_dropped_total") == dropped + 1
+
+
+def test_stream_sends_a_snapshot_then_queue_deltas(live):
+    queue_manager.add_ticket(_ticket("before"))
+
+    async def run():
+        request = _Request()
+        response = await main.stream_updates(request)
+        assert response.media_type == "text/event-stream"
+        frames = response.body_iterator
+
+        kind, snapshot = _data(await frames.__anext__())
+        assert kind == "snapshot"
+        assert [t["id"] for t in snapshot["tickets"]] == ["before"]
+
+        await _subscribed(live)
+        queue_manager.add_ticket(_ticket("after"))
+        queue_manager.get_next_ticket()
+        seen = []
+        while len(seen) < 2:
+            kind, update = _data(await asyncio.wait_for(frames.__anext__(), timeout=5))
+            assert kind == "update"
+            seen += [(e["type"], e.get("id") or e["ticket"]["id"]) for e in update]
+
+        request.disconnected = True
+        with pytest.raises(StopAsyncIteration):
+            await asyncio.wait_for(frames.__anext__(), timeout=5)
+        return seen
+
+    assert asyncio.run(run()) == [("enqueued", "after"), ("popped", "before")]
+    assert events.broadcaster._viewers == {}
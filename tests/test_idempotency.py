@@ -0,0 +1,84 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+import events
+import main
+import queue_manager
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """The /ticket handler with fake Redis and a temp queue store."""
+    monkeypatch.setattr(events, "EVENTS_ENABLED", False)
+    r = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(main, "r", r)
+    queue_manager.use_store(str(tmp_path / "queue_store.bin"))
+    yield r
+    queue_manager.use_store(None)
+
+
+def _submit(id, text="I was charged twice on my invoice"):
+    return asyncio.run(main.submit_ticket(main.TicketRequest(id=id, text=text), None, None))
+
+
+def test_retry_replays_the_stored_response(api):
+    first = _submit("T-1")
+    assert first.status_code == 202
+    assert 0 < api.ttl("ticket_seen:T-1") <= main.IDEMPOTENCY_TTL
+    assert api.ttl("ticket_seen:T-1") > main.IDEMPOTENCY_PENDING_TTL
+
+    retry = _submit("T-1")
+    assert retry.status_code == 202
+    assert retry.headers["idempotent-replay"] == "true"
+    assert json.loads(retry.body) == json.loads(first.body)
+
+
+def test_in_flight_claim_only_holds_for_the_pending_ttl(api, monkeypatch):
+    seen = {}
+
+    async def observe(ticket, tenant, tier, idem_key):
+        seen["value"], seen["ttl"] = api.get(idem_key), api.ttl(idem_key)
+        with pytest.raises(HTTPException) as e:
+            _submit_in_thread(ticket.id)
+        seen["retry"] = e.value.status_code
+        raise HTTPException(status_code=500, detail="model error")
+
+    monkeypatch.setattr(main, "_triage_and_enqueue", observe)
+    with pytest.raises(HTTPException):
+        _submit("T-2")
+    assert seen == {"value": "pending", "ttl": main.IDEMPOTENCY_PENDING_TTL, "retry": 409}
+    assert api.get("ticket_seen:T-2") is None  # released on the error path
+
+
+def test_claim_left_by_a_killed_process_expires(api, monkeypatch):
+    monkeypatch.setattr(main, "IDEMPOTENCY_PENDING_TTL", 1)
+    original = main._triage_and_enqueue
+
+    async def killed(*args):
+        raise KeyboardInterrupt  # stands in for SIGKILL: no cleanup below runs
+
+    monkeypatch.setattr(main, "_triage_and_enqueue", killed)
+    monkeypatch.setattr(main, "_release_claim", lambda key: None)
+    with pytest.raises(KeyboardInterrupt):
+        _submit("T-3")
+
+    with pytest.raises(HTTPException) as e:
+        _submit("T-3")
+    assert e.value.status_code == 409
+
+    monkeypatch.setattr(main, "_triage_and_enqueue", original)
+    time.sleep(1.1)
+    assert _submit("T-3").status_code == 202
+
+
+def _submit_in_thread(id):
+    # asyncio.run cannot nest inside the running handler
+    with ThreadPoolExecutor(1) as pool:
+        return pool.submit(_submit, id).result()
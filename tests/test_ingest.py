@@ -0,0 +1,50 @@
+import pytest
+
+import ingest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    monkeypatch.setattr(ingest, "INGEST_MODE", "stream")
+    monkeypatch.setattr(ingest, "CLAIM_IDLE_MS", 0)  # every pending entry counts as abandoned
+    return fakeredis.FakeRedis()
+
+
+def _abandoned(r, count):
+    """Publish `count` tickets and leave them pending on a consumer that then dies."""
+    for i in range(count):
+        ingest.publish(r, f"ticket-{i}".encode())
+    dead = ingest.StreamConsumer(r, name="dead", count=count)
+    return [entry_id for entry_id, _ in dead.read(block_ms=0)]
+
+
+def test_reclaim_sweeps_resume_from_the_cursor(stream):
+    ids = _abandoned(stream, 5)
+    survivor = ingest.StreamConsumer(stream, name="survivor", count=2)
+
+    swept = [[entry_id for entry_id, _ in survivor.reclaim()] for _ in range(3)]
+    assert swept == [ids[0:2], ids[2:4], ids[4:5]]
+    assert not survivor._sweeping()  # wrapped around, the next sweep starts over
+
+
+def test_read_continues_an_unfinished_sweep(stream):
+    ids = _abandoned(stream, 3)
+    survivor = ingest.StreamConsumer(stream, name="survivor", count=2)
+    first = survivor.read(block_ms=0)   # the interval has elapsed: sweep starts
+    second = survivor.read(block_ms=0)  # interval not elapsed, but the sweep is unfinished
+    assert [entry_id for entry_id, _ in first + second] == ids
+
+
+def test_poison_entry_is_dead_lettered_after_max_deliveries(stream, monkeypatch):
+    monkeypatch.setattr(ingest, "MAX_DELIVERIES", 2)
+    (entry_id,) = _abandoned(stream, 1)  # delivery 1 failed
+    survivor = ingest.StreamConsumer(stream, name="survivor")
+
+    assert [e for e, _ in survivor.reclaim()] == [entry_id]  # delivery 2, also fails
+    assert survivor.reclaim() == []                          # a third is never attempted
+
+    assert stream.xpending(ingest.REDIS_STREAM_KEY, ingest.CONSUMER_GROUP)["pending"] == 0
+    ((_, fields),) = stream.xrange(ingest.DEAD_LETTER_KEY)
+    assert fields == {b"ticket": b"ticket-0", b"entry_id": entry_id, b"deliveries": b"2"}
@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+import events
+import main
+import metrics
+import queue_manager
+from ticket import Category, Ticket
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def _stage_count(stage):
+    return _sample("triagex_stage_seconds_count", stage=stage)
+
+
+def _tickets_scored():
+    return sum(_sample("triagex_tickets_total", model=m) for m in ("transformer", "keyword_fallback", "keyword_cascade"))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_ENABLED", False)
+    queue_manager.use_store(str(tmp_path / "queue_store.bin"))
+    yield
+    queue_manager.use_store(None)
+
+
+def test_submission_records_its_stages_and_model_tier(store, monkeypatch):
+    monkeypatch.setattr(main, "r", fakeredis.FakeRedis(decode_responses=True))
+    pushes, scored = _stage_count("redis_push"), _tickets_scored()
+
+    request = main.TicketRequest(id="M-1", text="I was charged twice on my invoice")
+    assert asyncio.run(main.submit_ticket(request, None, None)).status_code == 202
+    assert _stage_count("redis_push") == pushes + 1
+    assert _tickets_scored() == scored + 1
+
+    replays = _sample("triagex_idempotent_replays_total")
+    asyncio.run(main.submit_ticket(request, None, None))
+    assert _sample("triagex_idempotent_replays_total") == replays + 1
+    assert _tickets_scored() == scored + 1  # a replay is not scored again
+
+
+def test_queue_operations_record_latency_and_depth(store):
+    adds, saves = _stage_count("queue_add"), _stage_count("queue_save")
+    depth = _sample("triagex_queue_depth", category="Legal")
+
+    queue_manager.add_ticket(Ticket("M-2", "contract question", Category.LEGAL, 0.5, time.time()))
+    assert _stage_count("queue_add") == adds + 1
+    assert _stage_count("queue_save") == saves + 1  # one journal append
+    assert _sample("triagex_queue_depth", category="Legal") == depth + 1
+
+    queue_manager.get_next_ticket()
+    assert _sample("triagex_queue_depth", category="Legal") == depth
+
+
+def test_metrics_endpoint_serves_the_prometheus_text_format():
+    response = main.get_metrics()
+    assert response.media_type == metrics.CONTENT_TYPE_LATEST
+    body = response.body.decode()
+    assert "# TYPE triagex_stage_seconds histogram" in body
+    assert 'triagex_stage_seconds_bucket{le="0.0001",stage="classify"}' in body
@@ -0,0 +1,146 @@
+import glob
+import os
+import time
+
+import msgpack
+import pytest
+
+import events
+import queue_manager as qm
+from ticket import Category, Ticket
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_ENABLED", False)
+    path = str(tmp_path / "queue_store.bin")
+    qm.use_store(path)
+    yield path
+    qm.use_store(None)
+
+
+def _ticket(id, category, urgency):
+    return Ticket(id, f"ticket {id}", category, urgency, time.time())
+
+
+def _ids(tickets):
+    return [t.id for t in tickets]
+
+
+def test_journal_round_trip_keeps_priority_order(store):
+    qm.add_ticket(_ticket("a", Category.BILLING, 0.4))
+    qm.add_ticket(_ticket("b", Category.TECHNICAL, 0.9))
+    qm.add_ticket(_ticket("c", Category.LEGAL, 0.4))
+    qm.add_ticket(_ticket("d", Category.GENERAL, 0.7))
+    assert qm.get_next_ticket().id == "b"
+    assert qm.remove_ticket("c").id == "c"
+
+    qm.use_store(store)  # what a restarted process sees
+
+    assert qm.get_queue_size() == 2
+    assert _ids(qm.peek_queue()) == ["d", "a"]
+    restored = qm.get_next_ticket()
+    assert (restored.id, restored.category, restored.urgency) == ("d", Category.GENERAL, 0.7)
+
+
+def test_duplicate_ids_are_not_queued_twice(store):
+    assert qm.add_ticket(_ticket("a", Category.BILLING, 0.4))
+    assert not qm.add_ticket(_ticket("a", Category.BILLING, 0.4))
+    assert qm.get_queue_size() == 1
+
+
+def test_pop_best_for_skills_weighs_urgency_by_skill(store):
+    qm.add_ticket(_ticket("tech", Category.TECHNICAL, 0.9))
+    qm.add_ticket(_ticket("bill", Category.BILLING, 0.6))
+    qm.add_ticket(_ticket("legal", Category.LEGAL, 0.95))
+
+    # 0.6 × 1.0 beats 0.9 × 0.5; Legal has skill 0 so it is never chosen
+    billing_agent = {"Billing": 1.0, "Technical": 0.5, "Legal": 0.0}
+    assert qm.pop_best_for_skills(billing_agent).id == "bill"
+    assert qm.pop_best_for_skills(billing_agent).id == "tech"
+    assert qm.pop_best_for_skills(billing_agent) is None
+
+    # The popped entries left stale copies in the global heap
+    assert _ids(qm.peek_queue()) == ["legal"]
+    assert qm.get_next_ticket().id == "legal"
+
+
+def test_pop_best_for_skills_uses_default_skill_and_prefers_older(store):
+    qm.add_ticket(_ticket("g1", Category.GENERAL, 0.5))
+    qm.add_ticket(_ticket("g2", Category.GENERAL, 0.5))
+    qm.add_ticket(_ticket("b", Category.BILLING, 0.5))
+    agent = {"Billing": 0.1}  # General falls back to default_skill=0.1 → a tie with Billing
+    assert _ids(qm.pop_best_for_skills(agent) for _ in range(3)) == ["g1", "g2", "b"]
+
+
+def test_replay_matches_pops_by_ticket_id(store):
+    # Two processes journaling with their own counters: both used seq 1
+    packer = msgpack.Packer(use_bin_type=True)
+    with open(store, "wb") as f:
+        f.write(packer.pack([qm._OP_ADD, 1, _ticket("api", Category.BILLING, 0.5).to_row()]))
+        f.write(packer.pack([qm._OP_ADD, 1, _ticket("worker", Category.BILLING, 0.8).to_row()]))
+        f.write(packer.pack([qm._OP_POP, 1, "worker"]))
+        f.write(packer.pack([qm._OP_ADD, 2, _ticket("legacy", Category.GENERAL, 0.1).to_row()]))
+        f.write(packer.pack([qm._OP_POP, 2]))  # pre-ID record
+    qm.use_store(store)
+    assert _ids(qm.peek_queue()) == ["api"]
+
+
+def test_compaction_and_torn_tail(store, monkeypatch):
+    monkeypatch.setattr(qm, "COMPACT_MIN_RECORDS", 10)
+    for i in range(30):
+        qm.add_ticket(_ticket(f"t{i}", Category.TECHNICAL, i / 100))
+        if i % 2:
+            qm.get_next_ticket()
+    expected = _ids(qm.peek_queue(100))
+    with open(store, "ab") as f:
+        f.write(b"\x93\x01")  # crash mid-append
+
+    qm.use_store(store)
+    assert _ids(qm.peek_queue(100)) == expected
+    qm.add_ticket(_ticket("after", Category.LEGAL, 1.0))
+    qm.use_store(store)
+    assert _ids(qm.peek_queue(1)) == ["after"]
+
+
+def _journal(store, *records):
+    packer = msgpack.Packer(use_bin_type=True)
+    with open(store, "wb") as f:
+        for record in records:
+            f.write(record if isinstance(record, bytes) else packer.pack(record))
+
+
+def test_undecodable_middle_record_is_skipped(store, caplog):
+    _journal(
+        store,
+        [qm._OP_ADD, 1, _ticket("before", Category.BILLING, 0.4).to_row()],
+        [qm._OP_ADD, 2, ["not", "a", "ticket"]],
+        [qm._OP_ADD, 3, _ticket("after", Category.LEGAL, 0.6).to_row()],
+    )
+    size = os.path.getsize(store)
+    qm.use_store(store)
+    assert _ids(qm.peek_queue()) == ["after", "before"]
+    assert os.path.getsize(store) == size  # nothing after the bad record was cut off
+    assert "Skipping unreadable record" in caplog.text
+
+
+def test_unframeable_middle_bytes_set_the_journal_aside(store, caplog):
+    _journal(
+        store,
+        [qm._OP_ADD, 1, _ticket("before", Category.BILLING, 0.4).to_row()],
+        b"\xc1",  # never valid msgpack
+        [qm._OP_ADD, 2, _ticket("after", Category.LEGAL, 0.6).to_row()],
+    )
+    with open(store, "rb") as f:
+        original = f.read()
+    qm.use_store(store)
+    assert _ids(qm.peek_queue()) == ["before"]
+    (aside,) = glob.glob(store + ".corrupt-*")
+    with open(aside, "rb") as f:
+        assert f.read() == original  # "after" is still recoverable from the copy
+    assert "damaged" in caplog.text
+
+    # The rewritten store takes appends that survive the next load
+    qm.add_ticket(_ticket("new", Category.TECHNICAL, 0.9))
+    qm.use_store(store)
+    assert _ids(qm.peek_queue()) == ["new", "before"]
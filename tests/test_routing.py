@@ -0,0 +1,71 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import events
+import main
+import queue_manager
+import routing
+from ticket import Category, Ticket
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_ENABLED", False)
+    queue_manager.use_store(str(tmp_path / "queue_store.bin"))
+    agent = routing.Agent("T1", "Test Agent", {"Billing": 1.0}, capacity=1)
+    monkeypatch.setitem(routing.AGENTS_BY_ID, agent.agent_id, agent)
+    yield agent
+    queue_manager.use_store(None)
+
+
+def _queue(*ids):
+    for id in ids:
+        queue_manager.add_ticket(Ticket(id, f"invoice {id}", Category.BILLING, 0.5, time.time()))
+
+
+def test_completing_a_ticket_frees_the_slot(agent):
+    _queue("a", "b")
+    assert routing.pull_next_ticket(agent).id == "a"
+    with pytest.raises(routing.AgentAtCapacity):
+        routing.pull_next_ticket(agent)
+
+    routing.release_ticket(agent, "a")
+    assert routing.pull_next_ticket(agent).id == "b"
+    assert queue_manager.get_queue_size() == 0
+
+
+def test_released_ticket_goes_back_to_the_queue(agent):
+    _queue("a")
+    routing.pull_next_ticket(agent)
+    routing.release_ticket(agent, "a", requeue=True)
+    assert agent.assigned_tickets == []
+    assert [t.id for t in queue_manager.peek_queue()] == ["a"]
+
+
+def test_releasing_a_ticket_the_agent_does_not_hold_fails(agent):
+    with pytest.raises(routing.TicketNotAssigned):
+        routing.release_ticket(agent, "nope")
+
+
+def test_complete_and_release_endpoints(agent):
+    _queue("a", "b")
+    main.agent_next_ticket("T1")
+    with pytest.raises(HTTPException) as e:
+        main.agent_next_ticket("T1")
+    assert e.value.status_code == 409
+
+    done = main.agent_complete_ticket("T1", "a")
+    assert (done["requeued"], done["current_load"]) == (False, 0)
+    assert main.agent_next_ticket("T1")["ticket"]["id"] == "b"
+
+    assert main.agent_release_ticket("T1", "b")["requeued"] is True
+    assert [t.id for t in queue_manager.peek_queue()] == ["b"]
+
+    with pytest.raises(HTTPException) as e:
+        main.agent_complete_ticket("T1", "b")
+    assert e.value.status_code == 404
+    with pytest.raises(HTTPException) as e:
+        main.agent_complete_ticket("nobody", "b")
+    assert e.value.status_code == 404
@@ -0,0 +1,115 @@
+import concurrent.futures
+import threading
+import time
+
+from scheduler import InferenceScheduler
+
+
+def _blocker(release, started):
+    def job():
+        started.release()
+        release.wait(5)
+        return "done"
+    return job
+
+
+def _wait_running(s, total, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while sum(s._running.values()) < total and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_non_urgent_lanes_leave_a_thread_for_urgent():
+    s = InferenceScheduler(workers=4, limits={"urgent": 4, "priority": 3, "standard": 3})
+    release, started = threading.Event(), threading.Semaphore(0)
+    for _ in range(5):
+        s.submit("standard", _blocker(release, started))
+    for _ in range(3):
+        s.submit("priority", _blocker(release, started))
+    _wait_running(s, 3)
+    time.sleep(0.05)
+    assert s._running["priority"] + s._running["standard"] == 3
+
+    urgent = s.submit("urgent", lambda: "urgent")
+    assert urgent.result(timeout=0.5) == "urgent"
+    release.set()
+
+
+def test_lane_order_and_fifo_within_a_tenant():
+    s = InferenceScheduler(workers=1)
+    release, started = threading.Event(), threading.Semaphore(0)
+    s.submit("standard", _blocker(release, started))
+    started.acquire(timeout=2)
+    order = []
+    futures = [s.submit("standard", lambda i=i: order.append(f"s{i}")) for i in range(3)]
+    futures.append(s.submit("urgent", lambda: order.append("u")))
+    release.set()
+    concurrent.futures.wait(futures, timeout=2)
+    assert order == ["u", "s0", "s1", "s2"]
+
+
+def test_weighted_fair_queuing_interleaves_tenants():
+    s = InferenceScheduler(workers=1)
+    release, started = threading.Event(), threading.Semaphore(0)
+    s.submit("standard", _blocker(release, started))
+    started.acquire(timeout=2)
+    order = []
+    futures = [s.submit("standard", lambda i=i: order.append(("noisy", i)), tenant="noisy") for i in range(6)]
+    futures += [s.submit("standard", lambda i=i: order.append(("quiet", i)), tenant="quiet", weight=2.0)
+                for i in range(2)]
+    release.set()
+    concurrent.futures.wait(futures, timeout=2)
+    # quiet (weight 2) is served ahead of most of noisy's earlier backlog
+    assert [t for t, _ in order[:3]].count("quiet") == 2
+    assert [i for t, i in order if t == "noisy"] == list(range(6))
+
+
+def test_stale_run_estimate_does_not_expire_every_job():
+    s = InferenceScheduler(workers=2)
+    s._run_estimate = 0.55  # above the timeout: would expire everything if trusted
+    futures = [s.submit("standard", lambda: 1, timeout=0.5) for _ in range(20)]
+    assert all(f.exception(timeout=2) is None for f in futures)
+    assert s._run_estimate < 0.5
+
+
+def test_job_that_cannot_meet_its_deadline_fails_fast():
+    s = InferenceScheduler(workers=1)
+    s._run_estimate = 0.2
+    release, started = threading.Event(), threading.Semaphore(0)
+    s.submit("standard", _blocker(release, started))
+    started.acquire(timeout=2)
+    late = s.submit("standard", lambda: 1, timeout=0.25)
+    time.sleep(0.1)
+    release.set()
+    assert isinstance(late.exception(timeout=2), concurrent.futures.TimeoutError)
+
+
+def test_noisy_urgent_tenant_yields_to_other_tenants():
+    s = InferenceScheduler(workers=2, urgent_tenant_limit=1)
+    release, started = threading.Event(), threading.Semaphore(0)
+    for _ in range(2):  # idle threads still take capped urgent work
+        s.submit("urgent", _blocker(release, started), tenant="noisy")
+    _wait_running(s, 2)
+    assert s._running["urgent"] == 2
+
+    order = []
+    futures = [s.submit("urgent", lambda i=i: order.append(f"noisy{i}"), tenant="noisy") for i in range(5)]
+    futures.append(s.submit("standard", lambda: order.append("quiet"), tenant="quiet"))
+    release.set()
+    concurrent.futures.wait(futures, timeout=2)
+    # Strict lane priority would run all five noisy urgent jobs first
+    assert order.index("quiet") <= 1
+
+
+def test_urgent_cap_never_puts_a_tenants_own_standard_work_first():
+    s = InferenceScheduler(workers=2, urgent_tenant_limit=1)
+    release, started = threading.Event(), threading.Semaphore(0)
+    for _ in range(2):
+        s.submit("urgent", _blocker(release, started), tenant="acme")
+    _wait_running(s, 2)
+    order = []
+    futures = [s.submit("standard", lambda: order.append("standard"), tenant="acme")]
+    futures += [s.submit("urgent", lambda i=i: order.append(f"urgent{i}"), tenant="acme") for i in range(2)]
+    release.set()
+    concurrent.futures.wait(futures, timeout=2)
+    assert order[-1] == "standard"
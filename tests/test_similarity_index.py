@@ -0,0 +1,114 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+import main
+import similarity_index as si
+from similarity_index import SimilarityIndex
+from ticket import Category, Ticket
+
+
+def _tickets(start, count):
+    now = time.time()
+    return [Ticket(f"H{i}", f"historical ticket {i}", Category.TECHNICAL, 0.5, now)
+            for i in range(start, start + count)]
+
+
+def _clustered(rng, centres, count, noise=0.3):
+    v = centres[rng.integers(len(centres), size=count)] + noise * rng.standard_normal((count, centres.shape[1]))
+    return (v / np.linalg.norm(v, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _labels(index):
+    return np.fromfile(index._file(si._LISTS), dtype=np.int32)
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((40, 32)).astype(np.float32)
+    return lambda count: _clustered(rng, centres, count)
+
+
+def test_trains_once_the_threshold_is_reached(tmp_path, data):
+    index = SimilarityIndex(str(tmp_path), nlist=4)
+    assert index.train_rows == 4 * si.TRAIN_ROWS_PER_LIST
+
+    index.add_batch(_tickets(0, index.train_rows - 1), data(index.train_rows - 1))
+    assert not index.wait_for_training()
+    assert (_labels(index) == -1).all()
+
+    index.add(_tickets(index.train_rows - 1, 1)[0], data(1)[0])
+    assert index.wait_for_training(timeout=10)
+    assert len(_labels(index)) == index.train_rows
+    assert (_labels(index) >= 0).all()
+
+    index.add(_tickets(index.train_rows, 1)[0], data(1)[0])  # labelled on append from now on
+    assert _labels(index)[-1] >= 0
+
+
+def test_appends_do_not_wait_for_training_and_search_stays_exact(tmp_path, data, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    kmeans = si._kmeans
+
+    def slow_kmeans(*args, **kwargs):
+        started.set()
+        release.wait(10)
+        return kmeans(*args, **kwargs)
+
+    monkeypatch.setattr(si, "_kmeans", slow_kmeans)
+    index = SimilarityIndex(str(tmp_path), nlist=4)
+    history = data(index.train_rows)
+    index.add_batch(_tickets(0, len(history)), history)
+    assert started.wait(10)
+
+    # Training is stuck in k-means: appends still go through and search is brute force
+    late = data(20)
+    index.add_batch(_tickets(len(history), len(late)), late)
+    assert len(index) == len(history) + len(late)
+    assert index.search(late[-1], 1)[0][0] == len(history) + len(late) - 1
+    assert index._centroids is None
+
+    release.set()
+    assert index.wait_for_training(timeout=10)
+    labels = _labels(index)
+    assert len(labels) == len(history) + len(late)
+    assert (labels >= 0).all()  # rows appended during training were labelled when it finished
+
+
+def test_ivf_recall_against_brute_force(tmp_path, data):
+    index = SimilarityIndex(str(tmp_path), nlist=16, nprobe=4)
+    history = data(3000)
+    for start in range(0, len(history), 500):
+        index.add_batch(_tickets(start, 500), history[start:start + 500])
+    assert index.wait_for_training(timeout=30)
+
+    queries, hits, k = data(50), 0, 10
+    for q in queries:
+        truth = {row for row, _ in index.search(q, k, exact=True)}
+        hits += len(truth & {row for row, _ in index.search(q, k)})
+    assert index._centroids is not None  # the queries above went through the IVF lists
+    assert hits / (len(queries) * k) >= 0.9
+
+
+def test_similar_to_returns_past_tickets_without_itself(tmp_path, monkeypatch):
+    index = SimilarityIndex(str(tmp_path), nlist=4)
+    base = np.eye(8, dtype=np.float32)
+    vecs = np.stack([base[0], base[0] + 0.1 * base[1], base[2], base[0] + 0.3 * base[3]])
+    tickets = [Ticket(f"P{i}", f"past ticket {i}", Category.BILLING, 0.2 * i, 1_700_000_000.0 + i)
+               for i in range(len(vecs))]
+    index.add_batch(tickets, vecs)
+    monkeypatch.setattr(main, "similarity_index", index)
+
+    result = main.similar_tickets("P0", k=2)
+    assert [s["id"] for s in result["similar"]] == ["P1", "P3"]
+    first = result["similar"][0]
+    assert (first["category"], first["urgency_score"], first["text"]) == ("Billing", {"urgency": 0.2}, "past ticket 1")
+    assert first["similarity"] > result["similar"][1]["similarity"]
+
+    with pytest.raises(HTTPException) as e:
+        main.similar_tickets("never-indexed")
+    assert e.value.status_code == 404
@@ -0,0 +1,83 @@
+import argparse
+import json
+
+import numpy as np
+import pytest
+
+import events
+import queue_manager
+import routing
+import simulator
+from ticket import Category
+
+
+def _args(**overrides):
+    args = dict(replay=None, scale=1.0, days=2, per_day=300, diurnal=0.6, weekend=0.4,
+                mix="Technical=0.4,Billing=0.35,Legal=0.1,General=0.15", high_fraction=0.15,
+                agents="", handle="Technical=25,Billing=12,Legal=40,General=10", handle_sigma=0.6,
+                sla="high=30,normal=480", policy="batch", route_interval=60, route_batch=10, seed=1)
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def _simulate(args):
+    rng = np.random.default_rng(args.seed)
+    arrivals = simulator.replayed_arrivals(args, rng) if args.replay else simulator.synthetic_arrivals(args, rng)
+    return simulator.simulate(args, arrivals, simulator.build_agents(args.agents), rng)
+
+
+def test_parse_spec():
+    assert simulator.parse_spec("A1=3, A4=6,bad,", int) == {"A1": 3, "A4": 6}
+    assert simulator.parse_spec("") == {}
+
+
+def test_build_agents_copies_registry_templates():
+    agents = simulator.build_agents("A1=2,A3=0")
+    assert [a.agent_id for a in agents] == ["A1#1", "A1#2", "A2#1", "A4#1"]
+    assert agents[0].skills == routing.AGENTS_BY_ID["A1"].skills
+    with pytest.raises(SystemExit):
+        simulator.build_agents("A9=1")
+
+
+def test_weekend_traffic_is_quieter():
+    arrivals = simulator.synthetic_arrivals(_args(days=7, per_day=2000), np.random.default_rng(0))
+    per_day = np.bincount([int(t // simulator.DAY) for t, *_ in arrivals], minlength=7)
+    assert per_day[5:].mean() < 0.6 * per_day[:5].mean()
+
+
+@pytest.mark.parametrize("policy", ["batch", "pull"])
+def test_simulation_accounts_for_every_ticket_and_restores_state(policy):
+    registry, store, enabled = list(routing.AGENT_REGISTRY), queue_manager.QUEUE_FILE, events.EVENTS_ENABLED
+    report = _simulate(_args(policy=policy))
+
+    assert report["arrivals"] == report["assigned"] + report["still_queued"]
+    assert report["duplicate_ids"] == 0
+    assert 0 < report["utilization"]["A4"] <= 1
+    assert routing.AGENT_REGISTRY == registry
+    assert (queue_manager.QUEUE_FILE, events.EVENTS_ENABLED) == (store, enabled)
+    assert all(not a.assigned_tickets for a in registry)
+
+
+def test_more_agents_cut_waits_and_breaches():
+    short = _simulate(_args(per_day=1500))
+    staffed = _simulate(_args(per_day=1500, agents="A1=3,A2=3,A3=2,A4=6"))
+    assert staffed["wait"]["p90_min"] < short["wait"]["p90_min"]
+    assert staffed["sla"]["high"]["breached"] < short["sla"]["high"]["breached"]
+
+
+def test_replay_scales_time_and_fills_in_missing_scores(tmp_path):
+    src = tmp_path / "triaged.jsonl"
+    src.write_text("\n".join(json.dumps(r) for r in [
+        {"id": "r1", "text": "refund for a duplicate charge on my invoice", "timestamp": "2026-01-05T00:00:00Z"},
+        {"id": "r2", "text": "whatever", "category": "Legal", "urgency_score": {"urgency": 0.9},
+         "timestamp": "2026-01-05T02:00:00Z"},
+        {"id": "r1", "text": "resent", "category": "General", "urgency_score": 0.1, "timestamp": "2026-01-05T01:00:00Z"},
+    ]))
+    args = _args(replay=str(src), scale=2.0)
+    arrivals = simulator.replayed_arrivals(args, np.random.default_rng(0))
+    assert [(t, i, c, u) for t, i, c, u in arrivals] == [
+        (0.0, "r1", Category.BILLING, 0.3), (1800.0, "r1", Category.GENERAL, 0.1), (3600.0, "r2", Category.LEGAL, 0.9)]
+
+    report = simulator.simulate(args, arrivals, simulator.build_agents(""), np.random.default_rng(0))
+    assert report["duplicate_ids"] == 1
+    assert report["arrivals"] == 3
@@ -0,0 +1,38 @@
+import time
+
+import msgpack
+import pytest
+
+from ticket import Category, Ticket
+
+
+def _ticket(**kwargs):
+    return Ticket("TKT-1", "Invoice is wrong", Category.BILLING, 0.42, 1_700_000_000.5, model_used="m", **kwargs)
+
+
+def test_pack_round_trip():
+    t = Ticket.decode(_ticket().pack())
+    assert (t.id, t.text, t.category, t.urgency, t.timestamp, t.model_used, t.backfill) == (
+        "TKT-1", "Invoice is wrong", Category.BILLING, 0.42, 1_700_000_000.5, "m", False)
+
+
+def test_live_tickets_keep_the_version_1_layout():
+    # Workers that predate the backfill flag must still decode what the API publishes
+    assert _ticket().to_row()[0] == 1
+    assert len(_ticket().to_row()) == 8
+
+
+def test_backfill_flag_round_trips_as_version_2():
+    row = _ticket(backfill=True).to_row()
+    assert row[0] == 2
+    assert Ticket.from_row(row).backfill
+    assert Ticket.from_dict({"id": "x", "text": "y", "backfill": True}).backfill
+
+
+def test_legacy_json_payload_and_malformed_rows():
+    t = Ticket.decode(b'{"id": "J1", "text": "hi", "category": "Legal", "urgency_score": {"urgency": 0.9}}')
+    assert (t.id, t.category, t.urgency) == ("J1", Category.LEGAL, 0.9)
+    with pytest.raises(ValueError):
+        Ticket.decode(msgpack.packb([3, "id", "text", 0, 0.1, time.time(), False, ""]))
+    with pytest.raises(ValueError):
+        Ticket.decode(msgpack.packb([2, "id", "text", 0, 0.1, time.time(), False, ""]))  # v2 needs 9 fields
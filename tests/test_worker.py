@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+import events
+import ingest
+import queue_manager
+import worker
+from ticket import Category, Ticket
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class _Index:
+    def __init__(self):
+        self.added = []
+
+    def add(self, ticket, vec):
+        self.added.append(ticket.id)
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    """The worker with fake Redis, a temp queue store and recorded side effects."""
+    monkeypatch.setattr(events, "EVENTS_ENABLED", False)
+    monkeypatch.setattr(worker, "r", fakeredis.FakeRedis())
+    index = _Index()
+    monkeypatch.setattr(worker, "similarity_index", index)
+    sent = []
+    monkeypatch.setattr(worker, "_send_webhook", lambda t: sent.append(("alert", t.id)))
+    monkeypatch.setattr(worker, "_send_master_incident_webhook", lambda t: sent.append(("master", t.id)))
+    queue_manager.use_store(str(tmp_path / "queue_store.bin"))
+    yield index, sent
+    queue_manager.use_store(None)
+
+
+def _ticket(id, urgency=0.95, **kwargs):
+    return Ticket(id, "production database is down", Category.TECHNICAL, urgency, time.time(), **kwargs)
+
+
+def test_backfilled_ticket_is_queued_and_indexed_without_storm_check_or_alert(pipeline, monkeypatch):
+    index, sent = pipeline
+
+    def no_storm(*args, **kwargs):
+        raise AssertionError("storm detection ran for a backfilled ticket")
+
+    monkeypatch.setattr(worker.deduplicator, "check_storm", no_storm)
+    worker.process(Ticket.decode(_ticket("OLD-1", backfill=True).pack()))
+
+    assert queue_manager.get_queue_size() == 1
+    assert index.added == ["OLD-1"]
+    assert sent == []
+
+
+def test_live_ticket_is_indexed_and_alerted(pipeline):
+    index, sent = pipeline
+    worker.process(Ticket.decode(_ticket("NEW-1").pack()))
+    assert index.added == ["NEW-1"]
+    assert sent == [("alert", "NEW-1")]
+
+
+def test_stream_batch_acks_processed_and_malformed_entries_only(pipeline, monkeypatch):
+    index, sent = pipeline
+    monkeypatch.setattr(ingest, "INGEST_MODE", "stream")
+    for payload in (_ticket("OK-1").pack(), b"\xc1 not a ticket", _ticket("BAD-1").pack()):
+        ingest.publish(worker.r, payload)
+    consumer = ingest.StreamConsumer(worker.r, name="w1")
+
+    real_add = index.add
+
+    def add(ticket, vec):
+        if ticket.id == "BAD-1":
+            raise RuntimeError("index unavailable")
+        real_add(ticket, vec)
+
+    monkeypatch.setattr(index, "add", add)
+    assert worker.process_stream_batch(consumer, consumer.read(block_ms=0)) == 2
+
+    # Only the failed ticket is left pending, for a retry after INGEST_CLAIM_IDLE_MS
+    pending = worker.r.xpending_range(ingest.REDIS_STREAM_KEY, ingest.CONSUMER_GROUP, "-", "+", 10)
+    assert len(pending) == 1
+    ((_, raw),) = worker.r.xrange(ingest.REDIS_STREAM_KEY, pending[0]["message_id"], pending[0]["message_id"])
+    assert Ticket.decode(raw[b"ticket"]).id == "BAD-1"
+    assert sent == [("alert", "OK-1")]
+
+
+def test_redelivery_after_a_failure_finishes_the_alert_exactly_once(pipeline, monkeypatch):
+    index, sent = pipeline
+    check_storm = worker.deduplicator.check_storm
+    calls = []
+
+    def flaky(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("storm state unavailable")
+        return check_storm(*args, **kwargs)
+
+    monkeypatch.setattr(worker.deduplicator, "check_storm", flaky)
+    raw = _ticket("RETRY-1").pack()
+    with pytest.raises(RuntimeError):
+        worker.process(Ticket.decode(raw))  # queued, but died before alerting
+    assert sent == []
+
+    worker.process(Ticket.decode(raw))  # redelivered: already queued, alerts now
+    worker.process(Ticket.decode(raw))  # redelivered again: marker set, skipped
+    assert sent == [("alert", "RETRY-1")]
+    assert queue_manager.get_queue_size() == 1
+    assert len(calls) == 2
@@ -0,0 +1,136 @@
+# Compact in-memory ticket and its binary wire/storage codec.
+#
+# Tickets used to travel as dicts: json.dumps into Redis, json.loads in the worker,
+# dicts inside heap tuples, and an indented JSON rewrite of the whole queue on every
+# change. A Ticket is a slotted object (no per-instance __dict__), the category is a
+# small int enum and urgency is a plain float. On the wire and on disk it is a
+# msgpack array. The original dict/JSON shape is produced only at the HTTP boundary
+# via to_dict().
+
+import json
+from datetime import datetime, timezone
+from enum import IntEnum
+
+import msgpack
+
+from config import HIGH_URGENCY_THRESHOLD
+
+# Bump when the packed field layout changes; decode() rejects unknown versions.
+# Version 2 appends the backfill flag. Live tickets are still packed as version 1, so
+# workers from before it keep decoding everything the API publishes.
+CODEC_VERSION = 2
+_V1_FIELDS, _V2_FIELDS = 8, 9
+
+
+class Category(IntEnum):
+    GENERAL = 0
+    BILLING = 1
+    TECHNICAL = 2
+    LEGAL = 3
+
+    @property
+    def label(self) -> str:
+        return self.name.capitalize()
+
+    @classmethod
+    def from_label(cls, label: str) -> "Category":
+        return cls.__members__.get(str(label).upper(), cls.GENERAL)
+
+
+class Ticket:
+    __slots__ = ("id", "text", "category", "urgency", "timestamp", "processed", "model_used", "backfill")
+
+    def __init__(self, id: str, text: str, category: Category, urgency: float,
+                 timestamp: float, processed: bool = False, model_used: str = "", backfill: bool = False):
+        self.id = id
+        self.text = text
+        self.category = category
+        self.urgency = urgency          # S ∈ [0, 1]
+        self.timestamp = timestamp      # epoch seconds, UTC
+        self.processed = processed
+        self.model_used = model_used
+        self.backfill = backfill        # historical ticket from batch_triage.py: never alerted on
+
+    @property
+    def is_high_urgency(self) -> bool:
+        return self.urgency > HIGH_URGENCY_THRESHOLD
+
+    # ─── Binary codec (Redis wire + queue store) ──────────────────────────────
+
+    def to_row(self) -> list:
+        row = [1, self.id, self.text, int(self.category), self.urgency,
+               self.timestamp, self.processed, self.model_used]
+        if self.backfill:
+            row[0] = CODEC_VERSION
+            row.append(True)
+        return row
+
+    @classmethod
+    def from_row(cls, row) -> "Ticket":
+        if not isinstance(row, (list, tuple)) or (row[:1], len(row)) not in (([1], _V1_FIELDS), ([2], _V2_FIELDS)):
+            raise ValueError(f"Unsupported ticket encoding: {row!r:.80}")
+        _, id_, text, category, urgency, timestamp, processed, model_used = row[:_V1_FIELDS]
+        backfill = bool(row[_V1_FIELDS]) if len(row) > _V1_FIELDS else False
+        return cls(id_, text, Category(category), float(urgency), float(timestamp), bool(processed), model_used,
+                   backfill)
+
+    def pack(self) -> bytes:
+        return msgpack.packb(self.to_row(), use_bin_type=True)
+
+    @classmethod
+    def decode(cls, raw) -> "Ticket":
+        """
+        Decode a Redis payload. Accepts the msgpack encoding and, for messages published
+        by an older API during a rolling deploy, the legacy JSON dict. Raises ValueError
+        on anything malformed.
+        """
+        if isinstance(raw, str):
+            raw = raw.encode()
+        if raw[:1] == b"{":
+            return cls.from_dict(json.loads(raw))
+        try:
+            return cls.from_row(msgpack.unpackb(raw, raw=False))
+        except (msgpack.UnpackException, TypeError) as e:
+            raise ValueError(f"Malformed ticket payload: {e}") from e
+
+    # ─── HTTP boundary ────────────────────────────────────────────────────────
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "text": self.text,
+            "category": self.category.label,
+            "urgency_score": {"urgency": self.urgency},
+            "is_high_urgency": self.is_high_urgency,
+            "timestamp": datetime.fromtimestamp(self.timestamp, timezone.utc).isoformat(),
+            "processed": self.processed,
+            "model_used": self.model_used,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Ticket":
+        urgency = d.get("urgency_score", 0.0)
+        if isinstance(urgency, dict):
+            urgency = urgency.get("urgency", 0.0)
+        ts = d.get("timestamp")
+        if isinstance(ts, str):
+            parsed = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            ts = parsed.timestamp()
+        try:
+            return cls(
+                str(d["id"]),
+                d["text"],
+                Category.from_label(d.get("category", "General")),
+                float(urgency),
+                float(ts) if ts is not None else datetime.now(timezone.utc).timestamp(),
+                bool(d.get("processed", False)),
+                d.get("model_used", ""),
+                bool(d.get("backfill", False)),
+            )
+        except KeyError as e:
+            raise ValueError(f"Ticket is missing field {e}") from e
+
+    def __repr__(self):
+        return f"Ticket({self.id!r}, {self.category.label}, urgency={self.urgency:.2f})"
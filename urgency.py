@@ -1,5 +1,7 @@
 from transformers import pipeline
 
+from config import HIGH_URGENCY_THRESHOLD
+
 # Sentiment model: maps negative sentiment → high urgency, positive → low urgency
 sentiment_pipeline = pipeline(
     "sentiment-analysis",
@@ -11,7 +13,10 @@ def score_urgency(text: str) -> dict:
     if not text or not text.strip():
         return {"urgency": 0.0}
 
-    result = sentiment_pipeline(text)[0]
+    return _urgency_from_result(sentiment_pipeline(text)[0])
+
+
+def _urgency_from_result(result) -> dict:
     label = result["label"].upper()   # "POSITIVE", "NEGATIVE", or "NEUTRAL"
     score = result["score"]
 
@@ -28,5 +33,18 @@ def score_urgency(text: str) -> dict:
     return {"urgency": float(urgency)}  # S ∈ [0, 1]
 
 
+def score_urgency_batch(texts: list, batch_size: int = 16) -> list:
+    """Batched variant of score_urgency — one pipeline call for the whole list."""
+    scores = [{"urgency": 0.0} for _ in texts]
+    idx = [i for i, t in enumerate(texts) if t and t.strip()]
+    if not idx:
+        return scores
+
+    results = sentiment_pipeline([texts[i] for i in idx], batch_size=batch_size)
+    for i, result in zip(idx, results):
+        scores[i] = _urgency_from_result(result)
+    return scores
+
+
 def is_high_urgency(scores: dict) -> bool:
-    return scores.get("urgency", 0.0) > 0.75  # raised: 0.7 → 0.75 to reduce false positives
+    return scores.get("urgency", 0.0) > HIGH_URGENCY_THRESHOLD
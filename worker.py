@@ -1,5 +1,4 @@
 import redis
-import json
 import time
 import logging
 import os
@@ -8,8 +7,11 @@ import requests
 from dotenv import load_dotenv
 
 from queue_manager import add_ticket
-from urgency import is_high_urgency
-from deduplicator import deduplicator
+from deduplicator import deduplicator, embed
+import ingest
+import metrics
+from similarity_index import similarity_index
+from ticket import Ticket
 
 # Load .env so SLACK_WEBHOOK_URL / DISCORD_WEBHOOK_URL are available
 load_dotenv()
@@ -24,15 +26,19 @@ r = redis.Redis(
     host=os.getenv("REDIS_HOST", "localhost"),
     port=int(os.getenv("REDIS_PORT", 6379)),
     db=0,
-    decode_responses=True,
+    decode_responses=False,  # tickets arrive msgpack-encoded
 )
 
-REDIS_QUEUE_KEY = "ticket_queue"
+REDIS_QUEUE_KEY = ingest.REDIS_QUEUE_KEY
 BLOCK_TIMEOUT = 2       # seconds to wait on BRPOP before retrying
 WEBHOOK_THRESHOLD = 0.8  # M2 spec: trigger alert when S > 0.8
+METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", 9100))
+# Set once a ticket's alerting is done; redeliveries are deduped on this, not on queue membership
+PROCESSED_KEY_PREFIX = "ticket_processed:"
+PROCESSED_TTL = int(os.getenv("IDEMPOTENCY_TTL", 24 * 3600))
 
 
-def _send_webhook(ticket_data: dict) -> None:
+def _send_webhook(ticket: Ticket) -> None:
     """
     Fire a POST to the Slack webhook (if configured).
     Milestone 2 requirement: trigger when urgency_score > 0.8.
@@ -42,23 +48,25 @@ def _send_webhook(ticket_data: dict) -> None:
         log.warning("SLACK_WEBHOOK_URL not set — skipping alert")
         return
 
-    urgency = ticket_data.get("urgency_score", {}).get("urgency", 0.0)
     message = (
-        f"🚨 *HIGH-URGENCY TICKET* [ID: {ticket_data['id']}]\n"
-        f"• Category  : {ticket_data.get('category', '?')}\n"
-        f"• Urgency   : {urgency:.2f}\n"
-        f"• Text      : {ticket_data['text'][:300]}"
+        f"🚨 *HIGH-URGENCY TICKET* [ID: {ticket.id}]\n"
+        f"• Category  : {ticket.category.label}\n"
+        f"• Urgency   : {ticket.urgency:.2f}\n"
+        f"• Text      : {ticket.text[:300]}"
     )
 
     try:
-        resp = requests.post(url, json={"text": message}, timeout=5)
+        with metrics.WEBHOOK_SECONDS.time():
+            resp = requests.post(url, json={"text": message}, timeout=5)
         resp.raise_for_status()
+        metrics.WEBHOOKS_TOTAL.labels("alert", "sent").inc()
         log.info("Slack webhook sent (status %s)", resp.status_code)
     except requests.RequestException as exc:
+        metrics.WEBHOOKS_TOTAL.labels("alert", "failed").inc()
         log.error("Slack webhook failed: %s", exc)
 
 
-def _send_master_incident_webhook(ticket_data: dict) -> None:
+def _send_master_incident_webhook(ticket: Ticket) -> None:
     """
     Fire a Master Incident webhook instead of individual alerts during a storm.
     """
@@ -68,32 +76,74 @@ def _send_master_incident_webhook(ticket_data: dict) -> None:
     message = (
         f"🌪️ *MASTER INCIDENT: TICKET STORM DETECTED*\n"
         f"• *Status*: >10 highly similar tickets (cosine sim > 0.9) in the last 5 minutes.\n"
-        f"• *Cluster Leader Idea*: {ticket_data['text'][:200]}...\n"
+        f"• *Cluster Leader Idea*: {ticket.text[:200]}...\n"
         f"• *Action*: Individual webhook alerts are now SUPPRESSED for this storm."
     )
     try:
-        resp = requests.post(url, json={"text": message}, timeout=5)
+        with metrics.WEBHOOK_SECONDS.time():
+            resp = requests.post(url, json={"text": message}, timeout=5)
         resp.raise_for_status()
+        metrics.WEBHOOKS_TOTAL.labels("master_incident", "sent").inc()
         log.warning("Master Incident webhook sent (status %s)!", resp.status_code)
     except requests.RequestException as exc:
+        metrics.WEBHOOKS_TOTAL.labels("master_incident", "failed").inc()
         log.error("Master Incident webhook failed: %s", exc)
 
-def process(ticket_data: dict) -> None:
+def _already_processed(ticket_id: str) -> bool:
+    try:
+        return r.get(PROCESSED_KEY_PREFIX + ticket_id) is not None
+    except redis.RedisError as e:
+        # Unknown — process again; a repeated alert beats a lost ticket
+        log.warning("Could not read processed marker for [%s]: %s", ticket_id, e)
+        return False
+
+
+def _mark_processed(ticket_id: str) -> None:
+    try:
+        r.set(PROCESSED_KEY_PREFIX + ticket_id, 1, ex=PROCESSED_TTL)
+    except redis.RedisError as e:
+        # Side effects are done; raising would only leave the entry pending and alert twice
+        log.warning("Could not write processed marker for [%s]: %s", ticket_id, e)
+
+
+def process(ticket: Ticket) -> None:
     """Move one ticket from Redis into the in-memory heapq and alert if high-urgency."""
-    ticket_data["processed"] = True
-    add_ticket(ticket_data)
+    if _already_processed(ticket.id):
+        # Redelivered (stream reclaim) or resubmitted ticket — already queued and alerted
+        log.info("Duplicate ticket [%s] already processed, skipping.", ticket.id)
+        return
+
+    ticket.processed = True
+    if not add_ticket(ticket):
+        # Queued by an attempt that failed before alerting — finish the side effects
+        log.info("Ticket [%s] already queued, resuming storm check and alerts.", ticket.id)
+
+    # One MiniLM embedding per ticket: storm detection now, similar-ticket search later
+    emb = embed(ticket.text)
+    if similarity_index is not None:
+        similarity_index.add(ticket, emb)
+    if ticket.backfill:
+        # Historical ticket from batch_triage.py --redis, which already ran storm detection
+        # on its own timestamp: searchable, but never a storm member or an alert today
+        log.info("Backfilled ticket [%s] queued and indexed.", ticket.id)
+    else:
+        _alert(ticket, emb)
+    _mark_processed(ticket.id)
+
+
+def _alert(ticket: Ticket, emb) -> None:
+    urgency = ticket.urgency
 
-    urgency = ticket_data.get("urgency_score", {}).get("urgency", 0.0)
-    
     # Check for Ticket Storm using Semantic Deduplication (Milestone 3)
-    storm_status = deduplicator.check_storm(ticket_data["text"])
+    storm_status = deduplicator.check_storm(ticket.text, emb=emb)
+    metrics.STORM_TOTAL.labels(storm_status).inc()
     
     if storm_status == "master":
-        log.error("MASTER INCIDENT TRIGGERED: Deduplicator matched >10 tickets for [%s]", ticket_data["id"])
-        _send_master_incident_webhook(ticket_data)
+        log.error("MASTER INCIDENT TRIGGERED: Deduplicator matched >10 tickets for [%s]", ticket.id)
+        _send_master_incident_webhook(ticket)
         return  # suppress individual webhook
     elif storm_status == "suppress":
-        log.info("Suppressed webhook for [%s] (part of existing ticket storm cluster).", ticket_data["id"])
+        log.info("Suppressed webhook for [%s] (part of existing ticket storm cluster).", ticket.id)
         return  # suppress individual webhook
 
     # Normal routing
@@ -101,37 +151,85 @@ def process(ticket_data: dict) -> None:
         log.warning(
             "HIGH URGENCY (%.2f): [%s] %s",
             urgency,
-            ticket_data["id"],
-            ticket_data["text"][:120],
+            ticket.id,
+            ticket.text[:120],
         )
-        _send_webhook(ticket_data)
+        _send_webhook(ticket)
     else:
         log.info(
             "Processed ticket [%s] → %s (urgency=%.2f)",
-            ticket_data["id"],
-            ticket_data.get("category", "?"),
+            ticket.id,
+            ticket.category.label,
             urgency,
         )
 
 
+def process_stream_batch(consumer: ingest.StreamConsumer, entries: list) -> int:
+    """
+    Process a batch read from the consumer group and XACK what was handled.
+    Unexpected failures are left pending so another worker (or this one) retries them
+    after INGEST_CLAIM_IDLE_MS; malformed payloads are acked away since they can never succeed.
+    """
+    done = []
+    for entry_id, raw in entries:
+        try:
+            ticket = Ticket.decode(raw)
+        except ValueError as e:
+            log.error("Malformed ticket payload in %s, dropping: %s", entry_id, e)
+            done.append(entry_id)
+            continue
+        try:
+            process(ticket)
+            done.append(entry_id)
+        except Exception as e:
+            log.exception("Unexpected error processing %s (left pending for retry): %s", entry_id, e)
+    consumer.ack(done)
+    return len(done)
+
+
+def stream_worker():
+    consumer = ingest.StreamConsumer(r)
+    log.info(
+        "Worker '%s' started. Consuming stream '%s' as group '%s' (metrics on :%d)…",
+        consumer.name, ingest.REDIS_STREAM_KEY, ingest.CONSUMER_GROUP, METRICS_PORT,
+    )
+    while True:
+        try:
+            wait_start = time.perf_counter()
+            entries = consumer.read(block_ms=BLOCK_TIMEOUT * 1000)
+            if not entries:
+                continue
+            metrics.REDIS_WAIT_SECONDS.observe(time.perf_counter() - wait_start)
+            process_stream_batch(consumer, entries)
+
+        except redis.RedisError as e:
+            log.error("Redis error: %s — retrying in 2s", e)
+            time.sleep(2)
+
+
 def worker():
-    log.info("Worker started. Listening on Redis key '%s'…", REDIS_QUEUE_KEY)
+    metrics.start_metrics_server(METRICS_PORT)
+    if ingest.INGEST_MODE == "stream":
+        return stream_worker()
+
+    log.info("Worker started. Listening on Redis key '%s' (metrics on :%d)…", REDIS_QUEUE_KEY, METRICS_PORT)
     while True:
         try:
             # BRPOP blocks until an item arrives or timeout expires (avoids CPU spin)
+            wait_start = time.perf_counter()
             result = r.brpop(REDIS_QUEUE_KEY, timeout=BLOCK_TIMEOUT)
             if result is None:
                 continue  # timeout — loop and try again
+            metrics.REDIS_WAIT_SECONDS.observe(time.perf_counter() - wait_start)
 
             _, raw = result  # (key, value)
-            ticket_data = json.loads(raw)
-            process(ticket_data)
+            process(Ticket.decode(raw))
 
         except redis.RedisError as e:
             log.error("Redis error: %s — retrying in 2s", e)
             time.sleep(2)
-        except json.JSONDecodeError as e:
-            log.error("Malformed ticket JSON, skipping: %s", e)
+        except ValueError as e:
+            log.error("Malformed ticket payload, skipping: %s", e)
         except Exception as e:
             log.exception("Unexpected error processing ticket: %s", e)
 